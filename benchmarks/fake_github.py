@@ -0,0 +1,552 @@
+"""
+A local fake of the parts of the GitHub REST and GraphQL APIs that github-pr uses, for offline benchmarks
+
+Repos are generated on demand and are the same on every run: bench/prs-<N> has N open PRs,
+each with a few labels, the statuses of up to four CI contexts and a discussion of usually a
+handful, sometimes a few pages, of comments. PR 1 of every repo has a long discussion ending
+with a :shipit: of a reviewer, for the merge and check-condition benchmarks. The bench
+organization lists bench/prs-10 and bench/prs-100.
+
+    python benchmarks/fake_github.py --port 8000 --latency 50
+    github-pr list -r bench/prs-1000 --api-url http://127.0.0.1:8000 --token fake
+
+Like GitHub Enterprise, the REST API is also served under /api/v3, with GraphQL at /api/graphql.
+
+Outside of the API, GET /_fake/requests returns the counts of the requests served by endpoint
+and by token, POST /_fake/throttle simulates rate limits (see FakeGithubServer.throttle), and
+POST /_fake/reset zeroes the counts, stops throttling and forgets the changes made to the repos.
+"""
+import argparse
+import BaseHTTPServer
+import collections
+import hashlib
+import json
+import random
+import re
+import SocketServer
+import sys
+import threading
+import time
+import urllib
+import urlparse
+from datetime import datetime, timedelta
+
+OWNER = 'bench'
+REPO_NAME_RE = re.compile(r'^prs-(\d+)$')
+SHIPPABLE_NUMBER = 1
+ORG_REPO_SIZES = [10, 100]
+DEFAULT_PER_PAGE = 30
+MAX_PER_PAGE = 100
+TIME_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+ENTERPRISE_REST_PREFIX = '/api/v3'
+ENTERPRISE_GRAPHQL_PATH = '/api/graphql'
+EPOCH = datetime(2020, 1, 1)
+
+USERS = ['dev%d' % i for i in range(25)]
+LABELS = ['bug', 'enhancement', 'ready', 'needs-review', 'wip', 'dependencies', 'documentation', 'do-not-merge']
+CONTEXTS = ['ci/build', 'ci/test', 'ci/lint', 'coverage', 'security/scan']
+COMMENTS = ['lgtm', 'Could you add a test for this?', 'Rebased on master', 'nit: typo in the docstring',
+            'Why not reuse the helper from the other module?', 'Fixed, thanks', 'retest this please', ':+1:']
+
+
+def _time(minutes):
+    return (EPOCH + timedelta(minutes=minutes)).strftime(TIME_FORMAT)
+
+
+def _generate_pr(repo_name, number):
+    """One PR, only depending on its number, so that it is the same in every repo size"""
+    rng = random.Random(number)
+    owner = rng.choice(USERS)
+    committed_minutes = number * 60
+    states = {}
+    for context in rng.sample(CONTEXTS, rng.randint(0, 4)):
+        states[context] = rng.choice(['success'] * 8 + ['failure', 'error', 'pending'])
+    # Every context reported pending when the build started, newest first like the API
+    statuses = [(state, context, committed_minutes + 10) for context, state in sorted(states.items()) if state != 'pending']
+    statuses += [('pending', context, committed_minutes + 1) for context in sorted(states)]
+    comment_count = SHIPPABLE_NUMBER == number and 45 or min(int(rng.expovariate(1 / 4.0)), 150)
+    comments = []
+    for i in range(comment_count):
+        minutes = committed_minutes + (i - comment_count // 2) * 5
+        comments.append({'body': rng.choice(COMMENTS), 'user': rng.choice(USERS), 'created_at': minutes, 'updated_at': minutes})
+    if number == SHIPPABLE_NUMBER or rng.random() < 0.3:
+        minutes = committed_minutes + comment_count * 5
+        comments.append({'body': ':shipit:', 'user': rng.choice([user for user in USERS if user != owner]), 'created_at': minutes, 'updated_at': minutes})
+    for i, comment in enumerate(comments):
+        comment['id'] = number * 1000 + i
+    return {
+        'number': number,
+        'title': 'Change %d: %s' % (number, rng.choice(['fix', 'refactor', 'speed up', 'document'])),
+        'body': 'Some description of the change.\n' * rng.randint(1, 20),
+        'state': 'open',
+        'merged': False,
+        'user': owner,
+        'head_ref': 'feature-%d' % number,
+        'base_ref': 'master',
+        'sha': hashlib.sha1('%s/%d' % (repo_name, number)).hexdigest(),
+        'committed_at': _time(committed_minutes),
+        'updated_at': _time(committed_minutes + comment_count * 5),
+        'labels': rng.sample(LABELS, rng.choice([0, 0, 1, 1, 1, 2, 3])),
+        'statuses': statuses,
+        'comments': comments,
+    }
+
+
+class FakeRepo(object):
+    """The generated PRs of a repo, by number and by head SHA"""
+
+    def __init__(self, full_name, pr_count):
+        self.full_name = full_name
+        self.prs = collections.OrderedDict((number, _generate_pr(full_name, number)) for number in range(1, pr_count + 1))
+        self.by_sha = dict((pr['sha'], pr) for pr in self.prs.values())
+        self.modified = False
+
+
+class FakeGithubServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """
+    The fake API, listening on 127.0.0.1
+    Counts the requests it serves by endpoint, and those it has no route for,
+    and waits `latency` seconds before each response
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, port=0, latency=0):
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', port), _Handler)
+        self.url = 'http://127.0.0.1:%d' % self.server_address[1]
+        self.latency = latency
+        self.counts = collections.Counter()
+        self.not_found = collections.Counter()
+        self.tokens = collections.Counter()
+        self.throttling = None
+        # Numbers of the PRs whose GET answers 502, like a flaky API
+        self.failing_pulls = set()
+        # By PR number, the (mergeable, mergeable_state) answered by its successive GETs, the last one then
+        # stays, and the statuses (405, 409) refusing its first merges, as when its base or head moved
+        self.mergeability = {}
+        self.refused_merges = {}
+        self._repos = {}
+        self._lock = threading.Lock()
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def repo(self, full_name):
+        """The repo, generated on its first request, None when it is not a bench/prs-<N> repo"""
+        owner, _, name = full_name.partition('/')
+        match = REPO_NAME_RE.match(name)
+        if owner != OWNER or not match:
+            return None
+        with self._lock:
+            if full_name not in self._repos:
+                self._repos[full_name] = FakeRepo(full_name, int(match.group(1)))
+            return self._repos[full_name]
+
+    def count(self, endpoint):
+        with self._lock:
+            self.counts[endpoint] += 1
+
+    def throttle(self, limit=5000, remaining=None, reset_in=3600, secondary=0, retry_after=1):
+        """
+        Simulates the rate limits of the API: `remaining` requests by token, after which the token is
+        answered 403 until the reset, `reset_in` seconds from now. The next `secondary` requests are
+        answered 403 with a Retry-After of `retry_after` seconds, like the secondary rate limit
+        """
+        with self._lock:
+            self.throttling = {'limit': limit, 'remaining': dict(remaining or {}), 'reset': int(time.time()) + reset_in,
+                               'secondary': secondary, 'retry_after': retry_after}
+
+    def spend(self, authorization):
+        """
+        Counts a request of the token against its quota, returns its X-RateLimit-* headers
+        and the (status, message, headers) to answer instead of the API when it is throttled
+        """
+        token = (authorization or '').split(' ', 1)[-1]
+        with self._lock:
+            self.tokens[token] += 1
+            throttling = self.throttling or {'limit': 5000, 'remaining': {}, 'reset': int(time.time()) + 3600, 'secondary': 0}
+            remaining = throttling['remaining'].get(token, throttling['limit'] - 1)
+            rate_headers = [('X-RateLimit-Limit', str(throttling['limit'])), ('X-RateLimit-Reset', str(throttling['reset']))]
+            if throttling['secondary']:
+                throttling['secondary'] -= 1
+                return rate_headers + [('X-RateLimit-Remaining', str(remaining))], (
+                    403, 'You have exceeded a secondary rate limit', [('Retry-After', str(throttling['retry_after']))])
+            if remaining <= 0:
+                return rate_headers + [('X-RateLimit-Remaining', '0')], (403, 'API rate limit exceeded', [])
+            if token in throttling['remaining']:
+                throttling['remaining'][token] = remaining = remaining - 1
+            return rate_headers + [('X-RateLimit-Remaining', str(remaining))], None
+
+    def reset(self):
+        """Forgets the request counts, the throttling and the changes (merges, comments, labels) made to the repos"""
+        with self._lock:
+            self.counts = collections.Counter()
+            self.not_found = collections.Counter()
+            self.tokens = collections.Counter()
+            self.throttling = None
+            self.failing_pulls = set()
+            self.mergeability = {}
+            self.refused_merges = {}
+            for full_name, repo in self._repos.items():
+                if repo.modified:
+                    del self._repos[full_name]
+
+
+def _endpoint(verb, path):
+    """ie. GET /repos/bench/prs-10/pulls/3 -> GET /repos/:owner/:repo/pulls/:number"""
+    path = re.sub(r'^/repos/[^/]+/[^/]+', '/repos/:owner/:repo', path)
+    path = re.sub(r'/[0-9a-f]{40}(?=/|$)', '/:sha', path)
+    return '%s %s' % (verb, re.sub(r'/\d+(?=/|$)', '/:number', path))
+
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Buffers each response into a single write, unbuffered headers wait on delayed ACKs
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    ROUTES = [
+        ('GET', r'^/rate_limit$', 'rate_limit'),
+        ('GET', r'^/orgs/(\w+)$', 'get_org'),
+        ('GET', r'^/orgs/(\w+)/repos$', 'list_org_repos'),
+        ('POST', r'^/graphql$', 'graphql'),
+        ('GET', r'^/search/issues$', 'search_issues'),
+        ('GET', r'^/repos/([^/]+/[^/]+)$', 'get_repo'),
+        ('GET', r'^/repos/([^/]+/[^/]+)/pulls$', 'list_pulls'),
+        ('GET', r'^/repos/([^/]+/[^/]+)/pulls/(\d+)$', 'get_pull'),
+        ('PATCH', r'^/repos/([^/]+/[^/]+)/pulls/(\d+)$', 'update_pull'),
+        ('PUT', r'^/repos/([^/]+/[^/]+)/pulls/(\d+)/merge$', 'merge_pull'),
+        ('GET', r'^/repos/([^/]+/[^/]+)/pulls/(\d+)/files$', 'get_files'),
+        ('GET', r'^/repos/([^/]+/[^/]+)/issues$', 'list_issues'),
+        ('GET', r'^/repos/([^/]+/[^/]+)/issues/(\d+)$', 'get_issue'),
+        ('GET', r'^/repos/([^/]+/[^/]+)/issues/(\d+)/labels$', 'get_labels'),
+        ('POST', r'^/repos/([^/]+/[^/]+)/issues/(\d+)/labels$', 'add_labels'),
+        ('PUT', r'^/repos/([^/]+/[^/]+)/issues/(\d+)/labels$', 'set_labels'),
+        ('GET', r'^/repos/([^/]+/[^/]+)/issues/(\d+)/comments$', 'get_comments'),
+        ('POST', r'^/repos/([^/]+/[^/]+)/issues/(\d+)/comments$', 'add_comment'),
+        ('GET', r'^/repos/([^/]+/[^/]+)/commits/([0-9a-f]{40})$', 'get_commit'),
+        ('GET', r'^/repos/([^/]+/[^/]+)/commits/([0-9a-f]{40})/statuses$', 'get_statuses'),
+        ('GET', r'^/repos/([^/]+/[^/]+)/commits/([0-9a-f]{40})/status$', 'get_combined_status'),
+        ('GET', r'^/repos/([^/]+/[^/]+)/statuses/([0-9a-f]{40})$', 'get_statuses'),
+    ]
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def do_PATCH(self):
+        self._dispatch('PATCH')
+
+    def do_PUT(self):
+        self._dispatch('PUT')
+
+    def _dispatch(self, verb):
+        url = urlparse.urlparse(self.path)
+        self.query = dict((name, values[0]) for name, values in urlparse.parse_qs(url.query).items())
+        length = int(self.headers.get('Content-Length') or 0)
+        self.input = json.loads(self.rfile.read(length)) if length else None
+        if (verb, url.path) == ('GET', '/_fake/requests'):
+            return self._send(200, {'endpoints': self.server.counts, 'not_found': self.server.not_found, 'tokens': self.server.tokens})
+        if (verb, url.path) == ('POST', '/_fake/reset'):
+            self.server.reset()
+            return self._send(200, {})
+        if (verb, url.path) == ('POST', '/_fake/throttle'):
+            self.server.throttle(**dict((str(name), value) for name, value in self.input.items()))
+            return self._send(200, {})
+        # Enterprise paths
+        path = url.path
+        self.api_url = self.server.url
+        if path.startswith(ENTERPRISE_REST_PREFIX + '/') and path != ENTERPRISE_REST_PREFIX + '/graphql':
+            path = path[len(ENTERPRISE_REST_PREFIX):]
+            self.api_url += ENTERPRISE_REST_PREFIX
+        elif path == ENTERPRISE_GRAPHQL_PATH:
+            path = '/graphql'
+        self.server.count(_endpoint(verb, path))
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        self.rate_headers, throttled = self.server.spend(self.headers.get('Authorization'))
+        if throttled:
+            status, message, headers = throttled
+            return self._send(status, {'message': message, 'documentation_url': 'https://developer.github.com/v3/#rate-limiting'}, headers)
+        for route_verb, pattern, name in self.ROUTES:
+            match = re.match(pattern, path)
+            if route_verb == verb and match:
+                groups = list(match.groups())
+                if groups and groups[0].count('/') == 1:
+                    repo = self.server.repo(groups[0])
+                    if repo is None:
+                        return self._send(404, {'message': 'Not Found'})
+                    groups[0] = repo
+                    if len(groups) > 1 and groups[1].isdigit():
+                        if int(groups[1]) not in repo.prs:
+                            return self._send(404, {'message': 'Not Found'})
+                        groups[1] = repo.prs[int(groups[1])]
+                    elif len(groups) > 1 and groups[1] not in repo.by_sha:
+                        return self._send(422, {'message': 'No commit found for SHA: %s' % groups[1]})
+                    elif len(groups) > 1:
+                        groups[1] = repo.by_sha[groups[1]]
+                    if verb != 'GET':
+                        repo.modified = True
+                return getattr(self, name)(*groups)
+        self.server.not_found[_endpoint(verb, url.path)] += 1
+        self._send(404, {'message': 'Not Found'})
+
+    def _send(self, status, body, headers=()):
+        data = json.dumps(body)
+        etag = '"%s"' % hashlib.md5(data).hexdigest()
+        if self.command == 'GET' and self.headers.get('If-None-Match') == etag:
+            status, data = 304, ''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('ETag', etag)
+        for name, value in getattr(self, 'rate_headers', []) + list(headers):
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _page(self, items):
+        """The requested page of the items, with the Link header of the API"""
+        per_page = min(int(self.query.get('per_page', DEFAULT_PER_PAGE)), MAX_PER_PAGE)
+        page = int(self.query.get('page', 1))
+        last_page = max((len(items) + per_page - 1) // per_page, 1)
+        links = []
+        for rel, link_page in (('prev', page - 1), ('next', page + 1), ('first', 1), ('last', last_page)):
+            if 1 <= link_page <= last_page and link_page != page:
+                query = dict(self.query, page=link_page, per_page=per_page)
+                links.append('<%s%s?%s>; rel="%s"' % (self.server.url, urlparse.urlparse(self.path).path, urllib.urlencode(sorted(query.items())), rel))
+        return items[(page - 1) * per_page:page * per_page], links and [('Link', ', '.join(links))] or []
+
+    def _send_list(self, items):
+        page_items, headers = self._page(items)
+        self._send(200, page_items, headers)
+
+    def _repo_json(self, repo):
+        return {'url': '%s/repos/%s' % (self.api_url, repo.full_name),
+                'html_url': 'https://github.com/%s' % repo.full_name,
+                'full_name': repo.full_name, 'name': repo.full_name.split('/')[1],
+                'owner': {'login': OWNER, 'type': 'Organization'}, 'private': False, 'default_branch': 'master'}
+
+    def _user_json(self, login):
+        return {'login': login, 'id': USERS.index(login) + 1 if login in USERS else 0, 'type': 'User',
+                'url': '%s/users/%s' % (self.api_url, login)}
+
+    def _pull_json(self, repo, pr, full=False):
+        url = '%s/repos/%s' % (self.api_url, repo.full_name)
+        # A PR given a head_owner comes from the fork of that user
+        head_owner = pr.get('head_owner', OWNER)
+        head_repo = dict(self._repo_json(repo), full_name='%s/%s' % (head_owner, repo.full_name.split('/')[1]), owner={'login': head_owner, 'type': 'User'})
+        pull = {
+            'url': '%s/pulls/%d' % (url, pr['number']), 'issue_url': '%s/issues/%d' % (url, pr['number']),
+            'html_url': 'https://github.com/%s/pull/%d' % (repo.full_name, pr['number']),
+            'number': pr['number'], 'state': pr['state'], 'title': pr['title'], 'body': pr['body'],
+            'user': self._user_json(pr['user']), 'labels': [{'name': label} for label in pr['labels']],
+            'created_at': _time(pr['number'] * 60 - 30), 'updated_at': pr['updated_at'],
+            'head': {'label': '%s:%s' % (head_owner, pr['head_ref']), 'ref': pr['head_ref'], 'sha': pr['sha'],
+                     'user': self._user_json(pr['user']), 'repo': head_repo},
+            'base': {'label': '%s:%s' % (OWNER, pr['base_ref']), 'ref': pr['base_ref'], 'sha': pr.get('base_sha', '0' * 40),
+                     'user': {'login': OWNER}, 'repo': self._repo_json(repo)},
+        }
+        if full:
+            pull.update({'merged': pr['merged'], 'mergeable': pr['state'] == 'open', 'mergeable_state': 'clean',
+                         'comments': len(pr['comments']), 'commits': 1, 'additions': 10, 'deletions': 2, 'changed_files': 1})
+        return pull
+
+    def _issue_json(self, repo, pr):
+        url = '%s/repos/%s' % (self.api_url, repo.full_name)
+        return {'url': '%s/issues/%d' % (url, pr['number']), 'number': pr['number'], 'state': pr['state'],
+                'title': pr['title'], 'body': pr['body'], 'user': self._user_json(pr['user']),
+                'labels': [{'name': label, 'url': '%s/labels/%s' % (url, label)} for label in pr['labels']],
+                'comments': len(pr['comments']), 'updated_at': pr['updated_at'],
+                'pull_request': {'url': '%s/pulls/%d' % (url, pr['number'])}}
+
+    def _comment_json(self, comment):
+        return {'id': comment['id'], 'body': comment['body'], 'user': self._user_json(comment['user']),
+                'created_at': _time(comment['created_at']), 'updated_at': _time(comment['updated_at'])}
+
+    def _open_prs(self, repo):
+        return [pr for pr in repo.prs.values() if pr['state'] == 'open']
+
+    def rate_limit(self):
+        core = {'limit': 5000, 'remaining': 4999, 'reset': int(time.time()) + 3600}
+        self._send(200, {'resources': {'core': core}, 'rate': core})
+
+    def get_org(self, org):
+        if org != OWNER:
+            return self._send(404, {'message': 'Not Found'})
+        self._send(200, {'login': OWNER, 'url': '%s/orgs/%s' % (self.api_url, OWNER), 'type': 'Organization'})
+
+    def list_org_repos(self, org):
+        if org != OWNER:
+            return self._send(404, {'message': 'Not Found'})
+        self._send_list([self._repo_json(self.server.repo('%s/prs-%d' % (OWNER, size))) for size in ORG_REPO_SIZES])
+
+    def get_repo(self, repo):
+        self._send(200, self._repo_json(repo))
+
+    def list_pulls(self, repo):
+        state = self.query.get('state', 'open')
+        prs = [pr for pr in repo.prs.values() if state == 'all' or pr['state'] == state]
+        if 'head' in self.query:
+            prs = [pr for pr in prs if '%s:%s' % (pr.get('head_owner', OWNER), pr['head_ref']) == self.query['head']]
+        if 'base' in self.query:
+            prs = [pr for pr in prs if pr['base_ref'] == self.query['base']]
+        page_prs, headers = self._page(prs)
+        self._send(200, [self._pull_json(repo, pr) for pr in page_prs], headers)
+
+    def get_pull(self, repo, pr):
+        if pr['number'] in self.server.failing_pulls:
+            return self._send(502, {'message': 'Server Error'})
+        pull = self._pull_json(repo, pr, full=True)
+        mergeability = self.server.mergeability.get(pr['number'])
+        if mergeability and pr['state'] == 'open':
+            pull['mergeable'], pull['mergeable_state'] = mergeability.pop(0) if len(mergeability) > 1 else mergeability[0]
+        self._send(200, pull)
+
+    def update_pull(self, repo, pr):
+        pr.update((name, value) for name, value in self.input.items() if name in ('title', 'body', 'state'))
+        self._send(200, self._pull_json(repo, pr, full=True))
+
+    def merge_pull(self, repo, pr):
+        if pr['state'] != 'open':
+            return self._send(405, {'message': 'Pull Request is not mergeable'})
+        if self.server.refused_merges.get(pr['number']):
+            status = self.server.refused_merges[pr['number']].pop(0)
+            return self._send(status, {'message': 'Base branch was modified' if status == 405 else 'Head branch was modified'})
+        pr.update(state='closed', merged=True)
+        self._send(200, {'sha': hashlib.sha1(pr['sha']).hexdigest(), 'merged': True, 'message': 'Pull Request successfully merged'})
+
+    def list_issues(self, repo):
+        prs = self._open_prs(repo)
+        if 'labels' in self.query:
+            labels = set(self.query['labels'].split(','))
+            prs = [pr for pr in prs if labels <= set(pr['labels'])]
+        if 'creator' in self.query:
+            prs = [pr for pr in prs if pr['user'] == self.query['creator']]
+        page_prs, headers = self._page(prs)
+        self._send(200, [self._issue_json(repo, pr) for pr in page_prs], headers)
+
+    def get_issue(self, repo, pr):
+        self._send(200, self._issue_json(repo, pr))
+
+    def _send_labels(self, repo, pr):
+        url = '%s/repos/%s/labels' % (self.api_url, repo.full_name)
+        self._send_list([{'name': label, 'url': '%s/%s' % (url, label)} for label in pr['labels']])
+
+    def get_labels(self, repo, pr):
+        self._send_labels(repo, pr)
+
+    def add_labels(self, repo, pr):
+        pr['labels'] += [label for label in self.input if label not in pr['labels']]
+        self._send_labels(repo, pr)
+
+    def set_labels(self, repo, pr):
+        pr['labels'] = list(self.input)
+        self._send_labels(repo, pr)
+
+    def get_comments(self, repo, pr):
+        comments = pr['comments']
+        if 'since' in self.query:
+            comments = [comment for comment in comments if _time(comment['updated_at']) >= self.query['since']]
+        self._send_list([self._comment_json(comment) for comment in comments])
+
+    def add_comment(self, repo, pr):
+        minutes = pr['comments'][-1]['updated_at'] + 5 if pr['comments'] else pr['number'] * 60
+        comment = {'id': pr['number'] * 1000 + len(pr['comments']), 'body': self.input['body'], 'user': 'bench',
+                   'created_at': minutes, 'updated_at': minutes}
+        pr['comments'].append(comment)
+        self._send(201, self._comment_json(comment))
+
+    def get_commit(self, repo, pr):
+        url = '%s/repos/%s' % (self.api_url, repo.full_name)
+        self._send(200, {'sha': pr['sha'], 'url': '%s/commits/%s' % (url, pr['sha']),
+                         'commit': {'message': pr['title'], 'url': '%s/git/commits/%s' % (url, pr['sha']),
+                                    'author': {'name': pr['user'], 'date': pr['committed_at']},
+                                    'committer': {'name': pr['user'], 'date': pr['committed_at']}},
+                         'author': self._user_json(pr['user']), 'committer': self._user_json(pr['user'])})
+
+    def get_files(self, repo, pr):
+        files = pr.get('files', ['src/change_%d.py' % pr['number']])
+        self._send_list([{'sha': pr['sha'], 'filename': filename, 'status': 'modified', 'additions': 10, 'deletions': 2,
+                          'changes': 12} for filename in files])
+
+    def _status_json(self, status, index):
+        state, context, minutes = status
+        return {'id': index, 'state': state, 'context': context, 'description': 'The build is %s' % state,
+                'created_at': _time(minutes), 'updated_at': _time(minutes)}
+
+    def get_statuses(self, repo, pr):
+        self._send_list([self._status_json(status, i) for i, status in enumerate(pr['statuses'])])
+
+    def get_combined_status(self, repo, pr):
+        latest = collections.OrderedDict()
+        for i, status in enumerate(pr['statuses']):
+            latest.setdefault(status[1], self._status_json(status, i))
+        states = set(status['state'] for status in latest.values())
+        state = 'failure' if states & set(['failure', 'error']) else 'pending' if 'pending' in states or not states else 'success'
+        self._send(200, {'state': state, 'sha': pr['sha'], 'total_count': len(latest), 'statuses': list(latest.values()),
+                         'repository': self._repo_json(repo)})
+
+    def search_issues(self):
+        qualifiers = dict(re.findall(r'(\w+):("[^"]*"|\S+)', self.query.get('q', '')))
+        repo = self.server.repo(qualifiers.get('repo', ''))
+        prs = self._open_prs(repo) if repo else []
+        if 'author' in qualifiers:
+            prs = [pr for pr in prs if pr['user'] == qualifiers['author']]
+        for label in re.findall(r'label:"?([^"\s]+)"?', self.query.get('q', '')):
+            prs = [pr for pr in prs if label in pr['labels']]
+        page_prs, headers = self._page(prs)
+        self._send(200, {'total_count': len(prs), 'incomplete_results': False,
+                         'items': [self._issue_json(repo, pr) for pr in page_prs]}, headers)
+
+    def graphql(self):
+        """Answers the open PRs query of github-pr, whatever the fields it asks for"""
+        variables = self.input['variables']
+        repo = self.server.repo('%s/%s' % (variables['owner'], variables['name']))
+        if repo is None:
+            return self._send(200, {'data': {'repository': None}, 'errors': [{'type': 'NOT_FOUND', 'message': 'Could not resolve to a Repository'}]})
+        prs = self._open_prs(repo)
+        start = int(variables.get('cursor') or 0)
+        end = start + variables['pageSize']
+        repository = {'nameWithOwner': repo.full_name, 'owner': {'login': OWNER}}
+        nodes = []
+        for pr in prs[start:end]:
+            latest = collections.OrderedDict()
+            for state, context, minutes in pr['statuses']:
+                latest.setdefault(context, {'state': state.upper(), 'context': context})
+            nodes.append({
+                'number': pr['number'], 'title': pr['title'], 'state': pr['state'].upper(), 'author': {'login': pr['user']},
+                'baseRefName': pr['base_ref'], 'baseRefOid': '0' * 40, 'baseRepository': repository,
+                'headRefName': pr['head_ref'], 'headRefOid': pr['sha'], 'headRepository': repository,
+                'labels': {'totalCount': len(pr['labels']), 'nodes': [{'name': label} for label in pr['labels'][:100]]},
+                'commits': {'nodes': [{'commit': {'status': latest and {'contexts': list(latest.values())} or None}}]},
+                'comments': {'totalCount': len(pr['comments']), 'nodes': [{'body': comment['body']} for comment in pr['comments'][-100:]]},
+            })
+        self._send(200, {'data': {'repository': {'pullRequests': {
+            'pageInfo': {'hasNextPage': end < len(prs), 'endCursor': str(end)}, 'nodes': nodes}}}})
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serves a fake of the GitHub API, with the generated bench/prs-<N> repos')
+    parser.add_argument('--port', type=int, default=8000, help='port to listen on, on 127.0.0.1, 0 for any free port')
+    parser.add_argument('--latency', type=float, default=0, help='milliseconds to wait before each response')
+    args = parser.parse_args()
+    server = FakeGithubServer(args.port, args.latency / 1000.0)
+    print "Serving a fake GitHub API on %s" % server.url
+    sys.stdout.flush()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+"""
+Benchmark of github-pr ingest: replaying captured webhook events, and receiving signed deliveries with --listen
+
+The events are those GitHub would send for the generated PRs of the fake API: the opening of each
+PR, its comments and statuses. Reports the wall time, events/s and peak memory of each mode, checks
+that the index holds every PR, and fails when a mode is slower than its minimum rate.
+
+    python benchmarks/ingest.py
+    python benchmarks/ingest.py --prs 10000 --deliveries 2000
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import urllib2
+
+from tabulate import tabulate
+
+from fake_github import OWNER, _generate_pr, _time
+from run import GITHUB_PR, _peak_memory_mb
+
+REPO = '%s/prs-ingest' % OWNER
+WEBHOOK_SECRET = 'benchmark'
+MIN_RATES = {'replay': 2000, 'listen': 50}
+
+
+def _repository():
+    return {'full_name': REPO, 'owner': {'login': OWNER}}
+
+
+def _events(pr_count):
+    """(event name, payload) of the webhooks of the generated PRs, in the order GitHub sends them"""
+    for number in range(1, pr_count + 1):
+        pr = _generate_pr(REPO, number)
+        user = {'login': pr['user']}
+        yield 'pull_request', {'action': 'opened', 'repository': _repository(), 'pull_request': {
+            'number': number, 'state': 'open', 'title': pr['title'], 'user': user, 'updated_at': pr['updated_at'],
+            'labels': [{'name': label} for label in pr['labels']],
+            'base': {'ref': pr['base_ref'], 'sha': '0' * 40, 'repo': _repository()},
+            'head': {'ref': pr['head_ref'], 'sha': pr['sha'], 'repo': _repository()}}}
+        for state, context, minutes in reversed(pr['statuses']):
+            yield 'status', {'sha': pr['sha'], 'state': state, 'context': context, 'repository': _repository(),
+                             'commit': {'commit': {'committer': {'date': pr['committed_at']}}}}
+        issue = {'number': number, 'state': 'open', 'title': pr['title'], 'user': user, 'updated_at': pr['updated_at'],
+                 'labels': [{'name': label} for label in pr['labels']], 'pull_request': {}}
+        for comment in pr['comments']:
+            yield 'issue_comment', {'action': 'created', 'repository': _repository(), 'issue': issue, 'comment': {
+                'id': comment['id'], 'user': {'login': comment['user']}, 'body': comment['body'],
+                'created_at': _time(comment['created_at']), 'updated_at': _time(comment['updated_at'])}}
+
+
+def _indexed_prs(index_path):
+    connection = sqlite3.connect(index_path)
+    try:
+        return connection.execute("SELECT COUNT(*) FROM prs WHERE repo = ?", (REPO,)).fetchone()[0]
+    finally:
+        connection.close()
+
+
+def _free_port():
+    probe = socket.socket()
+    probe.bind(('127.0.0.1', 0))
+    port = probe.getsockname()[1]
+    probe.close()
+    return port
+
+
+def replay(work_dir, pr_count):
+    """Replays the events of pr_count PRs from a file, in a new process"""
+    events_path = os.path.join(work_dir, 'events.jsonl')
+    index_path = os.path.join(work_dir, 'replay.sqlite')
+    with open(events_path, 'w') as events_file:
+        events = 0
+        for event, payload in _events(pr_count):
+            events_file.write(json.dumps({'event': event, 'payload': payload}) + '\n')
+            events += 1
+    with open(os.devnull, 'w') as devnull:
+        start = time.time()
+        process = subprocess.Popen([sys.executable, GITHUB_PR, 'ingest', '--events', events_path, '--index', index_path, '--no-cache'],
+                                   stdout=devnull)
+        _, status, usage = os.wait4(process.pid, 0)
+        wall_time = time.time() - start
+    if status != 0:
+        raise SystemExit("ingest --events exited with %d" % status)
+    return {'mode': 'replay', 'events': events, 'wall_time': wall_time,
+            'peak_memory_mb': _peak_memory_mb(usage), 'indexed_prs': _indexed_prs(index_path)}
+
+
+def listen(work_dir, pr_count, deliveries):
+    """Sends the first `deliveries` events of pr_count PRs as signed webhooks to an ingest --listen process"""
+    index_path = os.path.join(work_dir, 'listen.sqlite')
+    port = _free_port()
+    address = '127.0.0.1:%d' % port
+    process = subprocess.Popen([sys.executable, GITHUB_PR, 'ingest', '--listen', address, '--index', index_path,
+                                '--webhook-secret', WEBHOOK_SECRET, '--no-cache'])
+    try:
+        for _ in range(100):
+            try:
+                socket.create_connection(('127.0.0.1', port)).close()
+                break
+            except socket.error:
+                time.sleep(0.05)
+        sent = 0
+        numbers = set()
+        start = time.time()
+        for event, payload in _events(pr_count):
+            if sent == deliveries:
+                break
+            body = json.dumps(payload)
+            signature = 'sha256=' + hmac.new(WEBHOOK_SECRET, body, hashlib.sha256).hexdigest()
+            urllib2.urlopen(urllib2.Request('http://%s/' % address, body, {
+                'X-GitHub-Event': event, 'X-Hub-Signature-256': signature, 'Content-Type': 'application/json'})).close()
+            sent += 1
+            numbers.add((payload.get('pull_request') or payload.get('issue') or {}).get('number'))
+        wall_time = time.time() - start
+    finally:
+        process.terminate()
+        _, status, usage = os.wait4(process.pid, 0)
+    return {'mode': 'listen', 'events': sent, 'wall_time': wall_time, 'peak_memory_mb': _peak_memory_mb(usage),
+            'indexed_prs': _indexed_prs(index_path), 'expected_prs': len(numbers - set([None]))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of github-pr ingest, from captured events and from webhooks')
+    parser.add_argument('--prs', type=int, default=5000, help='generated PRs whose events are replayed')
+    parser.add_argument('--deliveries', type=int, default=1000, help='webhooks delivered to ingest --listen')
+    parser.add_argument('--min-replay-rate', type=float, default=MIN_RATES['replay'], help='least replayed events/s')
+    parser.add_argument('--min-listen-rate', type=float, default=MIN_RATES['listen'], help='least received webhooks/s')
+    args = parser.parse_args()
+    min_rates = {'replay': args.min_replay_rate, 'listen': args.min_listen_rate}
+
+    work_dir = tempfile.mkdtemp()
+    try:
+        results = [replay(work_dir, args.prs), listen(work_dir, args.prs, args.deliveries)]
+    finally:
+        shutil.rmtree(work_dir)
+
+    failures = []
+    rows = []
+    for result in results:
+        rate = result['events'] / max(result['wall_time'], 1e-6)
+        rows.append([result['mode'], result['events'], "%.2f" % result['wall_time'], "%.0f" % rate, "%.0f" % min_rates[result['mode']],
+                     result['indexed_prs'], "%.1f" % result['peak_memory_mb']])
+        if rate < min_rates[result['mode']]:
+            failures.append("%s applied %.0f events/s, under the minimum of %.0f" % (result['mode'], rate, min_rates[result['mode']]))
+        expected_prs = result.get('expected_prs', args.prs)
+        if result['indexed_prs'] != expected_prs:
+            failures.append("%s indexed %d PRs instead of %d" % (result['mode'], result['indexed_prs'], expected_prs))
+
+    print tabulate(rows, headers=['Mode', 'Events', 'Wall (s)', 'Events/s', 'Min events/s', 'Indexed PRs', 'Peak RSS (MB)'])
+    for failure in failures:
+        sys.stderr.write("FAIL: %s\n" % failure)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
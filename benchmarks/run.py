@@ -0,0 +1,170 @@
+"""
+Offline benchmarks of the github-pr command paths, against the local fake of the GitHub API
+
+Runs every command path on the generated repos of 10, 100, 1,000 and 10,000 PRs, each in its own
+process with a cold cache, and reports its wall time, API requests and peak memory. Fails when a
+command makes more requests than in the stored baseline.
+
+    python benchmarks/run.py
+    python benchmarks/run.py --sizes 10,100 --latency 50
+    python benchmarks/run.py --update-baseline
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib2
+
+from tabulate import tabulate
+
+from fake_github import SHIPPABLE_NUMBER
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+FAKE_GITHUB = os.path.join(BENCHMARKS_DIR, 'fake_github.py')
+GITHUB_PR = os.path.join(os.path.dirname(BENCHMARKS_DIR), 'github_pr.py')
+DEFAULT_BASELINE = os.path.join(BENCHMARKS_DIR, 'baseline.json')
+SIZES = [10, 100, 1000, 10000]
+
+# Command paths, by name: the github-pr arguments run against each repo
+PATHS = [
+    ('list', ['list']),
+    ('filters', ['list', '--filters', 'status=success,comment=shipit']),
+    ('filters-graphql', ['list', '--filters', 'status=success,comment=shipit', '--graphql']),
+    ('table', ['list', '--table']),
+    ('merge', ['merge', '-n', str(SHIPPABLE_NUMBER), '--condition-non-owner-merger']),
+    ('check-condition', ['check-condition', '-n', str(SHIPPABLE_NUMBER), '--condition-non-owner-merger']),
+]
+
+
+def _peak_memory_mb(usage):
+    """ru_maxrss is in kilobytes on Linux and in bytes on macOS"""
+    return usage.ru_maxrss / (1024.0 * 1024 if sys.platform == 'darwin' else 1024.0)
+
+
+class FakeGithub(object):
+    """
+    The fake API, in its own process: a forked child counts the memory of its parent
+    until it execs, so this one stays small enough to not skew the peak memory
+    """
+
+    def __init__(self, latency=0):
+        self.process = subprocess.Popen([sys.executable, FAKE_GITHUB, '--port', '0', '--latency', str(latency)], stdout=subprocess.PIPE)
+        self.url = self.process.stdout.readline().split()[-1]
+
+    def _call(self, path, data=None):
+        return json.load(urllib2.urlopen(self.url + path, data))
+
+    def reset(self):
+        self._call('/_fake/reset', '')
+
+    def requests(self):
+        return self._call('/_fake/requests')
+
+    def throttle(self, **throttling):
+        """Simulates rate limits, see FakeGithubServer.throttle"""
+        self._call('/_fake/throttle', json.dumps(throttling))
+
+    def stop(self):
+        self.process.terminate()
+        self.process.wait()
+
+
+def run_path(server, size, argv):
+    """Runs a command path on the repo of `size` PRs, in a new process, and returns its measures"""
+    server.reset()
+    env = dict((name, value) for name, value in os.environ.items() if not name.startswith('GITHUB_'))
+    command = [sys.executable, GITHUB_PR] + argv + ['-r', 'bench/prs-%d' % size, '--api-url', server.url,
+                                                    '--token', 'bench', '--no-cache']
+    with open(os.devnull, 'w') as devnull, tempfile.TemporaryFile() as stderr:
+        start = time.time()
+        process = subprocess.Popen(command, stdout=devnull, stderr=stderr, env=env)
+        # wait4 gives the resource usage of this process alone, RUSAGE_CHILDREN is the max of all of them
+        _, status, usage = os.wait4(process.pid, 0)
+        wall_time = time.time() - start
+        process.returncode = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -os.WTERMSIG(status)
+        stderr.seek(0)
+        errors = stderr.read()
+    requests = server.requests()
+    return {'wall_time': wall_time, 'requests': sum(requests['endpoints'].values()), 'endpoints': requests['endpoints'],
+            'not_found': requests['not_found'], 'peak_memory_mb': _peak_memory_mb(usage),
+            'status': process.returncode, 'stderr': errors}
+
+
+def _parse_list(value, choices=None):
+    items = [item.strip() for item in value.split(',') if item.strip()]
+    unknown = [item for item in items if choices is not None and item not in choices]
+    if unknown:
+        raise argparse.ArgumentTypeError("unknown %s, expected any of %s" % (','.join(unknown), ','.join(choices)))
+    return items
+
+
+def main():
+    path_names = [name for name, argv in PATHS]
+    parser = argparse.ArgumentParser(description='Offline benchmarks of github-pr against a local fake of the GitHub API')
+    parser.add_argument('--sizes', type=lambda value: [int(size) for size in _parse_list(value)], default=SIZES,
+                        help='comma separated numbers of PRs of the benchmarked repos (default: %s)' % ','.join(map(str, SIZES)))
+    parser.add_argument('--paths', type=lambda value: _parse_list(value, path_names), default=path_names,
+                        help='comma separated command paths to run (default: %s)' % ','.join(path_names))
+    parser.add_argument('--latency', type=float, default=0, help='milliseconds the fake API waits before each response')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='JSON file of the most requests of each command path')
+    parser.add_argument('--update-baseline', action='store_true', help='store the request counts of this run as the baseline')
+    parser.add_argument('--json', help='file to write the measures to, as JSON')
+    args = parser.parse_args()
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+
+    server = FakeGithub(args.latency)
+    results = []
+    failures = []
+    try:
+        for size in args.sizes:
+            for name, argv in PATHS:
+                if name not in args.paths:
+                    continue
+                result = run_path(server, size, argv)
+                result.update(path=name, prs=size, baseline=baseline.get(name, {}).get(str(size)))
+                results.append(result)
+                if result['status'] != 0:
+                    failures.append("%s on %d PRs exited with %d:\n%s" % (name, size, result['status'], result['stderr']))
+                elif result['not_found']:
+                    failures.append("%s on %d PRs made requests the fake API has no route for: %s" % (
+                        name, size, json.dumps(result['not_found'], sort_keys=True)))
+                elif result['baseline'] is not None and result['requests'] > result['baseline'] and not args.update_baseline:
+                    failures.append("%s on %d PRs made %d requests, more than the %d of the baseline: %s" % (
+                        name, size, result['requests'], result['baseline'], json.dumps(result['endpoints'], sort_keys=True)))
+                sys.stderr.write("%s on %d PRs: %.2fs\n" % (name, size, result['wall_time']))
+    finally:
+        server.stop()
+
+    print tabulate([[measure['path'], measure['prs'], "%.2f" % measure['wall_time'], measure['requests'],
+                     '' if measure['baseline'] is None else measure['baseline'], "%.1f" % measure['peak_memory_mb']]
+                    for measure in results],
+                   headers=['Path', 'PRs', 'Wall (s)', 'Requests', 'Baseline', 'Peak RSS (MB)'])
+
+    if args.json:
+        with open(args.json, 'w') as json_file:
+            json.dump([dict((field, value) for field, value in measure.items() if field != 'stderr') for measure in results],
+                      json_file, indent=2, sort_keys=True)
+
+    if args.update_baseline:
+        for result in results:
+            if result['status'] == 0 and not result['not_found']:
+                baseline.setdefault(result['path'], {})[str(result['prs'])] = result['requests']
+        with open(args.baseline, 'w') as baseline_file:
+            json.dump(baseline, baseline_file, indent=2, sort_keys=True)
+            baseline_file.write('\n')
+        print "Stored the request counts in %s" % args.baseline
+
+    for failure in failures:
+        sys.stderr.write("FAIL: %s\n" % failure)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
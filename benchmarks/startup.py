@@ -0,0 +1,101 @@
+"""
+Start up benchmark of github-pr: the wall time of `--help` and of a `comment`, against the local fake of the GitHub API
+
+Fails when the median time a command adds to the start of a bare interpreter (python -c pass) is
+over its target, or when a command imports one of the modules it should defer. Leaving the
+interpreter out keeps the targets about github-pr, with some headroom for slower machines.
+Python 2 has no -X importtime, the imports are listed with python -v.
+
+    python benchmarks/startup.py
+    python benchmarks/startup.py --runs 50 --target-help 80 --target-comment 200
+"""
+import argparse
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from tabulate import tabulate
+
+from run import FakeGithub, GITHUB_PR
+
+# Modules each command must not import: the HTTP, server, index, table and thread pool code of other actions
+DEFERRED_MODULES = {
+    'help': ['github', 'httplib', 'socket', 'ssl', 'SocketServer', 'sqlite3', 'tabulate', 'multiprocessing', 'BaseHTTPServer'],
+    'comment': ['SocketServer', 'sqlite3', 'tabulate', 'multiprocessing', 'BaseHTTPServer'],
+}
+# Milliseconds over the start of a bare interpreter
+TARGETS_MS = {'help': 80, 'comment': 160}
+
+
+def _commands(server, cache_dir):
+    return [
+        ('help', ['--help']),
+        ('comment', ['comment', '-r', 'bench/prs-10', '-n', '1', '--body', 'Benchmarking the start up',
+                     '--api-url', server.url, '--token', 'bench', '--cache-dir', cache_dir]),
+    ]
+
+
+def _imported_modules(argv):
+    """Names of the modules imported by a command, from the trace of python -v"""
+    process = subprocess.Popen([sys.executable, '-v', GITHUB_PR] + argv, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    _, trace = process.communicate()
+    return set(re.findall(r'^import (\S+) #', trace, re.M))
+
+
+def _wall_times_ms(argv, runs):
+    """Sorted wall times of running python with argv"""
+    wall_times = []
+    with open(os.devnull, 'w') as devnull:
+        for _ in range(runs):
+            start = time.time()
+            status = subprocess.call([sys.executable] + argv, stdout=devnull, stderr=devnull)
+            wall_times.append(1000 * (time.time() - start))
+            if status != 0:
+                raise SystemExit("python %s exited with %d" % (' '.join(argv), status))
+    return sorted(wall_times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Start up benchmark of github-pr --help and comment')
+    parser.add_argument('--runs', type=int, default=20, help='runs of each command, the median is compared to the target')
+    parser.add_argument('--target-help', type=float, default=TARGETS_MS['help'],
+                        help='target median milliseconds github-pr --help adds to the start of the interpreter')
+    parser.add_argument('--target-comment', type=float, default=TARGETS_MS['comment'],
+                        help='target median milliseconds a comment adds to the start of the interpreter')
+    args = parser.parse_args()
+    targets = {'help': args.target_help, 'comment': args.target_comment}
+
+    server = FakeGithub()
+    cache_dir = tempfile.mkdtemp()
+    rows = []
+    failures = []
+    try:
+        interpreter_times = _wall_times_ms(['-c', 'pass'], args.runs)
+        interpreter = interpreter_times[len(interpreter_times) // 2]
+        rows.append(['python -c pass', "%.0f" % interpreter_times[0], "%.0f" % interpreter, '', '', ''])
+        for name, argv in _commands(server, cache_dir):
+            modules = _imported_modules(argv)
+            imported = sorted(module for module in DEFERRED_MODULES[name] if module in modules)
+            if imported:
+                failures.append("%s imports %s" % (name, ', '.join(imported)))
+            wall_times = _wall_times_ms([GITHUB_PR] + argv, args.runs)
+            median = wall_times[len(wall_times) // 2]
+            if median - interpreter > targets[name]:
+                failures.append("%s adds %.0f ms to the interpreter, over its target of %.0f ms" % (name, median - interpreter, targets[name]))
+            rows.append([name, "%.0f" % wall_times[0], "%.0f" % median, "%.0f" % (median - interpreter), "%.0f" % targets[name], len(modules)])
+    finally:
+        server.stop()
+        shutil.rmtree(cache_dir)
+
+    print tabulate(rows, headers=['Command', 'Min (ms)', 'Median (ms)', 'Added (ms)', 'Target (ms)', 'Modules'])
+    for failure in failures:
+        sys.stderr.write("FAIL: %s\n" % failure)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,14 +1,29 @@
 #!/usr/bin/env python
 import argparse
+import collections
+import contextlib
+import csv
 from datetime import datetime
-import pytz
-from tzlocal import get_localzone
+import fnmatch
+import functools
+import hashlib
+import hmac
+import itertools
+import json
+import Queue
 import sys
 import os
+import random
 import re
 import logging
-from tabulate import tabulate
-from github import Github
+from StringIO import StringIO
+import threading
+import time
+import traceback
+import types
+# PyGithub, tabulate, the thread pool, and httplib, socket (with ssl), SocketServer and sqlite3
+# are imported by the functions using them: they are most of the start up time, and
+# github-pr --help or comment need few of them
 
 
 class NoApproversError(Exception):
@@ -24,6 +39,1147 @@ class NoMergeCommentError(Exception):
 
 logger = logging.getLogger()
 
+DEFAULT_API_URL = "https://api.github.com"
+LOG_LEVELS = {0: logging.WARN, 1: logging.INFO, 2: logging.DEBUG}
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'github-pr')
+DEFAULT_SERVER_SOCKET = os.path.join(DEFAULT_CACHE_DIR, 'server.sock')
+DEFAULT_INDEX = os.path.join(DEFAULT_CACHE_DIR, 'index.sqlite')
+sha_store = None
+request_stats = None
+_approved_mergers_files = {}
+_indexes = {}
+_indexes_lock = threading.Lock()
+_connection_pool = collections.defaultdict(list)
+_connection_pool_lock = threading.Lock()
+
+GRAPHQL_PAGE_SIZE = 50
+GRAPHQL_OPEN_PRS_QUERY = """
+query($owner: String!, $name: String!, $pageSize: Int!, $cursor: String) {
+  repository(owner: $owner, name: $name) {
+    pullRequests(states: OPEN, first: $pageSize, after: $cursor) {
+      pageInfo { hasNextPage endCursor }
+      nodes {
+        number
+        title
+        state
+        author { login }
+        baseRefName
+        baseRefOid
+        baseRepository { nameWithOwner owner { login } }
+        headRefName
+        headRefOid
+        headRepository { nameWithOwner owner { login } }
+        labels(first: 100) { totalCount nodes { name } }
+        commits(last: 1) { nodes { commit { status { contexts { state } } } } }
+        comments(last: 100) { totalCount nodes { body } }
+      }
+    }
+  }
+}
+"""
+
+
+def _makedirs_private(path):
+    """Creates a directory only its user can read, what is cached can come from private repos"""
+    if not os.path.isdir(path):
+        os.makedirs(path, 0o700)
+
+
+def _open_private(path):
+    """Opens a new file for writing that only its user can read"""
+    return os.fdopen(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w')
+
+
+class HTTPCache(object):
+    """
+    On disk cache of GET responses, keyed by URL and token, that is revalidated with
+    conditional requests (ETag/Last-Modified). A 304 Not Modified does not count
+    against the rate limit. The least recently used entries are evicted once the
+    cache grows over max_size bytes.
+    Recently used entries are also kept in memory, and entries younger than max_age
+    seconds are used without revalidating them.
+    """
+    MEMORY_ENTRIES = 1000
+
+    def __init__(self, path, max_size, max_age=0):
+        self.path = path
+        self.max_size = max_size
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._size = None
+        self._memory = collections.OrderedDict()
+        self._lock = threading.Lock()
+        _makedirs_private(path)
+
+    def key(self, host, url, headers):
+        return hashlib.sha1('\n'.join([host, url, headers.get('Accept') or '', headers.get('Authorization') or ''])).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.path, key + '.json')
+
+    def _remember(self, key, entry):
+        self._memory[key] = entry
+        if len(self._memory) > self.MEMORY_ENTRIES:
+            self._memory.popitem(last=False)
+
+    def load(self, key):
+        with self._lock:
+            if key in self._memory:
+                entry = self._memory.pop(key)
+                self._memory[key] = entry
+                return entry
+        try:
+            with open(self._entry_path(key)) as entry_file:
+                entry = json.load(entry_file)
+        except (IOError, ValueError):
+            return None
+        with self._lock:
+            self._remember(key, entry)
+        return entry
+
+    def fresh(self, entry):
+        return self.max_age > 0 and time.time() - entry.get('time', 0) < self.max_age
+
+    def hit(self, key, entry=None):
+        with self._lock:
+            self.hits += 1
+            if entry is not None:
+                entry['time'] = time.time()
+        try:
+            os.utime(self._entry_path(key), None)
+        except OSError:
+            pass
+
+    def miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def store(self, key, status, headers, body):
+        try:
+            entry = {'status': status, 'headers': headers, 'body': body.decode('utf-8'), 'time': time.time()}
+        except UnicodeDecodeError:
+            return
+        with self._lock:
+            self._remember(key, entry)
+        entry = json.dumps(entry)
+        path = self._entry_path(key)
+        tmp_path = '%s.%d.%d.tmp' % (path, os.getpid(), threading.current_thread().ident)
+        with _open_private(tmp_path) as entry_file:
+            entry_file.write(entry)
+        try:
+            replaced_size = os.path.getsize(path)
+        except OSError:
+            replaced_size = 0
+        os.rename(tmp_path, path)
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for mtime, size, entry_path in self._entries())
+            else:
+                self._size += len(entry) - replaced_size
+            if self._size > self.max_size:
+                self._evict()
+
+    def _entries(self):
+        entries = []
+        for name in os.listdir(self.path):
+            entry_path = os.path.join(self.path, name)
+            try:
+                stat = os.stat(entry_path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry_path))
+        return entries
+
+    def _evict(self):
+        entries = sorted(self._entries())
+        self._size = sum(size for mtime, size, entry_path in entries)
+        for mtime, size, entry_path in entries:
+            if self._size <= self.max_size * 0.9:
+                break
+            try:
+                os.remove(entry_path)
+            except OSError:
+                pass
+            self._size -= size
+        logger.debug("HTTP CACHE EVICTED DOWN TO %d BYTES", self._size)
+
+
+class ShaStore(object):
+    """
+    Content addressed store for data that never changes for given commit SHAs,
+    like the files between a PR base and head or the statuses of a commit whose checks succeeded
+    """
+
+    def __init__(self, path):
+        self.path = path
+        _makedirs_private(path)
+
+    def _entry_path(self, kind, sha):
+        return os.path.join(self.path, kind, sha[:2], sha + '.json')
+
+    def get(self, kind, sha):
+        try:
+            with open(self._entry_path(kind, sha)) as entry_file:
+                return json.load(entry_file)
+        except (IOError, ValueError):
+            return None
+
+    def put(self, kind, sha, value):
+        path = self._entry_path(kind, sha)
+        try:
+            _makedirs_private(os.path.dirname(path))
+        except OSError:
+            pass
+        tmp_path = '%s.%d.%d.tmp' % (path, os.getpid(), threading.current_thread().ident)
+        with _open_private(tmp_path) as entry_file:
+            json.dump(value, entry_file)
+        os.rename(tmp_path, path)
+
+
+class PRIndex(object):
+    """
+    Local SQLite mirror of the PRs of repos, with their labels, head statuses and issue comments
+    Kept current by github_sync, and read by list --from-index without any API call
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS prs (
+            repo TEXT, number INTEGER, state TEXT, title TEXT, owner TEXT,
+            base_owner TEXT, base_ref TEXT, head_owner TEXT, head_ref TEXT, head_sha TEXT,
+            mergeable_state TEXT, updated_at TEXT, PRIMARY KEY (repo, number));
+        CREATE TABLE IF NOT EXISTS labels (repo TEXT, number INTEGER, name TEXT, PRIMARY KEY (repo, number, name));
+        CREATE TABLE IF NOT EXISTS statuses (
+            repo TEXT, number INTEGER, position INTEGER, state TEXT, context TEXT, PRIMARY KEY (repo, number, position));
+        CREATE TABLE IF NOT EXISTS comments (
+            repo TEXT, number INTEGER, id INTEGER, user TEXT, body TEXT, created_at TEXT, updated_at TEXT,
+            PRIMARY KEY (repo, id));
+        CREATE TABLE IF NOT EXISTS head_commits (repo TEXT, sha TEXT, committed_at TEXT, PRIMARY KEY (repo, sha));
+        CREATE TABLE IF NOT EXISTS syncs (repo TEXT PRIMARY KEY, synced_at TEXT);
+        CREATE INDEX IF NOT EXISTS prs_owner ON prs (repo, state, owner);
+        CREATE INDEX IF NOT EXISTS prs_sha ON prs (repo, head_sha);
+        CREATE INDEX IF NOT EXISTS prs_head ON prs (repo, head_ref, base_ref);
+        CREATE INDEX IF NOT EXISTS prs_base ON prs (repo, base_ref);
+        CREATE INDEX IF NOT EXISTS labels_name ON labels (repo, name, number);
+        CREATE INDEX IF NOT EXISTS statuses_state ON statuses (repo, state, number);
+        CREATE INDEX IF NOT EXISTS comments_pr ON comments (repo, number, created_at);
+    """
+    TIME_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+    # Condition on the statuses s that are the newest of their context
+    LATEST_STATUS = """NOT EXISTS (SELECT 1 FROM statuses n WHERE n.repo = s.repo AND n.number = s.number
+                                   AND n.context IS s.context AND n.position < s.position)"""
+
+    def __init__(self, path):
+        import sqlite3
+        _makedirs_private(os.path.dirname(os.path.abspath(path)))
+        if not os.path.exists(path):
+            # sqlite creates the file readable by all, and its journals with the mode of the file
+            os.close(os.open(path, os.O_WRONLY | os.O_CREAT, 0o600))
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.executescript(self.SCHEMA)
+        if 'context' not in [column['name'] for column in self.connection.execute("PRAGMA table_info(statuses)")]:
+            # Indexes of earlier versions kept the states without their context, the newest one stands for them all
+            self.connection.execute("ALTER TABLE statuses ADD COLUMN context TEXT")
+        self._lock = threading.Lock()
+
+    def last_sync(self, repo_name):
+        with self._lock:
+            row = self.connection.execute("SELECT synced_at FROM syncs WHERE repo = ?", (repo_name,)).fetchone()
+        return datetime.strptime(row['synced_at'], self.TIME_FORMAT) if row else None
+
+    def set_last_sync(self, repo_name, synced_at):
+        with self._lock, self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO syncs VALUES (?, ?)", (repo_name, synced_at.strftime(self.TIME_FORMAT)))
+
+    def store_pr(self, repo_name, record):
+        """Replaces the PR row, its labels and statuses, and its comments updated since the record's comments_since"""
+        with self._lock, self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO prs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                    (repo_name, record['number'], record['state'], record['title'], record['owner'],
+                                     record['base_owner'], record['base_ref'], record['head_owner'], record['head_ref'],
+                                     record['head_sha'], record['mergeable_state'], record['updated_at']))
+            self.connection.execute("DELETE FROM labels WHERE repo = ? AND number = ?", (repo_name, record['number']))
+            self.connection.executemany("INSERT INTO labels VALUES (?, ?, ?)",
+                                        [(repo_name, record['number'], label) for label in record['labels']])
+            self._store_statuses(repo_name, record['number'], record['statuses'])
+            # The comments listed are all those updated since comments_since, the others of that time were deleted
+            self.connection.execute("DELETE FROM comments WHERE repo = ? AND number = ? AND updated_at >= ?",
+                                    (repo_name, record['number'], record.get('comments_since') or ''))
+            self.connection.executemany("INSERT OR REPLACE INTO comments VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                        [(repo_name, record['number'], comment['id'], comment['user'], comment['body'],
+                                          comment['created_at'], comment['updated_at']) for comment in record['comments']])
+            if record.get('head_committed_at'):
+                self.connection.execute("INSERT OR REPLACE INTO head_commits VALUES (?, ?, ?)",
+                                        (repo_name, record['head_sha'], record['head_committed_at']))
+
+    def store_statuses(self, repo_name, number, statuses):
+        with self._lock, self.connection:
+            self._store_statuses(repo_name, number, statuses)
+
+    def _store_statuses(self, repo_name, number, statuses):
+        """Replaces the [state, context] statuses of a PR head, newest first"""
+        self.connection.execute("DELETE FROM statuses WHERE repo = ? AND number = ?", (repo_name, number))
+        self.connection.executemany("INSERT INTO statuses VALUES (?, ?, ?, ?, ?)",
+                                    [(repo_name, number, position, state, context) for position, (state, context) in enumerate(statuses)])
+
+    def apply_events(self, events, batch_size=1000):
+        """
+        Applies (event name, payload) webhook events in batched transactions, returns how many were applied
+        A malformed event is logged and skipped, the replay goes on with the next one
+        """
+        applied = 0
+        events = iter(events)
+        while True:
+            batch = list(itertools.islice(events, batch_size))
+            if not batch:
+                return applied
+            with self._lock, self.connection:
+                for event, payload in batch:
+                    try:
+                        applied += self._apply_event(event, payload)
+                    except (KeyError, TypeError, AttributeError) as e:
+                        logger.error("Skipped a malformed %s event: %r", event, e)
+
+    def _apply_event(self, event, payload):
+        repo_name = (payload.get('repository') or {}).get('full_name')
+        if not repo_name:
+            logger.debug("Dropped a %s event without a repository", event)
+            return False
+        if event == 'pull_request':
+            self._apply_pull_request(repo_name, payload['pull_request'])
+        elif event == 'issue_comment' and 'pull_request' in payload['issue']:
+            self._apply_issue_comment(repo_name, payload)
+        elif event == 'status':
+            self._apply_status(repo_name, payload)
+        elif event == 'label':
+            self._apply_label(repo_name, payload)
+        else:
+            return False
+        return True
+
+    def _apply_pull_request(self, repo_name, pr):
+        number = pr['number']
+        previous = self.connection.execute("SELECT head_sha FROM prs WHERE repo = ? AND number = ?", (repo_name, number)).fetchone()
+        self.connection.execute("INSERT OR REPLACE INTO prs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                (repo_name, number, pr['state'], pr['title'], pr['user']['login'],
+                                 pr['base']['repo']['owner']['login'] if pr['base'].get('repo') else None, pr['base']['ref'],
+                                 pr['head']['repo']['owner']['login'] if pr['head'].get('repo') else None, pr['head']['ref'],
+                                 pr['head']['sha'], pr.get('mergeable_state'), pr['updated_at']))
+        if 'labels' in pr:
+            self.connection.execute("DELETE FROM labels WHERE repo = ? AND number = ?", (repo_name, number))
+            self.connection.executemany("INSERT INTO labels VALUES (?, ?, ?)", [(repo_name, number, label['name']) for label in pr['labels']])
+        if previous is None or previous['head_sha'] != pr['head']['sha']:
+            # A new head, until a status event brings its commit date the push time stands in for it
+            self._store_statuses(repo_name, number, [])
+            self.connection.execute("INSERT OR IGNORE INTO head_commits VALUES (?, ?, ?)", (repo_name, pr['head']['sha'], pr['updated_at']))
+
+    def _apply_issue_comment(self, repo_name, payload):
+        issue = payload['issue']
+        comment = payload['comment']
+        if not self.connection.execute("SELECT 1 FROM prs WHERE repo = ? AND number = ?", (repo_name, issue['number'])).fetchone():
+            self.connection.execute("INSERT INTO prs (repo, number, state, title, owner, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                                    (repo_name, issue['number'], issue['state'], issue['title'], issue['user']['login'], issue['updated_at']))
+            self.connection.executemany("INSERT OR IGNORE INTO labels VALUES (?, ?, ?)",
+                                        [(repo_name, issue['number'], label['name']) for label in issue.get('labels', [])])
+        if payload['action'] == 'deleted':
+            self.connection.execute("DELETE FROM comments WHERE repo = ? AND id = ?", (repo_name, comment['id']))
+        else:
+            self.connection.execute("INSERT OR REPLACE INTO comments VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                    (repo_name, issue['number'], comment['id'], comment['user']['login'], comment['body'],
+                                     comment['created_at'], comment['updated_at']))
+
+    def _apply_status(self, repo_name, payload):
+        for (number,) in self.connection.execute("SELECT number FROM prs WHERE repo = ? AND head_sha = ?", (repo_name, payload['sha'])).fetchall():
+            # Shift the older statuses in two steps, to keep (repo, number, position) unique all along
+            self.connection.execute("UPDATE statuses SET position = -position - 1 WHERE repo = ? AND number = ?", (repo_name, number))
+            self.connection.execute("UPDATE statuses SET position = -position WHERE repo = ? AND number = ?", (repo_name, number))
+            self.connection.execute("INSERT INTO statuses VALUES (?, ?, 0, ?, ?)", (repo_name, number, payload['state'], payload.get('context')))
+        committer = ((payload.get('commit') or {}).get('commit') or {}).get('committer') or {}
+        if committer.get('date'):
+            self.connection.execute("INSERT OR REPLACE INTO head_commits VALUES (?, ?, ?)", (repo_name, payload['sha'], committer['date']))
+
+    def _apply_label(self, repo_name, payload):
+        if payload['action'] == 'deleted':
+            self.connection.execute("DELETE FROM labels WHERE repo = ? AND name = ?", (repo_name, payload['label']['name']))
+        elif payload['action'] == 'edited' and 'name' in payload.get('changes', {}):
+            self.connection.execute("UPDATE labels SET name = ? WHERE repo = ? AND name = ?",
+                                    (payload['label']['name'], repo_name, payload['changes']['name']['from']))
+
+    def head_comments(self, repo_name, number):
+        """
+        Owner and head commit time of a PR, with its comments as (user, body, created_at, updated_at), newest first
+        The head commit time is None when the index does not know it
+        """
+        with self._lock:
+            pr = self.connection.execute("""
+                SELECT owner, committed_at FROM prs LEFT JOIN head_commits c ON c.repo = prs.repo AND c.sha = prs.head_sha
+                WHERE prs.repo = ? AND number = ?
+            """, (repo_name, number)).fetchone()
+            if pr is None:
+                return None, None, []
+            comments = self.connection.execute(
+                "SELECT user, body, created_at, updated_at FROM comments WHERE repo = ? AND number = ? ORDER BY created_at DESC",
+                (repo_name, number)).fetchall()
+        return pr['owner'], pr['committed_at'], [tuple(comment) for comment in comments]
+
+    def repos(self):
+        """Names of the repos with PRs in the index"""
+        with self._lock:
+            return [row['repo'] for row in self.connection.execute("SELECT DISTINCT repo FROM prs ORDER BY repo")]
+
+    def unfinished_prs(self, repo_name):
+        """Number and head SHA of the open PRs without status, or with a context whose newest status is pending"""
+        with self._lock:
+            return self.connection.execute("""
+                SELECT number, head_sha FROM prs WHERE repo = ? AND state = 'open' AND (
+                    NOT EXISTS (SELECT 1 FROM statuses s WHERE s.repo = prs.repo AND s.number = prs.number) OR
+                    EXISTS (SELECT 1 FROM statuses s WHERE s.repo = prs.repo AND s.number = prs.number AND s.state = 'pending' AND %s))
+            """ % self.LATEST_STATUS, (repo_name,)).fetchall()
+
+    def query(self, repo_name, state='open', number=None, owner=None, labels=(), status=None, head=None, base=None, with_comments=False):
+        """
+        PRs of the repo matching every given selection, newest first, as dictionaries of
+        their row with 'labels', 'statuses' (the newest state of each context) and, when asked for, 'comments'
+        """
+        clauses = ["repo = ?"]
+        parameters = [repo_name]
+        if state:
+            clauses.append("state = ?")
+            parameters.append(state)
+        if number:
+            clauses.append("number = ?")
+            parameters.append(number)
+        if owner:
+            clauses.append("owner = ?")
+            parameters.append(owner)
+        for label in labels:
+            clauses.append("EXISTS (SELECT 1 FROM labels l WHERE l.repo = prs.repo AND l.name = ? AND l.number = prs.number)")
+            parameters.append(label)
+        if status:
+            clauses.append("EXISTS (SELECT 1 FROM statuses s WHERE s.repo = prs.repo AND s.state = ? AND s.number = prs.number AND %s)" % self.LATEST_STATUS)
+            parameters.append(status)
+        if head:
+            head_owner, _, head_ref = head.rpartition(':')
+            clauses.append("head_ref = ?")
+            parameters.append(head_ref)
+            if head_owner:
+                clauses.append("head_owner = ?")
+                parameters.append(head_owner)
+        if base:
+            clauses.append("base_ref = ?")
+            parameters.append(base)
+        with self._lock:
+            rows = [dict(row) for row in self.connection.execute(
+                "SELECT * FROM prs WHERE %s ORDER BY number DESC" % " AND ".join(clauses), parameters)]
+            for row in rows:
+                key = (repo_name, row['number'])
+                row['labels'] = [label for (label,) in self.connection.execute(
+                    "SELECT name FROM labels WHERE repo = ? AND number = ? ORDER BY name", key)]
+                row['statuses'] = _latest_states(self.connection.execute(
+                    "SELECT state, context FROM statuses WHERE repo = ? AND number = ? ORDER BY position", key))
+                if with_comments:
+                    row['comments'] = [comment for (comment,) in self.connection.execute(
+                        "SELECT body FROM comments WHERE repo = ? AND number = ? ORDER BY created_at", key)]
+        return rows
+
+
+class _Record(object):
+    """Attribute access over keyword arguments, for PRs read back from the PRIndex"""
+
+    def __init__(self, **attributes):
+        self.__dict__.update(attributes)
+
+
+class GithubSession(object):
+    """
+    The Github client of an invocation, created once and passed to every action
+    Repository, PullRequest and Issue objects are memoized, so nothing is fetched twice in a command
+    """
+
+    def __init__(self, token, api_url=DEFAULT_API_URL):
+        from github import Github
+        self.github = Github(token, base_url=api_url)
+        self.token = token
+        self.api_url = api_url
+        self._objects = {}
+        self._lock = threading.Lock()
+
+    def _memoize(self, key, load):
+        with self._lock:
+            if key in self._objects:
+                return self._objects[key]
+        loaded = load()
+        with self._lock:
+            return self._objects.setdefault(key, loaded)
+
+    def get_repo(self, repo_name):
+        return self._memoize(('repo', repo_name), lambda: self.github.get_repo(repo_name))
+
+    def graphql_requester(self):
+        """Requester of the GraphQL endpoint, the REST one of Enterprise is under /api/v3 but GraphQL is not"""
+        def load():
+            from github.MainClass import DEFAULT_PER_PAGE, DEFAULT_TIMEOUT
+            from github.Requester import Requester
+            return Requester(self.token, None, _graphql_api_url(self.api_url), DEFAULT_TIMEOUT, None, None, 'PyGithub/Python', DEFAULT_PER_PAGE, False)
+        return self._memoize(('graphql',), load)
+
+    def get_pull(self, repo_name, number):
+        """The PullRequest, only fetched once an attribute beyond its URL is read, edits and comments don't need it"""
+        return self._memoize(('pull', repo_name, number), lambda: _lazy_pull(self.get_repo(repo_name), number))
+
+    def get_issue(self, repo_name, number):
+        """The Issue of a PR, only fetched once an attribute beyond its URL is read"""
+        return self._memoize(('issue', repo_name, number), lambda: _lazy_issue(self.get_repo(repo_name), number))
+
+
+class RateLimitScheduler(object):
+    """
+    Paces requests so the X-RateLimit-* budget of each token lasts until its reset, and
+    retries throttled (403/429) responses after Retry-After, the reset or a jittered backoff
+    Reads made with a token of the pool are sent through the one with the most remaining quota,
+    writes (comments, merges...) and the tokens of other callers (serve clients) are always kept
+    """
+    PACING_THRESHOLD = 0.2
+    MAX_RETRIES = 5
+    BACKOFF_BASE = 1.0
+
+    def __init__(self, tokens, sleep=time.sleep, clock=time.time):
+        self.tokens = []
+        for token in tokens:
+            if token and token not in self.tokens:
+                self.tokens.append(token)
+        self.sleep = sleep
+        self.clock = clock
+        self._budgets = {}
+        self._lock = threading.Lock()
+
+    def _budget(self, authorization):
+        return self._budgets.setdefault(authorization, {'remaining': None, 'limit': None, 'reset': None, 'next_request': 0})
+
+    def _remaining(self, token):
+        remaining = self._budget('token ' + token)['remaining']
+        return float('inf') if remaining is None else remaining
+
+    def pick_authorization(self, verb, authorization):
+        if verb not in ('GET', 'HEAD') or len(self.tokens) < 2 or not (authorization or '').startswith('token '):
+            return authorization
+        if authorization[len('token '):] not in self.tokens:
+            return authorization
+        with self._lock:
+            return 'token ' + max(self.tokens, key=self._remaining)
+
+    def wait(self, authorization):
+        """
+        Sleeps as long as needed to spread the remaining budget of the token over its reset window
+        An exhausted token waits for its reset, which can be up to an hour, and says so at WARNING
+        """
+        exhausted = False
+        with self._lock:
+            budget = self._budget(authorization)
+            now = self.clock()
+            delay = max(0, budget['next_request'] - now)
+            if budget['remaining'] is not None and budget['reset']:
+                window = max(0, budget['reset'] - now)
+                if budget['remaining'] <= 0:
+                    exhausted = window > delay
+                    delay = max(delay, window)
+                elif budget['remaining'] < budget['limit'] * self.PACING_THRESHOLD:
+                    budget['next_request'] = max(now, budget['next_request']) + window / budget['remaining']
+        if exhausted:
+            logger.warning("RATE LIMIT: no requests left, waiting %.0fs for the reset at %s",
+                           delay, time.strftime('%H:%M:%S', time.localtime(budget['reset'])))
+        elif delay:
+            logger.info("RATE LIMIT: pacing, waiting %.1fs", delay)
+        if delay:
+            self.sleep(delay)
+
+    def update(self, authorization, headers):
+        with self._lock:
+            budget = self._budget(authorization)
+            if 'x-ratelimit-remaining' in headers:
+                budget['remaining'] = int(headers['x-ratelimit-remaining'])
+            if 'x-ratelimit-limit' in headers:
+                budget['limit'] = int(headers['x-ratelimit-limit'])
+            if 'x-ratelimit-reset' in headers:
+                budget['reset'] = int(headers['x-ratelimit-reset'])
+
+    def retry_delay(self, status, headers, body, attempt):
+        """Seconds to wait before retrying a response, None when it was not throttled"""
+        if status not in (403, 429) or attempt >= self.MAX_RETRIES:
+            return None
+        jitter = random.uniform(0, self.BACKOFF_BASE)
+        if 'retry-after' in headers:
+            return float(headers['retry-after']) + jitter
+        if headers.get('x-ratelimit-remaining') == '0' and 'x-ratelimit-reset' in headers:
+            return max(0, int(headers['x-ratelimit-reset']) - self.clock()) + jitter
+        if status == 429 or 'rate limit' in body.lower() or 'abuse' in body.lower():
+            return self.BACKOFF_BASE * 2 ** attempt + jitter
+        return None
+
+
+class RequestStats(object):
+    """
+    Counts the HTTP requests of the process by action and endpoint, with their statuses, bytes,
+    latency histogram, HTTP cache use and rate limit retries
+    A request is counted for the innermost action running in the thread sending it, the threads
+    of a pool run their work in the action of the thread that handed it to them
+    """
+    LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, action=None):
+        self.endpoints = {}
+        self.rate_limit_remaining = None
+        self._action = action
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def endpoint(verb, url):
+        """ie. GET https://api.github.com/repos/dataxu/test_repo/pulls/17?page=2 -> GET /repos/:owner/:repo/pulls/:number"""
+        path = re.sub(r'^https?://[^/]+', '', url).split('?', 1)[0]
+        path = re.sub(r'/repos/[^/]+/[^/]+', '/repos/:owner/:repo', path)
+        path = re.sub(r'/[0-9a-f]{40}(?=/|$)', '/:sha', path)
+        return "%s %s" % (verb, re.sub(r'/\d+(?=/|$)', '/:number', path))
+
+    def _actions(self):
+        """Stack of the actions running in this thread"""
+        if getattr(self._local, 'actions', None) is None:
+            self._local.actions = [self._action]
+        return self._local.actions
+
+    def current_action(self):
+        return self._actions()[-1]
+
+    @contextlib.contextmanager
+    def action(self, name):
+        actions = self._actions()
+        actions.append(name)
+        try:
+            yield
+        finally:
+            del actions[len(actions) - 1 - actions[::-1].index(name)]
+
+    def iterate_as(self, name, iterator):
+        """Counts the requests made while producing each item of a lazy iterator for the action"""
+        while True:
+            with self.action(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def start(self, verb, url):
+        self._local.request = {'action': self._actions()[-1], 'endpoint': self.endpoint(verb, url),
+                               'cache': None, 'retries': 0, 'started': time.time()}
+
+    def note(self, cache=None, retry=False):
+        """Called by the connection layers of the request being sent by this thread"""
+        request = getattr(self._local, 'request', None)
+        if request is not None:
+            request['cache'] = cache or request['cache']
+            request['retries'] += retry
+
+    def finish(self, status, headers, size):
+        request = self._local.request
+        self._local.request = None
+        latency = time.time() - request['started']
+        with self._lock:
+            counters = self.endpoints.setdefault((request['action'], request['endpoint']), {
+                'requests': 0, 'statuses': collections.Counter(), 'bytes': 0, 'latency': 0.0,
+                'buckets': [0] * (len(self.LATENCY_BUCKETS) + 1), 'cache': collections.Counter(), 'retries': 0})
+            counters['requests'] += 1
+            counters['statuses'][status] += 1
+            counters['bytes'] += size
+            counters['latency'] += latency
+            counters['buckets'][len([bound for bound in self.LATENCY_BUCKETS if bound < latency])] += 1
+            counters['cache'][request['cache'] or 'none'] += 1
+            counters['retries'] += request['retries']
+            remaining = dict((name.lower(), value) for name, value in headers).get('x-ratelimit-remaining')
+            if remaining is not None and request['cache'] != 'fresh':
+                self.rate_limit_remaining = int(remaining)
+
+    def _latency_quantile(self, buckets, quantile):
+        """Upper bound of the histogram bucket of a latency quantile"""
+        rank = quantile * sum(buckets)
+        cumulative = 0
+        for bound, count in zip(self.LATENCY_BUCKETS + (float('inf'),), buckets):
+            cumulative += count
+            if cumulative >= rank:
+                return bound
+        return float('inf')
+
+    def as_dict(self):
+        with self._lock:
+            endpoints = [dict(counters, action=action, endpoint=endpoint, statuses=dict(counters['statuses']), cache=dict(counters['cache']))
+                         for (action, endpoint), counters in sorted(self.endpoints.items())]
+        actions = collections.OrderedDict()
+        for counters in endpoints:
+            totals = actions.setdefault(counters['action'], {'requests': 0, 'network_requests': 0, 'bytes': 0, 'retries': 0})
+            totals['requests'] += counters['requests']
+            totals['network_requests'] += counters['requests'] - counters['cache'].get('fresh', 0)
+            totals['bytes'] += counters['bytes']
+            totals['retries'] += counters['retries']
+        return {'actions': actions, 'endpoints': endpoints, 'latency_buckets': list(self.LATENCY_BUCKETS),
+                'rate_limit_remaining': self.rate_limit_remaining}
+
+    def summary(self):
+        """Table of the requests by action and endpoint"""
+        from tabulate import tabulate
+        stats = self.as_dict()
+        rows = [[counters['action'], counters['endpoint'], counters['requests'], counters['cache'].get('fresh', 0),
+                 counters['cache'].get('revalidated', 0), counters['retries'], ' '.join("%s:%d" % item for item in sorted(counters['statuses'].items())),
+                 "%.1f" % (counters['bytes'] / 1024.0), "%.0f" % (1000 * counters['latency'] / counters['requests']),
+                 "<%g" % (1000 * self._latency_quantile(counters['buckets'], 0.95))]
+                for counters in stats['endpoints']]
+        lines = [tabulate(rows, headers=["Action", "Endpoint", "Requests", "Fresh", "304", "Retries", "Statuses", "KB", "Avg ms", "p95 ms"])]
+        lines.extend("%s: %d request(s), %d over the network, %.1f KB, %d retries" % (action, total['requests'], total['network_requests'],
+                                                                                     total['bytes'] / 1024.0, total['retries'])
+                     for action, total in stats['actions'].items())
+        if self.rate_limit_remaining is not None:
+            lines.append("Rate limit remaining: %d" % self.rate_limit_remaining)
+        return '\n'.join(lines)
+
+    def prometheus(self):
+        """The counters in the Prometheus text exposition format, for a node exporter textfile"""
+        lines = ['# TYPE github_pr_requests_total counter', '# TYPE github_pr_request_bytes_total counter',
+                 '# TYPE github_pr_request_retries_total counter', '# TYPE github_pr_request_duration_seconds histogram']
+        for counters in self.as_dict()['endpoints']:
+            labels = 'action="%s",endpoint="%s"' % (counters['action'], counters['endpoint'])
+            for status, count in sorted(counters['statuses'].items()):
+                lines.append('github_pr_requests_total{%s,status="%s"} %d' % (labels, status, count))
+            for cache, count in sorted(counters['cache'].items()):
+                lines.append('github_pr_cache_requests_total{%s,cache="%s"} %d' % (labels, cache, count))
+            lines.append('github_pr_request_bytes_total{%s} %d' % (labels, counters['bytes']))
+            lines.append('github_pr_request_retries_total{%s} %d' % (labels, counters['retries']))
+            cumulative = 0
+            for bound, count in zip(self.LATENCY_BUCKETS + ('+Inf',), counters['buckets']):
+                cumulative += count
+                lines.append('github_pr_request_duration_seconds_bucket{%s,le="%s"} %d' % (labels, bound, cumulative))
+            lines.append('github_pr_request_duration_seconds_sum{%s} %f' % (labels, counters['latency']))
+            lines.append('github_pr_request_duration_seconds_count{%s} %d' % (labels, counters['requests']))
+        if self.rate_limit_remaining is not None:
+            lines.extend(['# TYPE github_pr_rate_limit_remaining gauge', 'github_pr_rate_limit_remaining %d' % self.rate_limit_remaining])
+        return '\n'.join(lines) + '\n'
+
+
+class _BufferedResponse(object):
+    """Stands in for an httplib response whose body was already read"""
+
+    def __init__(self, status, headers, body):
+        self.status = status
+        self._headers = headers
+        self._body = body
+
+    def getheaders(self):
+        return self._headers
+
+    def read(self):
+        return self._body
+
+
+def _pooled_connection_class(connection_class):
+    """
+    Wraps an httplib connection class so that connections are kept alive and reused
+    by the following requests, instead of one TCP/TLS handshake per request
+    """
+    import httplib
+    import socket
+
+    class PooledConnection(object):
+        def __init__(self, host, port=None, *args, **kwds):
+            self._connect = lambda: connection_class(host, port, *args, **kwds)
+            self._pool_key = (connection_class, host, port)
+            self._tunnel = None
+            self._connection = None
+            self._response = None
+            self._reused = False
+
+        def set_tunnel(self, *args, **kwds):
+            self._tunnel = (args, kwds)
+            self._pool_key += (repr(self._tunnel),)
+
+        def _checkout(self):
+            with _connection_pool_lock:
+                idle_connections = _connection_pool[self._pool_key]
+                self._connection = idle_connections.pop() if idle_connections else None
+            self._reused = self._connection is not None
+            if not self._reused:
+                self._connection = self._connect()
+                if self._tunnel:
+                    self._connection.set_tunnel(*self._tunnel[0], **self._tunnel[1])
+
+        def request(self, verb, url, body=None, headers={}):
+            self._request = (verb, url, body, headers)
+            self._checkout()
+            try:
+                self._connection.request(verb, url, body, headers)
+            except (httplib.HTTPException, socket.error):
+                if not self._reused:
+                    raise
+                self._reconnect()
+
+        def _reconnect(self):
+            """A kept alive connection the server already closed, retry on a new one"""
+            self._connection.close()
+            self._connection = self._connect()
+            if self._tunnel:
+                self._connection.set_tunnel(*self._tunnel[0], **self._tunnel[1])
+            self._reused = False
+            self._connection.request(*self._request)
+
+        def getresponse(self):
+            try:
+                self._response = self._connection.getresponse()
+            except (httplib.BadStatusLine, socket.error):
+                if not self._reused or self._request[0] not in ('GET', 'HEAD'):
+                    raise
+                self._reconnect()
+                self._response = self._connection.getresponse()
+            return self._response
+
+        def close(self):
+            if self._response is not None and self._response.isclosed() and not self._response.will_close:
+                with _connection_pool_lock:
+                    _connection_pool[self._pool_key].append(self._connection)
+            else:
+                self._connection.close()
+            self._connection = None
+            self._response = None
+
+    return PooledConnection
+
+
+def _scheduled_connection_class(connection_class, scheduler):
+    """Wraps an httplib connection class so that requests are paced and retried by the RateLimitScheduler"""
+
+    class ScheduledConnection(object):
+        def __init__(self, *args, **kwds):
+            self._connection = connection_class(*args, **kwds)
+            self._request = None
+            # The Authorization the request was last sent with, the HTTP cache keys its response on it
+            self.authorization = None
+
+        def set_tunnel(self, *args, **kwds):
+            self._connection.set_tunnel(*args, **kwds)
+
+        def request(self, verb, url, body=None, headers={}):
+            self._request = (verb, url, body, dict(headers))
+            self._send()
+
+        def _send(self):
+            verb, url, body, headers = self._request
+            if 'Authorization' in headers:
+                headers['Authorization'] = scheduler.pick_authorization(verb, headers['Authorization'])
+            self.authorization = headers.get('Authorization')
+            scheduler.wait(self.authorization)
+            self._connection.request(verb, url, body, headers)
+
+        def getresponse(self):
+            attempt = 0
+            while True:
+                response = self._connection.getresponse()
+                headers = dict(response.getheaders())
+                scheduler.update(self.authorization, headers)
+                if response.status not in (403, 429):
+                    return response
+                body = response.read()
+                delay = scheduler.retry_delay(response.status, headers, body, attempt)
+                if delay is None:
+                    return _BufferedResponse(response.status, response.getheaders(), body)
+                self._connection.close()
+                if request_stats:
+                    request_stats.note(retry=True)
+                if scheduler.pick_authorization(self._request[0], self.authorization) == self.authorization:
+                    logger.warning("Throttled by the API (%d), retrying in %.1fs", response.status, delay)
+                    scheduler.sleep(delay)
+                attempt += 1
+                self._send()
+
+        def close(self):
+            self._connection.close()
+
+    return ScheduledConnection
+
+
+def _caching_connection_class(connection_class, cache, scheduler=None):
+    """
+    Wraps an httplib connection class so that GET requests go through the HTTPCache
+    With a RateLimitScheduler the entries are keyed on the token it sends the request with
+    """
+
+    class CachingConnection(object):
+        def __init__(self, host, port=None, *args, **kwds):
+            self._connection = connection_class(host, port, *args, **kwds)
+            self._host = "%s:%s" % (host, port)
+            self._request = None
+            self._key = None
+            self._entry = None
+            self._fresh = False
+
+        def set_tunnel(self, *args, **kwds):
+            self._connection.set_tunnel(*args, **kwds)
+
+        def request(self, verb, url, body=None, headers={}):
+            self._key = None
+            self._entry = None
+            if verb == 'GET' and 'If-None-Match' not in headers and 'If-Modified-Since' not in headers:
+                if scheduler and 'Authorization' in headers:
+                    headers = dict(headers)
+                    headers['Authorization'] = scheduler.pick_authorization(verb, headers['Authorization'])
+                self._request = (url, headers)
+                self._key = cache.key(self._host, url, headers)
+                self._entry = cache.load(self._key)
+                self._fresh = bool(self._entry) and cache.fresh(self._entry)
+                if self._fresh:
+                    return
+                if self._entry:
+                    headers = dict(headers)
+                    cached_headers = dict(self._entry['headers'])
+                    if 'etag' in cached_headers:
+                        headers['If-None-Match'] = cached_headers['etag']
+                    if 'last-modified' in cached_headers:
+                        headers['If-Modified-Since'] = cached_headers['last-modified']
+            self._connection.request(verb, url, body, headers)
+
+        def getresponse(self):
+            if self._fresh:
+                cache.hit(self._key)
+                if request_stats:
+                    request_stats.note(cache='fresh')
+                return _BufferedResponse(self._entry['status'], self._entry['headers'], self._entry['body'].encode('utf-8'))
+            response = self._connection.getresponse()
+            if self._key is None:
+                return response
+            if response.status == 304 and self._entry:
+                response.read()
+                cache.hit(self._key, self._entry)
+                if request_stats:
+                    request_stats.note(cache='revalidated')
+                headers = dict(self._entry['headers'])
+                headers.update((name, value) for name, value in response.getheaders() if name != 'content-length')
+                return _BufferedResponse(self._entry['status'], headers.items(), self._entry['body'].encode('utf-8'))
+            cache.miss()
+            if request_stats:
+                request_stats.note(cache='miss')
+            if response.status != 200:
+                return response
+            headers = response.getheaders()
+            body = response.read()
+            if any(name in ('etag', 'last-modified') for name, value in headers):
+                cache.store(self._used_key(), response.status, headers, body)
+            return _BufferedResponse(response.status, headers, body)
+
+        def _used_key(self):
+            """The key of the token the response was fetched with, the scheduler may have rotated it on a retry"""
+            url, headers = self._request
+            authorization = getattr(self._connection, 'authorization', None)
+            if authorization is None or authorization == headers.get('Authorization'):
+                return self._key
+            return cache.key(self._host, url, dict(headers, Authorization=authorization))
+
+        def close(self):
+            if not self._fresh:
+                self._connection.close()
+
+    return CachingConnection
+
+
+def _instrumented_connection_class(connection_class, stats):
+    """Wraps an httplib connection class so that every request is counted in the RequestStats"""
+
+    class InstrumentedConnection(object):
+        def __init__(self, *args, **kwds):
+            self._connection = connection_class(*args, **kwds)
+
+        def set_tunnel(self, *args, **kwds):
+            self._connection.set_tunnel(*args, **kwds)
+
+        def request(self, verb, url, body=None, headers={}):
+            stats.start(verb, url)
+            self._connection.request(verb, url, body, headers)
+
+        def getresponse(self):
+            response = self._connection.getresponse()
+            headers = response.getheaders()
+            body = response.read()
+            stats.finish(response.status, headers, len(body))
+            return _BufferedResponse(response.status, headers, body)
+
+        def close(self):
+            self._connection.close()
+
+    return InstrumentedConnection
+
+
+def _install_request_stats(**args):
+    """Counts the requests of the process, for --stats"""
+    global request_stats
+    request_stats = RequestStats(args.get('action'))
+    return request_stats
+
+
+def _report_request_stats(**args):
+    """Prints the --stats summary to stderr, and exports the counters to --stats-json and --stats-prometheus"""
+    if args.get('stats'):
+        sys.stderr.write(request_stats.summary() + '\n')
+    if args.get('stats_json'):
+        with open(args['stats_json'], 'w') as stats_file:
+            json.dump(request_stats.as_dict(), stats_file, indent=2)
+    if args.get('stats_prometheus'):
+        # Written aside then renamed, so the node exporter never reads half a file
+        with open(args['stats_prometheus'] + '.tmp', 'w') as stats_file:
+            stats_file.write(request_stats.prometheus())
+        os.rename(args['stats_prometheus'] + '.tmp', args['stats_prometheus'])
+
+
+def _counted_action(name):
+    """Decorator counting the requests of an action function under its name with --stats, lazy results included"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwds):
+            if request_stats is None:
+                return func(*args, **kwds)
+            with request_stats.action(name):
+                result = func(*args, **kwds)
+            if isinstance(result, types.GeneratorType):
+                return request_stats.iterate_as(name, result)
+            return result
+        return wrapper
+    return decorator
+
+
+def _open_http_cache(**args):
+    try:
+        return HTTPCache(args['cache_dir'], args['cache_size'] * 1024 * 1024, args.get('max_age', 0))
+    except OSError as e:
+        logger.warning("HTTP cache disabled, cannot use %s: %s", args['cache_dir'], e)
+        return None
+
+
+def _in_current_action(func):
+    """func, counting the requests it makes on other threads for the action running in this one"""
+    if request_stats is None:
+        return func
+    name = request_stats.current_action()
+
+    def run(*args):
+        with request_stats.action(name):
+            return func(*args)
+    return run
+
+
+def _install_connection_classes(http_cache=None, scheduler=None, stats=None):
+    """
+    Routes the requests of the Github clients created afterwards through the pool of
+    kept alive connections, the rate limit scheduler and, for GET requests, the HTTP
+    cache when given, counting them in the RequestStats when given
+    """
+    from github.Requester import Requester
+    import httplib
+    connection_classes = [_pooled_connection_class(httplib.HTTPConnection),
+                          _pooled_connection_class(httplib.HTTPSConnection)]
+    if scheduler:
+        connection_classes = [_scheduled_connection_class(connection_class, scheduler) for connection_class in connection_classes]
+    if http_cache:
+        connection_classes = [_caching_connection_class(connection_class, http_cache, scheduler) for connection_class in connection_classes]
+    if stats:
+        connection_classes = [_instrumented_connection_class(connection_class, stats) for connection_class in connection_classes]
+    Requester.injectConnectionClasses(*connection_classes)
+
+
+def _install_sha_store(**args):
+    """Keeps SHA keyed statuses and file lists in the cache directory"""
+    global sha_store
+    try:
+        sha_store = ShaStore(os.path.join(args['cache_dir'], 'sha'))
+    except OSError as e:
+        logger.warning("SHA store disabled, cannot use %s: %s", args['cache_dir'], e)
+
+
+def _pr_repo_url(pr):
+    """URL of the repo of a PR, without loading the PR"""
+    return pr.url.rsplit('/pulls/', 1)[0]
+
+
+def _head_status_contexts(pr):
+    """
+    [state, context] of the statuses of the PR head commit, newest first
+    They are looked up by the head SHA, and stored once every context succeeded, as a failed one can be re-run
+    """
+    sha = pr.head.sha
+    statuses = sha_store.get('statuses', sha) if sha_store else None
+    if statuses is None:
+        commit = _lazy_commit(pr, sha)
+        statuses = [[status.state, status.context] for status in commit.get_statuses()]
+        if sha_store and statuses and set(_latest_states(statuses)) == set(['success']):
+            sha_store.put('statuses', sha, statuses)
+    return statuses
+
+
+def _latest_states(statuses):
+    """Current state of each context, from [state, context] statuses newest first"""
+    latest_states = collections.OrderedDict()
+    for state, context in statuses:
+        latest_states.setdefault(context, state)
+    return list(latest_states.values())
+
+
+def _combined_state(states):
+    """Combined state of the current states of the contexts, as GitHub combines them, 'none' without any"""
+    if not states:
+        return "none"
+    if set(states) & set(['failure', 'error']):
+        return "failure"
+    return "pending" if 'pending' in states else "success"
+
+
+def _head_combined_status(pr):
+    """
+    Combined state of the statuses of the PR head commit, 'none' when it has no status
+    One request gets the latest status of every context, it is stored once it is success
+    """
+    if getattr(pr, 'head_statuses', None) is not None:
+        return _combined_state(pr.head_statuses)
+    sha = pr.head.sha
+    state = sha_store.get('combined_statuses', sha) if sha_store else None
+    if state is None:
+        commit = _lazy_commit(pr, sha)
+        combined_status = commit.get_combined_status()
+        state = combined_status.state if combined_status.total_count else "none"
+        if sha_store and state == "success":
+            sha_store.put('combined_statuses', sha, state)
+    return state
+
+
+def _head_commit_date(pr):
+    """Committer date of the PR head commit, stored by SHA"""
+    sha = pr.head.sha
+    committed_at = sha_store.get('commit_dates', sha) if sha_store else None
+    if committed_at is None:
+        commit = _lazy_commit(pr, sha)
+        committed_at = commit.raw_data['commit']['committer']['date']
+        if sha_store:
+            sha_store.put('commit_dates', sha, committed_at)
+    return committed_at
+
+
+def _pr_files(pr):
+    """Filenames of the PR, stored by head and base SHA, as they change when the base branch moves"""
+    key = '%s-%s' % (pr.head.sha, pr.base.sha)
+    files = sha_store.get('files', key) if sha_store else None
+    if files is None:
+        files = [f.filename for f in pr.get_files()]
+        if sha_store:
+            sha_store.put('files', key, files)
+    return files
+
+
+def _session(**args):
+    """The session of the invocation, or a new one when called on its own"""
+    return args.get('session') or GithubSession(args['token'], args.get('api_url', DEFAULT_API_URL))
+
+
 def check_required_fields(required, **args):
     for i in required:
         if args[i] is None:
@@ -31,41 +1187,287 @@ def check_required_fields(required, **args):
             sys.exit(1)
 
 
+def _open_index(**args):
+    """The PRIndex at --index, opened once per process"""
+    path = args.get('index') or DEFAULT_INDEX
+    with _indexes_lock:
+        if path not in _indexes:
+            _indexes[path] = PRIndex(path)
+        return _indexes[path]
+
+
+def _indexed_pull(row):
+    """PR of the PRIndex, with the attributes the printers and filters read"""
+    return _Record(number=row['number'], state=row['state'], title=row['title'], mergeable_state=row['mergeable_state'],
+                   user=_Record(login=row['owner']),
+                   base=_Record(ref=row['base_ref'], repo=_Record(owner=_Record(login=row['base_owner']))),
+                   head=_Record(ref=row['head_ref'], sha=row['head_sha'], repo=_Record(owner=_Record(login=row['head_owner']))),
+                   head_statuses=row['statuses'],
+                   get_comments=lambda: [_Record(body=body) for body in row.get('comments', [])])
+
+
+def _indexed_pr_dict(row):
+    """PR/Issue dictionary of the PRIndex, with everything the filters need prefetched"""
+    pull_request = {'pr': _indexed_pull(row), 'issue': None, 'labels': row['labels'], 'statuses': row['statuses']}
+    if 'comments' in row:
+        pull_request['comments'] = row['comments']
+    return pull_request
+
+
+def _imap_bounded(func, items, jobs=1):
+    """
+    Maps func over items on a pool of `jobs` threads, lazily yielding the results in input order
+    Only a couple of items per thread are read ahead of the consumer
+    """
+    if jobs <= 1:
+        for item in items:
+            yield func(item)
+        return
+    from multiprocessing.pool import ThreadPool
+    func = _in_current_action(func)
+    pool = ThreadPool(jobs)
+    try:
+        pending = collections.deque()
+        for item in items:
+            pending.append(pool.apply_async(func, (item,)))
+            if len(pending) >= 2 * jobs:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+    finally:
+        pool.terminate()
+
+
+FAN_OUT_THREADS = 8
+WAIT_POLL_INTERVAL = 2.0
+WAIT_MAX_POLL_INTERVAL = 30.0
+
+
+def _expand_repos(**args):
+    """
+    Names of the repos of -r, a comma separated list of owner/name where names can be globs
+    Globs are matched against the repos of the owner, or the repos of the index with --from-index
+        ie. 'dataxu/*,frankenstein/github-pr' -> ['dataxu/dcommand', 'dataxu/test_repo', 'frankenstein/github-pr']
+    """
+    repo_names = []
+    for pattern in args['repo'].split(','):
+        pattern = pattern.strip()
+        if not any(c in pattern for c in '*?['):
+            repo_names.append(pattern)
+            continue
+        owner = pattern.split('/')[0]
+        if 'from_index' in args and args['from_index']:
+            candidates = _open_index(**args).repos()
+        else:
+            from github import GithubException
+            github = _session(**args).github
+            try:
+                candidates = [repo.full_name for repo in github.get_organization(owner).get_repos()]
+            except GithubException as e:
+                if e.status != 404:
+                    raise
+                candidates = [repo.full_name for repo in github.get_user(owner).get_repos()]
+        matched = fnmatch.filter(candidates, pattern)
+        if not matched:
+            logger.warning("No repository matches %s", pattern)
+        repo_names.extend(name for name in matched if name not in repo_names)
+    return repo_names
+
+
+def _fan_out(func, items, threads=FAN_OUT_THREADS):
+    """
+    Iterates func(item) for every item on a pool of threads, yielding (item, value) as soon as each value arrives
+    An item whose iteration fails yields (item, exception) once, without stopping the others
+    """
+    items = list(items)
+    threads = max(min(threads, len(items)), 1)
+    # A bounded queue holds the producers back, so they don't paginate far ahead of what is printed
+    results = Queue.Queue(2 * threads)
+    done = object()
+    stopped = threading.Event()
+
+    def put(result):
+        while not stopped.is_set():
+            try:
+                return results.put(result, timeout=0.1)
+            except Queue.Full:
+                pass
+
+    def pump(item):
+        try:
+            for value in func(item):
+                if stopped.is_set():
+                    break
+                put((item, value))
+        except Exception as e:
+            logger.debug("Fan out of %s failed", item, exc_info=True)
+            put((item, e))
+        finally:
+            put((item, done))
+
+    from multiprocessing.pool import ThreadPool
+    pump = _in_current_action(pump)
+    pool = ThreadPool(threads)
+    try:
+        for item in items:
+            pool.apply_async(pump, (item,))
+        remaining = len(items)
+        while remaining:
+            item, value = results.get()
+            if value is done:
+                remaining -= 1
+            else:
+                yield item, value
+    finally:
+        stopped.set()
+        pool.terminate()
+
+
+def _limit(items, limit=None):
+    """
+    Yields at most `limit` items, then closes the iterator of items
+    so that no further page is requested and no further PR is enriched
+    None items, the table rows of PRs that could not be loaded, are dropped and not counted
+    """
+    items = iter(items)
+    try:
+        count = 0
+        for item in items:
+            if item is None:
+                continue
+            yield item
+            count += 1
+            if limit and count >= limit:
+                break
+    finally:
+        if hasattr(items, 'close'):
+            items.close()
+
+
+def _status_column(pr):
+    try:
+        return _head_combined_status(pr)
+    except Exception as e:
+        return "none"
+
+
+# Table columns: name -> (header, fixed width, value of a PR)
+# Only the columns asked for are computed, so the data of the others is never fetched
+PR_COLUMNS = collections.OrderedDict([
+    ('number', ("#", 6, lambda pr: pr.number)),
+    ('state', ("State", 7, lambda pr: pr.state)),
+    ('status', ("Status", 8, _status_column)),
+    ('mergeable', ("Merge", 10, lambda pr: pr.mergeable_state)),
+    ('base_owner', ("BaseFork", 15, lambda pr: pr.base.repo.owner.login)),
+    ('base', ("Base", 20, lambda pr: pr.base.ref)),
+    ('head_owner', ("HeadFork", 15, lambda pr: pr.head.repo.owner.login)),
+    ('head', ("Head", 30, lambda pr: pr.head.ref)),
+    ('title', ("Title", None, lambda pr: pr.title)),
+])
+REPO_COLUMN = ("Repo", 30, None)
+
+
+def _columns_type(value):
+    """argparse type of --columns, a comma separated list of PR_COLUMNS names"""
+    columns = [column.strip() for column in value.split(',') if column.strip()]
+    unknown = [column for column in columns if column not in PR_COLUMNS]
+    if unknown or not columns:
+        raise argparse.ArgumentTypeError("unknown column(s) %s, expected some of %s" % (', '.join(unknown), ','.join(PR_COLUMNS)))
+    return columns
+
+
 def _print_prs(prs, **args):
-    if 'table' in args and args['table']:
+    if ('table' in args and args['table']) or args.get('output') or args.get('columns'):
         _print_prs_table(prs, **args)
     else:
-        for pr in prs:
+        for pr in _limit(_imap_bounded(lambda pr: _loaded_pr(pr, **args), prs, args.get('jobs', 1)), args.get('limit')):
             _print_pr(pr, **args)
+            sys.stdout.flush()
+
+
+def _loaded_pr(pr, **args):
+    """
+    The PR with what _print_pr reads loaded, None when it could not be
+    The PRs of the issues and search lists are stubs, completed here on the --jobs threads
+    """
+    if ('numberonly' in args and args['numberonly']) or ('comments' in args and args['comments']):
+        return pr
+    try:
+        pr.base
+        return pr
+    except Exception as e:
+        logger.error("Could not load PR %s: %s", pr.number, e)
+        return None
+
+
+def _pr_table_row(pr, columns=tuple(PR_COLUMNS)):
+    try:
+        return [PR_COLUMNS[column][2](pr) for column in columns]
+    except Exception as e:
+        logger.error("Could not load PR %s: %s", pr.number, e)
+        return None
 
 
 def _print_prs_table(prs, **args):
-    prs_data = []
-    table_headers = ["#", "State", "Status", "Merge", "BaseFork", "Base", "HeadFork", "Head", "Title"]
-    for pr in prs:
-        status = "none"
-        try:
-            status_obj = pr.get_commits().reversed[0].get_statuses()[0]
-            status = status_obj.state
-        except Exception as e:
-            pass
-        prs_data.append([pr.number, pr.state, status, pr.mergeable_state, pr.base.repo.owner.login, pr.base.ref, pr.head.repo.owner.login, pr.head.ref, pr.title.encode('ascii', errors='ignore')])
+    """The --limit counts the printed rows, a PR that could not be loaded does not take the place of one"""
+    columns = args.get('columns') or list(PR_COLUMNS)
+    prs_data = _limit(_imap_bounded(lambda pr: _pr_table_row(pr, columns), prs, args.get('jobs', 1)), args.get('limit'))
+    _print_table(prs_data, columns, **args)
+
+
+def _utf8(value):
+    """Unicode cells as UTF-8, str() and the csv module of Python 2 only take ASCII unicode"""
+    return value.encode('utf-8') if isinstance(value, unicode) else value
+
+
+def _fixed_width_row(values, table_columns):
+    widths = [(REPO_COLUMN if column == 'repo' else PR_COLUMNS[column])[1] for column in table_columns]
+    # Cut unicode before encoding it, so no character is cut in half
+    values = [value if isinstance(value, unicode) else str(value) for value in values]
+    return ' '.join(_utf8(value[:width].ljust(width) if width else value) for width, value in zip(widths, values))
+
+
+def _stream_table(prs_data, table_columns, **args):
+    """Prints each row as soon as it is produced, as NDJSON, CSV or fixed width columns"""
+    table_headers = [(REPO_COLUMN if column == 'repo' else PR_COLUMNS[column])[0] for column in table_columns]
+    headers = not ('noheaders' in args and args['noheaders'])
+    writer = csv.writer(sys.stdout)
+    if headers and args['output'] == 'csv':
+        writer.writerow(table_headers)
+    elif headers and args['output'] == 'fixed':
+        print _fixed_width_row(table_headers, table_columns)
+    for row in prs_data:
+        if args['output'] == 'ndjson':
+            print json.dumps(dict(zip(table_columns, row)))
+        elif args['output'] == 'csv':
+            writer.writerow([_utf8(value) for value in row])
+        else:
+            print _fixed_width_row(row, table_columns)
+        sys.stdout.flush()
+
+
+def _print_table(prs_data, table_columns, **args):
+    if args.get('output'):
+        return _stream_table(prs_data, table_columns, **args)
+    from tabulate import tabulate
+    table_headers = [(REPO_COLUMN if column == 'repo' else PR_COLUMNS[column])[0] for column in table_columns]
+    prs_data = list(prs_data)
     if 'noheaders' in args and args['noheaders']:
         logger.debug("NO HEADERS")
-        print tabulate(prs_data, tablefmt=args['tableformat'])
+        print _utf8(tabulate(prs_data, tablefmt=args['tableformat']))
     else:
         logger.debug("HEADERS - %s", table_headers)
-        print tabulate(prs_data, headers=table_headers, tablefmt=args['tableformat'])
+        print _utf8(tabulate(prs_data, headers=table_headers, tablefmt=args['tableformat']))
 
 
-def _print_pr(pr, **args):
+def _print_pr(pr, repo_name='', **args):
     if 'numberonly' in args and args['numberonly']:
-        print "%d" % pr.number
+        print "%s#%d" % (repo_name, pr.number) if repo_name else "%d" % pr.number
     elif 'comments' in args and args['comments']:
         for comment in pr.get_comments():
-            print "#%d : Comment - %s" % (pr.number, comment.body)
+            print "%s#%d : Comment - %s" % (repo_name, pr.number, comment.body)
     else:
-        print "#%d [%s] %10s:%s <- %s:%-30s    %s" % (pr.number, pr.state, pr.base.repo.owner.login, pr.base.ref, pr.head.repo.owner.login, pr.head.ref, pr.title.encode('ascii', errors='ignore'))
+        print "%s#%d [%s] %10s:%s <- %s:%-30s    %s" % (repo_name, pr.number, pr.state, pr.base.repo.owner.login, pr.base.ref, pr.head.repo.owner.login, pr.head.ref, pr.title.encode('ascii', errors='ignore'))
         if 'matching_files' in args:
             for f in args['matching_files']:
                 print f
@@ -73,9 +1475,7 @@ def _print_pr(pr, **args):
 
 def _load_pr(**args):
     check_required_fields(['token', 'repo', 'number'], **args)
-    gh = Github(args['token'])
-    repo = gh.get_repo(args['repo'])
-    pull_request = repo.get_pull(args['number'])
+    pull_request = _session(**args).get_pull(args['repo'], args['number'])
     logger.debug(" PR: %s", pull_request)
     return pull_request
 
@@ -83,114 +1483,290 @@ def _load_pr(**args):
 def _load_issue(**args):
     """Load the PR as an issue to enable actions like set_labels"""
     check_required_fields(['token', 'repo', 'number'], **args)
-    gh = Github(args['token'])
-    repo = gh.get_repo(args['repo'])
-    issue = repo.get_issue(args['number'])
+    issue = _session(**args).get_issue(args['repo'], args['number'])
     logger.debug(" ISSUE: %s", issue.number)
     return issue
 
 
+def _lazy_pull(repo, number, **attributes):
+    """PullRequest obj built from what is already known, the rest is only fetched when read"""
+    from github.PullRequest import PullRequest
+    attributes.update({'url': "%s/pulls/%d" % (repo.url, number), 'number': number})
+    return PullRequest(repo._requester, {}, attributes, completed=False)
+
+
+def _lazy_issue(repo, number, **attributes):
+    """Issue obj built from what is already known, the rest is only fetched when read"""
+    from github.Issue import Issue
+    attributes.update({'url': "%s/issues/%d" % (repo.url, number), 'number': number})
+    return Issue(repo._requester, {}, attributes, completed=False)
+
+
+def _lazy_commit(pr, sha):
+    """Commit obj of a SHA of the repo of a PR, only fetched when read"""
+    from github.Commit import Commit
+    return Commit(pr._requester, {}, {'sha': sha, 'url': "%s/commits/%s" % (_pr_repo_url(pr), sha)}, completed=False)
+
+
+def _plan_pr_query(filters=None):
+    """
+    Small query planner for PR selections
+    Pushes owner and label selections down into the creator and labels of the issues list, which
+    has neither the lower rate limit nor the indexing delay of the Search API. Returns that
+    selection and the filters that can only be checked in python afterwards
+        ie. ({'creator': 'frankenstein', 'labels': ['ready']}, {'status': 'success'})
+    """
+    remaining_filters = dict(filters or {})
+    selection = {}
+    if 'owner' in remaining_filters:
+        selection['creator'] = remaining_filters.pop('owner')
+    if 'label' in remaining_filters:
+        selection['labels'] = [remaining_filters.pop('label')]
+    logger.debug("ISSUES SELECTION: %s - PYTHON FILTERS: %s", selection, remaining_filters)
+    return selection, remaining_filters
+
+
+def _selected_prs(session, repo_name, creator=None, labels=()):
+    """
+    The open PRs of the repo by the creator and with every label as Issue objs, from the issues list
+    A PyGithub without the creator parameter falls back on a Search API query
+    """
+    from github.Label import Label
+    repo = session.get_repo(repo_name)
+    parameters = {'creator': creator} if creator else {}
+    if labels:
+        parameters['labels'] = [Label(repo._requester, {}, {'name': label, 'url': "%s/labels/%s" % (repo.url, label)}, completed=False)
+                                for label in labels]
+    try:
+        issues = repo.get_issues(state='open', **parameters)
+    except TypeError:
+        qualifiers = ['author:%s' % creator] + ['label:"%s"' % label for label in labels]
+        query = ' '.join(['repo:%s' % repo_name, 'is:pr', 'is:open'] + qualifiers)
+        logger.debug("SEARCH QUERY: %s", query)
+        return session.github.search_issues(query)
+    return (issue for issue in issues if issue.pull_request)
+
+
 def _load_prs_by_branch(**args):
+    """
+    The open PRs from --head to --base, a plain --head is first looked up as a branch of the repo owner
+    and, when none matches, as a branch of any fork
+    """
     check_required_fields(['token', 'repo', 'head'], **args)
-    gh = Github(args['token'])
-    repo = gh.get_repo(args['repo'])
-    prs = [pr for pr in repo.get_pulls() if pr.head.ref == args['head'] and pr.base.ref == args['base']]
+    repo = _session(**args).get_repo(args['repo'])
+    head = args['head'] if ':' in args['head'] else "%s:%s" % (args['repo'].split('/')[0], args['head'])
+    prs = list(repo.get_pulls(state='open', head=head, base=args['base']))
+    if not prs and ':' not in args['head']:
+        prs = [pr for pr in repo.get_pulls(state='open', base=args['base']) if pr.head.ref == args['head']]
     if len(prs) is not 1:
         logger.error("Probable error, found %s pull(s) from %s -> %s (expected 1)", len(prs), args['head'], args['base'])
         _print_prs(prs, **args)
     return prs
 
 
-def _validate_list_of_dict(list_of_dict):
+def _graphql_api_url(api_url):
+    """Base URL of the GraphQL endpoint: the API root on github.com, /api/graphql next to /api/v3 on Enterprise"""
+    return re.sub(r'/v3$', '', api_url.rstrip('/'))
+
+
+def _graphql_query(requester, query, variables):
+    """Runs a GraphQL query through a requester of the GithubSession, with the auth and connections of the REST calls"""
+    headers, output = requester.requestJsonAndCheck("POST", "/graphql", input={'query': query, 'variables': variables})
+    if output.get('errors'):
+        from github import GithubException
+        raise GithubException(200, output['errors'])
+    return output['data']
+
+
+def _graphql_pr_part(ref_name, sha, repository):
+    """Builds the REST shaped head/base part of a PR from GraphQL fields"""
+    part = {'ref': ref_name, 'sha': sha, 'repo': None}
+    if repository:
+        part['repo'] = {'url': "/repos/%s" % repository['nameWithOwner'],
+                        'full_name': repository['nameWithOwner'],
+                        'owner': {'login': repository['owner']['login']}}
+    return part
+
+
+def _load_prs_graphql(repo, requester):
+    """
+    Loads every open PR of the repo with a handful of paginated GraphQL queries, sent with the GraphQL requester
+    Lazily yields dictionaries, containing a PR obj and its Issue obj, plus the
+    prefetched 'labels', 'statuses' and 'comments' used by the filters.
+    Anything not prefetched is still lazily loaded through the REST API.
+    """
+    owner, name = repo.url.rstrip('/').split('/')[-2:]
+    cursor = None
+    while True:
+        data = _graphql_query(requester, GRAPHQL_OPEN_PRS_QUERY,
+                              {'owner': owner, 'name': name, 'pageSize': GRAPHQL_PAGE_SIZE, 'cursor': cursor})
+        pull_requests = data['repository']['pullRequests']
+        for node in pull_requests['nodes']:
+            labels = [label['name'] for label in node['labels']['nodes']]
+            pr = _lazy_pull(repo, node['number'],
+                            title=node['title'],
+                            state=node['state'].lower(),
+                            user={'login': (node['author'] or {}).get('login')},
+                            base=_graphql_pr_part(node['baseRefName'], node['baseRefOid'], node['baseRepository']),
+                            head=_graphql_pr_part(node['headRefName'], node['headRefOid'], node['headRepository']))
+            issue = _lazy_issue(repo, node['number'],
+                                title=node['title'],
+                                state=node['state'].lower(),
+                                labels=[{'name': label} for label in labels])
+            pull_request = {'pr': pr, 'issue': issue}
+            if node['labels']['totalCount'] == len(labels):
+                pull_request['labels'] = labels
+            commits = node['commits']['nodes']
+            if commits:
+                status = commits[0]['commit']['status'] or {'contexts': []}
+                pull_request['statuses'] = [context['state'].lower() for context in status['contexts']]
+            if node['comments']['totalCount'] == len(node['comments']['nodes']):
+                pull_request['comments'] = [comment['body'] for comment in node['comments']['nodes']]
+            yield pull_request
+        logger.debug("GRAPHQL PAGE: %s PRS", len(pull_requests['nodes']))
+        if not pull_requests['pageInfo']['hasNextPage']:
+            break
+        cursor = pull_requests['pageInfo']['endCursor']
+
+
+def _pr_labels(pull_request):
+    """Label names of a PR/Issue dictionary, prefetched when available"""
+    if 'labels' in pull_request:
+        return pull_request['labels']
+    return [label.name for label in pull_request['issue'].get_labels()]
+
+
+def _pr_statuses(pull_request):
+    """
+    Current state of each status context of the last commit of a PR/Issue dictionary, prefetched when available
+    Like the contexts of a GraphQL status, a context that failed then passed is only a success
+    """
+    if 'statuses' in pull_request:
+        return pull_request['statuses']
+    return _latest_states(_head_status_contexts(pull_request['pr']))
+
+
+def _pr_comments(pull_request):
     """
-    Validates that obj is a list containing dictionaries with entries for 'pr' and 'issue'
+    Comment bodies of a PR/Issue dictionary, prefetched when available
+    Otherwise the comment pages are only fetched as the bodies are consumed
     """
-    return isinstance(list_of_dict, list) and 'pr' in list_of_dict[0] and 'issue' in list_of_dict[0]
+    if 'comments' in pull_request:
+        return iter(pull_request['comments'])
+    return (comment.body for comment in pull_request['issue'].get_comments())
+
+
+def _validate_dict(pr_dict):
+    """
+    Validates that obj is a dictionary with entries for 'pr' and 'issue'
+    """
+    return isinstance(pr_dict, dict) and 'pr' in pr_dict and 'issue' in pr_dict
 
 
 def _return_specific_owner_prs(all_prs, filters):
     """
-    Takes a list of dictionaries, containing a PR and its Issue Obj
-    filters for an owner and returns filtered list of dictionaries
+    Takes an iterable of dictionaries, containing a PR and its Issue Obj
+    filters for an owner and lazily yields the matching dictionaries
     """
-    if _validate_list_of_dict(all_prs):
-        owner_prs = [pr for pr in all_prs if filters['owner'] == pr['pr'].user.login]
-        logger.debug("OWNER PRS: %s", [pr['pr'].number for pr in owner_prs])
-        return owner_prs
-    else:
-        return []
+    for pull_request in all_prs:
+        if _validate_dict(pull_request) and filters['owner'] == pull_request['pr'].user.login:
+            logger.debug("OWNER PR: %s", pull_request['pr'].number)
+            yield pull_request
 
 
 def _return_specific_labeled_prs(all_prs, filters):
     """
-    Takes a list of dictionaries, containing a PR and its Issue Obj
-    filters for a label and returns filtered list of dictionaries
-    """
-    if _validate_list_of_dict(all_prs):
-        pr_issue = []
-        for pull_request in all_prs:
-            issue = pull_request['issue']
-            labels = issue.get_labels()
-            matched_labels = [label.name for label in labels if filters['label'] == label.name]
-            logger.debug("MATCHED LABELS: %s", matched_labels)
-            if matched_labels:
-                pr_issue.append({'pr':pull_request['pr'], 'issue':pull_request['issue']})
-        return pr_issue
-    else:
-        return []
+    Takes an iterable of dictionaries, containing a PR and its Issue Obj
+    filters for a label and lazily yields the matching dictionaries
+    """
+    for pull_request in all_prs:
+        if _validate_dict(pull_request) and filters['label'] in _pr_labels(pull_request):
+            logger.debug("MATCHED LABEL: %s on %s", filters['label'], pull_request['pr'].number)
+            yield pull_request
 
 
 def _return_specific_status_prs(all_prs, filters):
     """
-    Takes a list of dictionaries, containing a PR and its Issue Obj
-    filters for status and returns filtered list of dictionaries
-    """
-    if _validate_list_of_dict(all_prs):
-        pr_issue = []
-        for pull_request in all_prs:
-            commits = pull_request['pr'].get_commits()
-            statuses = [[status.state] for status in commits.reversed[0].get_statuses() if filters['status'] == status.state]
-            if statuses:
-                pr_issue.append({'pr':pull_request['pr'], 'issue':pull_request['issue']})
-                statuses = []
-        logger.debug("SPECIFIC PR STATUSES: %s", [pr['pr'].number for pr in pr_issue])
-        return pr_issue
-    else:
-        return []
+    Takes an iterable of dictionaries, containing a PR and its Issue Obj
+    filters for status and lazily yields the matching dictionaries
+    """
+    for pull_request in all_prs:
+        if _validate_dict(pull_request) and filters['status'] in _pr_statuses(pull_request):
+            logger.debug("SPECIFIC PR STATUS: %s", pull_request['pr'].number)
+            yield pull_request
 
 
 def _return_specific_comment_prs(all_prs, filters):
     """
-    Takes a list of dictionaries, containing a PR and its Issue Obj
-    filters for comments and returns filtered list of dictionaries
-    """
-    if _validate_list_of_dict(all_prs):
-        pr_issue = []
-        for pull_request in all_prs:
-            issue = pull_request['issue']
-            comments = issue.get_comments()
-            logger.debug("COMMENTS: %s", [comment.body for comment in comments])
-            matched_comments = [comment.body for comment in comments if re.search(filters['comment'], comment.body)]
-            if matched_comments:
-                pr_issue.append({'pr':pull_request['pr'], 'issue':pull_request['issue']})
-        logger.debug("MATCHED COMMENTS: %s", matched_comments)
-        return pr_issue
-    else:
-        return []
+    Takes an iterable of dictionaries, containing a PR and its Issue Obj
+    filters for comments and lazily yields the matching dictionaries
+    Stops reading the comments of a PR at the first match
+    """
+    comment_re = re.compile(filters['comment'])
+    for pull_request in all_prs:
+        if not _validate_dict(pull_request):
+            continue
+        for comment in _pr_comments(pull_request):
+            if comment_re.search(comment):
+                logger.debug("MATCHED COMMENT on %s: %s", pull_request['pr'].number, comment)
+                yield pull_request
+                break
+
+
+# Filters by estimated API cost per PR: attribute checks are free, labels and the
+# statuses of the head commit take a request and comments can span many pages
+PR_FILTERS = [
+    ('owner', 0, _return_specific_owner_prs),
+    ('label', 1, _return_specific_labeled_prs),
+    ('status', 2, _return_specific_status_prs),
+    ('comment', 3, _return_specific_comment_prs),
+]
+
+
+def _filter_prs(all_prs, filters, jobs=1):
+    """
+    Chains the requested filters, cheapest first, into a lazy pipeline
+    Each PR goes through the filters on its own, up to `jobs` PRs at a time, and stops
+    at its first failing filter. An error while filtering a PR only drops that PR.
+    """
+    if 'comment' in filters:
+        filters = dict(filters, comment=re.compile(filters['comment']))
+    pr_filters = [pr_filter for name, cost, pr_filter in sorted(PR_FILTERS, key=lambda pr_filter: pr_filter[1]) if name in filters]
+
+    def filter_pr(pull_request):
+        try:
+            matched_prs = [pull_request]
+            for pr_filter in pr_filters:
+                matched_prs = pr_filter(matched_prs, filters)
+            return list(matched_prs)
+        except Exception as e:
+            logger.error("Could not filter PR %s: %s", pull_request['pr'].number, e)
+            return []
+
+    return (pr for matched_prs in _imap_bounded(filter_pr, all_prs, jobs) for pr in matched_prs)
 
 
 def _check_approved_mergers(approved_users, comment_users):
     comment_approved_users = [comment_user for comment_user in comment_users if comment_user in approved_users]
     logger.debug(" APPROVED MERGERS WITH COMMENTS: %s", comment_approved_users)
     if not comment_approved_users:
-        raise NoApproversError("No approved mergers were found in comments - Approved mergers: %s " % approved_users)
+        raise NoApproversError("No approved mergers were found in comments - Approved mergers: %s " % sorted(approved_users))
     else:
         return comment_approved_users
 
 
+def _read_approved_mergers_file(approved_mergers_file):
+    """Usernames of an approved mergers file, only read again when the file changes"""
+    mtime = os.path.getmtime(approved_mergers_file)
+    cached = _approved_mergers_files.get(approved_mergers_file)
+    if cached is None or cached[0] != mtime:
+        with open(approved_mergers_file) as approved_mergers:
+            cached = _approved_mergers_files[approved_mergers_file] = (mtime, frozenset(approved_mergers.read().splitlines()))
+    return cached[1]
+
+
 def _check_approved_mergers_file(approved_mergers_file, comment_users):
-    with open(approved_mergers_file) as approved_mergers_file:
-        approved_users = approved_mergers_file.read().splitlines()
+    approved_users = _read_approved_mergers_file(approved_mergers_file)
     logger.debug(" APPROVED MERGERS FILE CONTENTS: %s", approved_users)
     return _check_approved_mergers(approved_users, comment_users)
 
@@ -203,6 +1779,7 @@ def _check_owner_cannot_ship(owner, comment_users):
         return matched_comment_non_owner_users
 
 
+@_counted_action('merge')
 def _merge_pr(pr, **args):
     if args['condition_approved_mergers'] or args['condition_approved_mergers_file'] or args['condition_non_owner_merger']:
         merge_comment_users = [comment.user.login for comment in _load_issue(**args).get_comments().reversed if re.search(".*%s.*" % args['mergecomment'], comment.body)]
@@ -218,25 +1795,28 @@ def _merge_pr(pr, **args):
         pr.merge()
 
 
-def github_check_condition(**args):
-    tz_local = get_localzone()
-    check_required_fields(['token', 'repo', 'number'], **args)
-    gh = Github(args['token'])
-    repo = gh.get_repo(args['repo'])
-    pr = repo.get_pull(args['number'])
-    issue = _load_issue(**args)
-    last_commit_time = pytz.utc.localize(datetime.strptime(pr.get_commits().reversed[0].commit.raw_data['committer']['date'], '%Y-%m-%dT%H:%M:%SZ')).astimezone(tz_local)
-    issue_comments = issue.get_comments(since=last_commit_time).reversed
-    merge_comment_users = [comment.user.login for comment in issue_comments if re.search('.*%s.*' % args['mergecomment'], comment.body) and comment.updated_at == comment.created_at]
-    logger.debug("MERGE COMMENTS %s", [[comment.user.login, comment.body] for comment in issue_comments])
+def _indexed_merge_comment_users(**args):
+    """
+    Owner and merge comment users of a PR, read from the local PRIndex
+    Returns None when the index does not know the head commit time of the PR
+    """
+    owner, last_commit_time, comments = _open_index(**args).head_comments(args['repo'], args['number'])
+    if last_commit_time is None:
+        return None
+    merge_comment_users = [user for user, body, created_at, updated_at in comments
+                           if updated_at >= last_commit_time and re.search('.*%s.*' % args['mergecomment'], body) and updated_at == created_at]
+    logger.debug("MERGE COMMENTS %s", [[user, body] for user, body, created_at, updated_at in comments if updated_at >= last_commit_time])
+    return owner, merge_comment_users
 
+
+def _check_merge_conditions(owner, merge_comment_users, **args):
     if not merge_comment_users:
         raise NoMergeCommentError("There are no merge comments associated with this PR")
 
-    logger.debug("PR OWNER: %s", pr.user.login)
+    logger.debug("PR OWNER: %s", owner)
     logger.debug("MERGER: %s", merge_comment_users)
     if args.get('condition_non_owner_merger'):
-        merge_comment_users = _check_owner_cannot_ship(pr.user.login, merge_comment_users)
+        merge_comment_users = _check_owner_cannot_ship(owner, merge_comment_users)
     if args.get('condition_approved_mergers_file'):
         merge_comment_users = _check_approved_mergers_file(args['approved_mergers_file_path'], merge_comment_users)
     if args.get('condition_approved_mergers'):
@@ -245,71 +1825,448 @@ def github_check_condition(**args):
     return merge_comment_users
 
 
+def _pr_merge_comment_users(pr, issue, **args):
+    """Users of the merge comments left since the head commit of the PR, newest first"""
+    # Naive UTC, as PyGithub writes since with a Z whatever its timezone
+    last_commit_time = datetime.strptime(_head_commit_date(pr), PRIndex.TIME_FORMAT)
+    # Paging forwards and reversing here saves the request .reversed makes to find the last page
+    issue_comments = list(issue.get_comments(since=last_commit_time))[::-1]
+    merge_comment_users = [comment.user.login for comment in issue_comments if re.search('.*%s.*' % args['mergecomment'], comment.body) and comment.updated_at == comment.created_at]
+    logger.debug("MERGE COMMENTS %s", [[comment.user.login, comment.body] for comment in issue_comments])
+    return merge_comment_users
+
+
+@_counted_action('check-condition')
+def github_check_condition(**args):
+    if 'all' in args and args['all']:
+        return github_check_all_conditions(**args)
+    check_required_fields(['token', 'repo', 'number'], **args)
+    if 'from_index' in args and args['from_index']:
+        indexed = _indexed_merge_comment_users(**args)
+        if indexed is not None:
+            return _check_merge_conditions(*indexed, **args)
+        logger.warning("The index does not know the head commit of PR %s, checking it through the API", args['number'])
+    pr = _load_pr(**args)
+    issue = _load_issue(**args)
+    return _check_merge_conditions(pr.user.login, _pr_merge_comment_users(pr, issue, **args), **args)
+
+
+def _check_condition_report(pr, **args):
+    """Shippable report of one PR, with the reason it is blocked when it is not"""
+    report = collections.OrderedDict([('number', pr.number), ('shippable', False)])
+    try:
+        indexed = None
+        if 'from_index' in args and args['from_index']:
+            indexed = _indexed_merge_comment_users(**dict(args, number=pr.number))
+        if indexed is None:
+            if isinstance(pr, _Record):
+                # The index does not know the head commit time, the PR is read again from the API
+                pr = _session(**args).get_pull(args['repo'], pr.number)
+            indexed = pr.user.login, _pr_merge_comment_users(pr, _session(**args).get_issue(args['repo'], pr.number), **args)
+        report['mergers'] = _check_merge_conditions(*indexed, **args)
+        report['shippable'] = True
+    except (NoMergeCommentError, OwnerCannotShipError, NoApproversError) as e:
+        report['reason'] = type(e).__name__
+        report['message'] = str(e)
+    except Exception as e:
+        logger.debug("Could not check PR %s", pr.number, exc_info=True)
+        report['reason'] = 'Error'
+        report['message'] = "%s: %s" % (type(e).__name__, e)
+    return report
+
+
+def github_check_all_conditions(**args):
+    """
+    check-condition --all, checks every open PR (or those of --label, --filters...) on --jobs threads
+    Prints one JSON report per PR as it is checked, ie.
+        {"number": 17, "shippable": false, "reason": "OwnerCannotShipError", "message": "Owner cannot ship..."}
+    """
+    check_required_fields(['token', 'repo'], **args)
+    shippable = 0
+    for report in _imap_bounded(lambda pr: _check_condition_report(pr, **args), _limit(_list_prs(**args), args.get('limit')), args.get('jobs', 1)):
+        shippable += report['shippable']
+        print json.dumps(report)
+        sys.stdout.flush()
+    logger.info("%d PR(s) can be shipped", shippable)
+
+
+def github_wait(**args):
+    """
+    Blocks until a PR meets its merge conditions, as check-condition, or the --filters predicates, exits 1 after --timeout
+    Only what the condition reads is polled, with conditional requests: the PR, its comments since the head commit,
+    and its head statuses for status filters. Polls get further apart while nothing changes
+    """
+    check_required_fields(['token', 'repo', 'number'], **args)
+    session = _session(**args)
+    pr = session.get_pull(args['repo'], args['number'])
+    comments = collections.OrderedDict()
+    commit_dates = {}
+
+    def head_commit_date():
+        if pr.head.sha not in commit_dates:
+            commit_dates[pr.head.sha] = _head_commit_date(pr)
+        return commit_dates[pr.head.sha]
+
+    def poll_comments():
+        """
+        Lists again the comments updated since the head commit, returns whether they changed
+        The whole list is read every time, a deleted comment is only noticed by its absence
+        """
+        since = datetime.strptime(head_commit_date(), PRIndex.TIME_FORMAT)
+        listed = collections.OrderedDict(
+            (comment.id, (comment.user.login, comment.body, comment.created_at.strftime(PRIndex.TIME_FORMAT), comment.updated_at.strftime(PRIndex.TIME_FORMAT)))
+            for comment in session.get_issue(args['repo'], pr.number).get_comments(since=since))
+        changed = listed != comments
+        comments.clear()
+        comments.update(listed)
+        return changed
+
+    def merge_conditions_met():
+        last_commit_time = head_commit_date()
+        merge_comment_users = [user for user, body, created_at, updated_at in reversed(comments.values())
+                               if updated_at >= last_commit_time and re.search('.*%s.*' % args['mergecomment'], body) and updated_at == created_at]
+        try:
+            return _check_merge_conditions(pr.user.login, merge_comment_users, **args)
+        except (NoMergeCommentError, OwnerCannotShipError, NoApproversError) as e:
+            logger.info("PR %s is not ready: %s", pr.number, e)
+            return None
+
+    def filters_met(filters):
+        pull_request = {'pr': pr, 'issue': _lazy_issue(session.get_repo(args['repo']), pr.number)}
+        return [selected['pr'].number for selected in _filter_prs([pull_request], filters)]
+
+    filters = _parse_filters(args['filters']) if args.get('filters') else None
+    deadline = time.time() + args['timeout']
+    interval = WAIT_POLL_INTERVAL
+    while True:
+        changed = pr.update()
+        if filters is None:
+            changed = poll_comments() or changed
+            met = merge_conditions_met()
+        else:
+            met = filters_met(filters)
+        if met and filters is None:
+            print "PR #%d is ready, merge comments by %s" % (pr.number, ', '.join(met))
+            return met
+        elif met:
+            print "PR #%d is ready, it matches %s" % (pr.number, args['filters'])
+            return met
+        if time.time() + interval > deadline:
+            logger.error("PR %s was not ready after %ss", pr.number, args['timeout'])
+            sys.exit(1)
+        time.sleep(interval)
+        interval = WAIT_POLL_INTERVAL if changed else min(interval * 2, WAIT_MAX_POLL_INTERVAL)
+
+
 def github_create_pr(**args):
     check_required_fields(['token', 'repo', 'title', 'body', 'base', 'head'], **args)
-    gh = Github(args['token'])
-    repo = gh.get_repo(args['repo'])
+    repo = _session(**args).get_repo(args['repo'])
     pr = repo.create_pull(title=args['title'], body=args['body'], base=args['base'], head=args['head'])
     if 'label' in args and args['label']:
         args['number'] = pr.number
         github_add_labels(**args)
     _print_pr(pr, **args)
+    return pr
+
+
+def _list_prs_from_index(**args):
+    """list, with its filters, answered from the local PRIndex without any API call"""
+    index = _open_index(**args)
+    if 'number' in args and args['number']:
+        prs = index.query(args['repo'], state=None, number=args['number'], with_comments=bool(args.get('comments')))
+    elif 'label' in args and args['label']:
+        prs = index.query(args['repo'], labels=args['label'])
+    elif 'head' in args and args['head']:
+        prs = index.query(args['repo'], head=args['head'], base=args['base'])
+    elif 'filters' in args and args['filters']:
+        return (pr['pr'] for pr in github_filter_prs(**args))
+    else:
+        prs = index.query(args['repo'])
+    return (_indexed_pull(row) for row in prs)
+
+
+def _list_prs(**args):
+    """The PRs of a repo selected by --label, --head or --filters, or all its open PRs"""
+    if 'from_index' in args and args['from_index']:
+        return _list_prs_from_index(**args)
+    session = _session(**args)
+    repo = session.get_repo(args['repo'])
+    if 'label' in args and args['label']:
+        return (_lazy_pull(repo, i.number, title=i.title, state=i.state) for i in _selected_prs(session, args['repo'], labels=args['label']))
+    elif 'head' in args and args['head']:
+        return _load_prs_by_branch(**args)
+    elif 'filters' in args and args['filters']:
+        return (pr['pr'] for pr in github_filter_prs(**args))
+    else:
+        return repo.get_pulls()
+
+
+def _print_repos_prs(repos_prs, **args):
+    """Prints the (repo name, PR or error) of several repos, in the order they arrive, with a repo column"""
+    failed = []
+
+    def listed(repos_prs):
+        for repo_name, pr in repos_prs:
+            if isinstance(pr, Exception):
+                failed.append(repo_name)
+                logger.error("Could not list the PRs of %s: %s", repo_name, pr)
+            else:
+                yield repo_name, pr
+
+    if ('table' in args and args['table']) or args.get('output') or args.get('columns'):
+        columns = args.get('columns') or list(PR_COLUMNS)
+
+        def table_row((repo_name, pr)):
+            row = _pr_table_row(pr, columns)
+            return None if row is None else [repo_name] + row
+
+        rows = _imap_bounded(table_row, listed(repos_prs), args.get('jobs', 1))
+        _print_table(_limit(rows, args.get('limit')), ['repo'] + columns, **args)
+    else:
+        def loaded((repo_name, pr)):
+            pr = _loaded_pr(pr, **args)
+            return None if pr is None else (repo_name, pr)
+
+        for repo_name, pr in _limit(_imap_bounded(loaded, listed(repos_prs), args.get('jobs', 1)), args.get('limit')):
+            _print_pr(pr, repo_name=repo_name, **args)
+            sys.stdout.flush()
+    if failed:
+        logger.error("Listing failed for %d repo(s): %s", len(failed), ', '.join(failed))
+        sys.exit(1)
 
 
+@_counted_action('list')
 def github_list_prs(**args):
-    check_required_fields(['token', 'repo'], **args)
-    gh = Github(args['token'])
-    repo = gh.get_repo(args['repo'])
+    # The index is read without any API call, so without a token
+    check_required_fields(['repo'] if args.get('from_index') else ['token', 'repo'], **args)
+    repo_names = _expand_repos(**args)
+    if repo_names != [args['repo']]:
+        if 'number' in args and args['number']:
+            logger.error(" NUMBER cannot be listed across several repos")
+            sys.exit(1)
+        threads = max(args.get('jobs', 1), FAN_OUT_THREADS)
+        return _print_repos_prs(_fan_out(lambda repo_name: _list_prs(**dict(args, repo=repo_name)), repo_names, threads), **args)
     list_return_obj = None
 
     if 'number' in args and args['number']:
-        pr = repo.get_pull(args['number'])
+        if 'from_index' in args and args['from_index']:
+            _print_prs(_list_prs_from_index(**args), **args)
+            return None
+        pr = _session(**args).get_pull(args['repo'], args['number'])
         if 'files' in args and args['files']:
-            pr_files = pr.get_files()
-            args['matching_files'] = [f.filename for f in pr_files]
+            args['matching_files'] = _pr_files(pr)
         if 'comments' in args and args['comments']:
             pr = _load_issue(**args)
             list_return_obj = pr.get_comments()
+        elif _loaded_pr(pr, **args) is None:
+            sys.exit(1)
         _print_prs([pr], **args)
-    elif 'label' in args and args['label']:
-        label_list = [repo.get_label(label) for label in args['label']]
-        prs = [repo.get_pull(i.number) for i in repo.get_issues(labels=label_list) if i.pull_request]
-        _print_prs(prs, **args)
-    elif 'head' in args and args['head']:
-        prs = _load_prs_by_branch(**args)
-        _print_prs(prs, **args)
-    elif 'filters' in args and args['filters']:
-        prs = [pr['pr'] for pr in github_filter_prs(**args)]
-        _print_prs(prs, **args)
     else:
-        prs = repo.get_pulls()
-        _print_prs(prs, **args)
+        _print_prs(_list_prs(**args), **args)
     return list_return_obj
 
 
+def _parse_filters(filters_option):
+    """--filters 'owner=frankenstein,status=success' -> {'owner': 'frankenstein', 'status': 'success'}"""
+    filters = {}
+    for filter_option in filters_option.split(','):
+        part = filter_option.partition("=")
+        filters[part[0]] = part[2]
+    return filters
+
+
+@_counted_action('filter')
 def github_filter_prs(**args):
     """
     Filters prs to return only what is contained in the filters
-    Returns a list of dictionaries, containing a PR obj and its Issue obj
+    Returns a lazy iterator of dictionaries, containing a PR obj and its Issue obj
     """
-    git_hub = Github(args['token'])
-    repo = git_hub.get_repo(args['repo'])
-    all_prs = [{'pr':repo.get_pull(pr.number), 'issue':repo.get_issue(pr.number)} for pr in repo.get_pulls()]
-    filters = {}
-    for filter_option in args['filters'].split(','):
-        part = filter_option.partition("=")
-        filters[part[0]] = part[2]
+    filters = _parse_filters(args['filters'])
+
+    if 'from_index' in args and args['from_index']:
+        rows = _open_index(**args).query(args['repo'], owner=filters.get('owner'), labels=[filters['label']] if 'label' in filters else [],
+                                         status=filters.get('status'), with_comments='comment' in filters)
+        comment_filter = dict((name, value) for name, value in filters.items() if name == 'comment')
+        return _filter_prs((_indexed_pr_dict(row) for row in rows), comment_filter)
+
+    session = _session(**args)
+    repo = session.get_repo(args['repo'])
+    selection, pushed_down_filters = _plan_pr_query(filters=filters)
+    if 'graphql' in args and args['graphql']:
+        all_prs = _load_prs_graphql(repo, session.graphql_requester())
+    elif selection:
+        issues = _selected_prs(session, args['repo'], **selection)
+        all_prs = ({'pr':_lazy_pull(repo, issue.number, title=issue.title, state=issue.state, user={'login': issue.user.login}), 'issue':issue}
+                   for issue in issues)
+        filters = pushed_down_filters
+    else:
+        all_prs = ({'pr':pr, 'issue':_lazy_issue(repo, pr.number)} for pr in repo.get_pulls())
 
-    if 'owner' in filters:
-        all_prs = _return_specific_owner_prs(all_prs, filters)
-    if 'label' in filters:
-        all_prs = _return_specific_labeled_prs(all_prs, filters)
-    if 'status' in filters:
-        all_prs = _return_specific_status_prs(all_prs, filters)
-    if 'comment' in filters:
-        all_prs = _return_specific_comment_prs(all_prs, filters)
+    return _filter_prs(all_prs, filters, args.get('jobs', 1))
+
+
+def _sync_record(repo, pr, issue, since):
+    """
+    Everything the PRIndex mirrors of a PR, comments only since the previous sync or, when it is older,
+    the head commit of an open PR: the merge comments deleted since are missing, and removed from the index
+    """
+    head_committed_at = _head_commit_date(pr) if pr.state == 'open' else None
+    comments_since = since
+    if since and head_committed_at:
+        comments_since = min(since, datetime.strptime(head_committed_at, PRIndex.TIME_FORMAT))
+    comments = issue.get_comments(since=comments_since) if comments_since else issue.get_comments()
+    return {
+        'number': pr.number,
+        'state': pr.state,
+        'title': pr.title,
+        'owner': pr.user.login,
+        'base_owner': pr.base.repo.owner.login if pr.base.repo else None,
+        'base_ref': pr.base.ref,
+        'head_owner': pr.head.repo.owner.login if pr.head.repo else None,
+        'head_ref': pr.head.ref,
+        'head_sha': pr.head.sha,
+        'mergeable_state': pr.mergeable_state,
+        'head_committed_at': head_committed_at,
+        'updated_at': issue.updated_at.strftime(PRIndex.TIME_FORMAT),
+        'labels': [label.name for label in issue.labels],
+        'statuses': _head_status_contexts(pr) if pr.state == 'open' else [],
+        'comments': [{'id': comment.id, 'user': comment.user.login, 'body': comment.body,
+                      'created_at': comment.created_at.strftime(PRIndex.TIME_FORMAT),
+                      'updated_at': comment.updated_at.strftime(PRIndex.TIME_FORMAT)} for comment in comments],
+        'comments_since': comments_since.strftime(PRIndex.TIME_FORMAT) if comments_since else None,
+    }
+
+
+def github_sync(**args):
+    """
+    Mirrors the PRs of the repo, their labels, head statuses and comments into the local PRIndex
+    After the first sync only the PRs updated since the previous one are fetched, sorted by
+    update time, plus the statuses of the open PRs that were still pending
+    """
+    check_required_fields(['token', 'repo'], **args)
+    index = _open_index(**args)
+    session = _session(**args)
+    repo = session.get_repo(args['repo'])
+    synced_at = datetime.utcnow()
+    since = index.last_sync(args['repo'])
+    if since:
+        issues = repo.get_issues(state='all', sort='updated', direction='desc', since=since)
+    else:
+        issues = repo.get_issues(state='open')
+
+    def fetch(issue):
+        try:
+            return _sync_record(repo, session.get_pull(args['repo'], issue.number), issue, since)
+        except Exception as e:
+            logger.error("Could not sync PR %s: %s", issue.number, e)
+            return None
+
+    synced = set()
+    failed = 0
+    for record in _imap_bounded(fetch, (issue for issue in issues if issue.pull_request), args.get('jobs', 1)):
+        if record is None:
+            failed += 1
+            continue
+        index.store_pr(args['repo'], record)
+        synced.add(record['number'])
+
+    def fetch_statuses(unfinished_pr):
+        try:
+            return unfinished_pr['number'], _head_status_contexts(_lazy_pull(repo, unfinished_pr['number'], head={'sha': unfinished_pr['head_sha']}))
+        except Exception as e:
+            logger.error("Could not sync the statuses of PR %s: %s", unfinished_pr['number'], e)
+            return unfinished_pr['number'], None
+
+    unfinished_prs = [unfinished_pr for unfinished_pr in index.unfinished_prs(args['repo']) if unfinished_pr['number'] not in synced]
+    for number, statuses in _imap_bounded(fetch_statuses, unfinished_prs, args.get('jobs', 1)):
+        if statuses is None:
+            failed += 1
+            continue
+        index.store_statuses(args['repo'], number, statuses)
+
+    if failed:
+        logger.error("%d PR(s) of %s failed to sync, they will be fetched again by the next sync", failed, args['repo'])
+    else:
+        index.set_last_sync(args['repo'], synced_at)
+    print "Synced %d changed PR(s) of %s" % (len(synced), args['repo'])
 
-    return all_prs
+
+def _read_events(event_files):
+    """(event name, payload) of the JSON lines {"event": ..., "payload": ...} of the files, - being stdin"""
+    for event_file in event_files or ['-']:
+        lines = sys.stdin if event_file == '-' else open(event_file)
+        try:
+            for line_number, line in enumerate(lines, 1):
+                if not line.strip():
+                    continue
+                try:
+                    event = json.loads(line)
+                    event, payload = event['event'], event['payload']
+                except (ValueError, KeyError, TypeError) as e:
+                    logger.error("Skipped line %d of %s, it is not an event: %r", line_number, event_file, e)
+                    continue
+                yield event, payload
+        finally:
+            if lines is not sys.stdin:
+                lines.close()
+
+
+def _webhook_handler_class():
+    """The request handler of ingest --listen, built when receiving webhooks"""
+    import BaseHTTPServer
+
+    class _WebhookHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+        """Receives GitHub webhook deliveries and applies them to the PRIndex"""
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+            secret = self.server.secret
+            if secret:
+                signature = 'sha256=' + hmac.new(secret, body, hashlib.sha256).hexdigest()
+                if not hmac.compare_digest(signature, self.headers.get('X-Hub-Signature-256') or ''):
+                    self.send_response(401)
+                    self.end_headers()
+                    return
+            try:
+                applied = self.server.index.apply_events([(self.headers.get('X-GitHub-Event'), json.loads(body))])
+            except ValueError as e:
+                logger.error("Could not apply the %s event: %s", self.headers.get('X-GitHub-Event'), e)
+                self.send_response(400)
+            else:
+                self.send_response(202 if applied else 204)
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            logger.info("WEBHOOK: " + format, *args)
+
+    return _WebhookHandler
+
+
+def github_ingest(**args):
+    """
+    Keeps the local PRIndex current from GitHub webhook events (pull_request, issue_comment, status, label)
+    With --listen, webhook deliveries are received over HTTP, otherwise captured events are replayed
+    from the --events files or stdin, as JSON lines of {"event": <X-GitHub-Event>, "payload": <body>}
+    """
+    index = _open_index(**args)
+    if args.get('listen'):
+        import BaseHTTPServer
+        family, address = _server_address(args['listen'])
+        server = BaseHTTPServer.HTTPServer(address, _webhook_handler_class())
+        server.index = index
+        server.secret = args.get('webhook_secret')
+        logger.warning("Receiving GitHub webhooks on %s:%s", *address)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+        return
+    started = time.time()
+    applied = index.apply_events(_read_events(args.get('events')))
+    elapsed = max(time.time() - started, 1e-6)
+    print "Applied %d event(s) in %.2fs (%d events/s)" % (applied, elapsed, applied / elapsed)
 
 
 def github_merge_pr_by_number(**args):
@@ -324,6 +2281,129 @@ def github_merge_pr_by_branch(**args):
     _merge_pr(pr, **args)
 
 
+class MergeQueue(object):
+    """
+    Merges PRs one after another once GitHub reports them mergeable, at most max_rate merges a minute
+    mergeable_state is polled with conditional requests, at intervals growing while it does not change,
+    and a merge refused because the base or head branch moved is retried
+    A PR blocked by branch protection (required checks or reviews) or behind its base is not
+    waited for, it is reported NotMergeable at once
+    """
+    POLL_INTERVAL = 1.0
+    MAX_POLL_INTERVAL = 30.0
+    MAX_MERGE_RETRIES = 3
+    MERGEABLE_STATES = ('clean', 'unstable', 'has_hooks')
+    UNMERGEABLE_STATES = ('dirty', 'blocked', 'behind', 'draft')
+
+    def __init__(self, timeout=600, max_rate=None, sleep=time.sleep, clock=time.time):
+        self.timeout = timeout
+        self.merge_interval = 60.0 / max_rate if max_rate else 0
+        self.sleep = sleep
+        self.clock = clock
+        self.last_merge = None
+
+    def wait_mergeable(self, pr):
+        """Polls the PR until it is mergeable, unmergeable or closed, or the timeout is reached, returns its mergeable_state"""
+        deadline = self.clock() + self.timeout
+        interval = self.POLL_INTERVAL
+        pr.update()
+        while True:
+            logger.debug("PR %s: mergeable %s, mergeable_state %s", pr.number, pr.mergeable, pr.mergeable_state)
+            if pr.state != 'open' or pr.mergeable_state in self.UNMERGEABLE_STATES or (pr.mergeable and pr.mergeable_state in self.MERGEABLE_STATES):
+                return pr.mergeable_state
+            if self.clock() + interval > deadline:
+                return pr.mergeable_state
+            self.sleep(interval)
+            # 304s cost no rate limit, while nothing changes the polls get further apart
+            interval = self.POLL_INTERVAL if pr.update() else min(interval * 2, self.MAX_POLL_INTERVAL)
+
+    def throttle(self):
+        if self.last_merge is not None:
+            wait = self.last_merge + self.merge_interval - self.clock()
+            if wait > 0:
+                self.sleep(wait)
+
+    def merge(self, pr, check=None):
+        """
+        Report of merging a PR of the queue
+        check(pr) raises when the merge conditions are not met, it is run again whenever the head moved
+        """
+        from github import GithubException
+        report = collections.OrderedDict([('number', pr.number), ('merged', False)])
+        try:
+            for attempt in range(self.MAX_MERGE_RETRIES + 1):
+                state = self.wait_mergeable(pr)
+                if pr.state != 'open':
+                    report['reason'] = 'Closed'
+                    report['message'] = "PR is %s" % pr.state
+                    return report
+                if not (pr.mergeable and state in self.MERGEABLE_STATES):
+                    report['reason'] = 'NotMergeable'
+                    report['message'] = "mergeable_state is %s" % state
+                    return report
+                if check:
+                    check(pr)
+                self.throttle()
+                try:
+                    _merge_head(pr)
+                except GithubException as e:
+                    # 405: the base branch was modified, 409: the head branch was modified
+                    if e.status in (405, 409) and attempt < self.MAX_MERGE_RETRIES:
+                        logger.warning("Merge of PR %s refused (%s), trying again", pr.number, e.data.get('message') if isinstance(e.data, dict) else e.data)
+                        self.sleep(self.POLL_INTERVAL)
+                        continue
+                    raise
+                self.last_merge = self.clock()
+                report['merged'] = True
+                return report
+        except (NoMergeCommentError, OwnerCannotShipError, NoApproversError) as e:
+            report['reason'] = type(e).__name__
+            report['message'] = str(e)
+        except GithubException as e:
+            report['reason'] = 'MergeFailed'
+            report['message'] = e.data.get('message') if isinstance(e.data, dict) else str(e)
+        return report
+
+
+@_counted_action('merge')
+def _merge_head(pr):
+    """Merges the PR at the head it was checked at"""
+    pr.merge(sha=pr.head.sha)
+
+
+def github_merge_queue(**args):
+    """
+    Merges the PRs of --numbers or --label one after another, in --order, at most --max-merge-rate a minute
+    Conditions (--condition-*) are checked against the comments since the head commit before each merge
+    Prints one JSON report per PR, ie. {"number": 17, "merged": false, "reason": "NotMergeable", "message": "mergeable_state is dirty"}
+    """
+    check_required_fields(['token', 'repo'], **args)
+    session = _session(**args)
+    if 'numbers' in args and args['numbers']:
+        prs = [session.get_pull(args['repo'], number) for number in args['numbers']]
+    elif any(args.get(selection) for selection in ('label', 'filters', 'head')):
+        prs = list(_list_prs(**args))
+    else:
+        logger.error(' NUMBERS or LABEL parameter not set')
+        sys.exit(1)
+    if args.get('order') == 'number':
+        prs.sort(key=lambda pr: pr.number)
+    elif args.get('order') == 'updated':
+        prs.sort(key=lambda pr: pr.updated_at)
+
+    check = None
+    if args['condition_approved_mergers'] or args['condition_approved_mergers_file'] or args['condition_non_owner_merger']:
+        check = lambda pr: _check_merge_conditions(pr.user.login, _pr_merge_comment_users(pr, session.get_issue(args['repo'], pr.number), **args), **args)
+    queue = MergeQueue(timeout=args.get('merge_timeout', 600), max_rate=args.get('max_merge_rate'))
+    merged = 0
+    for pr in prs:
+        report = queue.merge(pr, check)
+        merged += report['merged']
+        print json.dumps(report)
+        sys.stdout.flush()
+    logger.info("Merged %d of %d PR(s)", merged, len(prs))
+
+
 def github_comment_pr(**args):
     check_required_fields(['body'], **args)
     pr = _load_pr(**args)
@@ -338,9 +2418,10 @@ def github_delete_pr(**args):
 def github_add_labels(**args):
     issue = _load_issue(**args)
     if (('replacelabels' in args) and not args['replacelabels']):
-        for label in issue.labels:
-            args['label'].append(label.name)
-    issue.set_labels(*args['label'])
+        # Adding to the labels doesn't need the current ones to be fetched first
+        issue.add_to_labels(*args['label'])
+    else:
+        issue.set_labels(*args['label'])
 
 
 def github_update_pr(**args):
@@ -365,10 +2446,313 @@ def github_update_pr(**args):
         print "Warning: PR %d was NOT updated, no title or body to edit provided" % args['number']
 
 
-def main():
-    """ For executing as a script. """
+BATCH_ACTIONS = {
+    'create': github_create_pr,
+    'comment': github_comment_pr,
+    'update': github_update_pr,
+    'labels': github_add_labels,
+    'merge': lambda **args: github_merge_pr_by_number(**args) if args.get('number') else github_merge_pr_by_branch(**args),
+    'delete': github_delete_pr,
+}
+# Fields of the batch itself, every operation runs with the session of the batch
+BATCH_SESSION_FIELDS = ('token', 'token_pool', 'api_url', 'session')
+
+
+def _read_batch(manifest_files):
+    """(line number, operation) of the JSON lines of the manifest files, - being stdin"""
+    line_number = 0
+    for manifest_file in manifest_files or ['-']:
+        lines = sys.stdin if manifest_file == '-' else open(manifest_file)
+        try:
+            # readline rather than the read ahead of file iteration, so each line of a pipe is read as it arrives
+            for line in iter(lines.readline, ''):
+                line_number += 1
+                if line.strip():
+                    yield line_number, line
+        finally:
+            if lines is not sys.stdin:
+                lines.close()
+
+
+def _batch_operation(line_number, line, **args):
+    """Runs one operation of a batch manifest, returns its result as a dictionary"""
+    result = {'line': line_number}
+    output = sys.stdout.capture()
+    try:
+        operation = json.loads(line)
+        args.update(operation)
+        result.update((field, args.get(field)) for field in ('action', 'repo', 'number'))
+        if operation.get('action') not in BATCH_ACTIONS:
+            raise ValueError("unknown batch action %r, expected one of %s" % (operation.get('action'), ', '.join(sorted(BATCH_ACTIONS))))
+        session_fields = [field for field in BATCH_SESSION_FIELDS if field in operation]
+        if session_fields:
+            raise ValueError("%s cannot be set per operation, the batch runs with its own" % ', '.join(session_fields))
+        if isinstance(args.get('label'), basestring):
+            args['label'] = [args['label']]
+        elif args.get('label') is not None:
+            args['label'] = list(args['label'])
+        pr = BATCH_ACTIONS[operation['action']](**args)
+        if pr is not None:
+            result['number'] = pr.number
+        result['ok'] = True
+    except SystemExit as e:
+        result.update(ok=False, error="missing required fields, exit status %s" % e.code)
+    except Exception as e:
+        logger.debug("Batch line %d failed", line_number, exc_info=True)
+        result.update(ok=False, error="%s: %s" % (type(e).__name__, e))
+    finally:
+        sys.stdout.release()
+    if output.getvalue():
+        result['output'] = output.getvalue()
+    return result
+
+
+def _batch_key(line_number, line, default_repo):
+    """Operations with the same key touch the same PR, they run one after the other in manifest order"""
+    try:
+        operation = json.loads(line)
+        key = (operation.get('repo') or default_repo, operation.get('number') or operation.get('head'))
+    except ValueError:
+        key = None
+    if key is None or key[1] is None or operation.get('action') == 'create':
+        return ('line', line_number)
+    return key
+
+
+def github_batch(**args):
+    """
+    Runs the operations of a JSON lines manifest (--manifest files or stdin), one per line, ie.
+        {"action": "comment", "repo": "dataxu/test_repo", "number": 17, "body": "shipit"}
+    with the fields main() accepts, and prints one JSON result per line as operations finish
+    Every operation shares the session of the batch, so each repo and PR is loaded once.
+    Operations on different PRs run on --jobs threads, those on the same PR in manifest order
+    """
+    # Operations waiting behind the running one of their key, a key is only in here while one of its operations runs
+    chains = {}
+    lock = threading.Lock()
+    failed = [0]
+
+    def run_chain(key):
+        while True:
+            with lock:
+                if not chains[key]:
+                    del chains[key]
+                    return
+                line_number, line = chains[key].popleft()
+            result = _batch_operation(line_number, line, **args)
+            with lock:
+                failed[0] += not result['ok']
+                stdout.write(json.dumps(result) + '\n')
+                stdout.flush()
+
+    stdout = sys.stdout
+    if not isinstance(stdout, _ThreadLocalStream):
+        sys.stdout = _ThreadLocalStream(stdout)
+    from multiprocessing.pool import ThreadPool
+    pool = ThreadPool(max(args.get('jobs', 1), 1))
+    try:
+        # Each operation is dispatched as soon as its line is read, not once the whole manifest is
+        for line_number, line in _read_batch(args.get('manifest')):
+            key = _batch_key(line_number, line, args.get('repo'))
+            with lock:
+                running = key in chains
+                chains.setdefault(key, collections.deque()).append((line_number, line))
+            if not running:
+                pool.apply_async(run_chain, (key,))
+        pool.close()
+        pool.join()
+    finally:
+        pool.terminate()
+        sys.stdout = stdout
+    if failed[0]:
+        logger.error("%d batch operation(s) failed", failed[0])
+        sys.exit(1)
+
+
+class _ThreadLocalStream(object):
+    """Stands in for sys.stdout/sys.stderr so that serve and batch can capture the output of each of their threads"""
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._local = threading.local()
+
+    def capture(self):
+        self._local.buffer = StringIO()
+        return self._local.buffer
+
+    def release(self):
+        self._local.buffer = None
+
+    def write(self, data):
+        buffer = getattr(self._local, 'buffer', None)
+        (self._stream if buffer is None else buffer).write(data)
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+class _ThreadLogLevel(logging.Filter):
+    """Drops the log records under the -v level of the command running in the thread, for serve"""
+
+    def __init__(self, level):
+        logging.Filter.__init__(self)
+        self.default_level = level
+        self._local = threading.local()
+
+    def set(self, level):
+        self._local.level = level
+
+    def filter(self, record):
+        return record.levelno >= (getattr(self._local, 'level', None) or self.default_level)
+
+
+def _command_server(family, address):
+    """The threaded server of serve on a unix socket or TCP address, built when serving"""
+    import socket
+    import SocketServer
+
+    class _CommandHandler(SocketServer.StreamRequestHandler):
+        """Reads one JSON command per line from a thin client, and answers with one JSON result per line"""
+
+        def handle(self):
+            for line in iter(self.rfile.readline, ''):
+                response = _serve_command(self.server, json.loads(line))
+                self.wfile.write(json.dumps(response) + '\n')
+                self.wfile.flush()
+
+    if family == socket.AF_UNIX:
+        class _CommandServer(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+            daemon_threads = True
+    else:
+        class _CommandServer(SocketServer.ThreadingMixIn, SocketServer.TCPServer):
+            daemon_threads = True
+            allow_reuse_address = True
+
+    return _CommandServer(address, _CommandHandler)
+
+
+def _server_address(address):
+    """(socket family, address) of a unix socket path or a host:port"""
+    import socket
+    host, _, port = address.rpartition(':')
+    if host and port.isdigit():
+        return socket.AF_INET, (host, int(port))
+    return socket.AF_UNIX, address
+
+
+def _is_loopback(host):
+    """Whether a host name or address only takes connections from this machine"""
+    import socket
+    if host in ('localhost', '::1'):
+        return True
+    try:
+        return bool(host) and socket.gethostbyname(host).startswith('127.')
+    except socket.error:
+        return False
+
 
+def _serve_command(server, request):
+    """
+    Runs the command of a thin client in the serve process, capturing its output, logs and exit status
+    The command always runs with the token of the client, never with the one of the server
+    """
+    parser = server.parser
+    stdout = sys.stdout.capture()
+    stderr = sys.stderr.capture()
+    status = 0
+    try:
+        if server.secret and not hmac.compare_digest(str(request.get('secret') or ''), server.secret):
+            parser.error('wrong --server-secret')
+        args = vars(parser.parse_args(request['argv']))
+        server.log_level.set(LOG_LEVELS.get(args['verbose'], logging.DEBUG))
+        if args['action'] in ('serve', 'ingest', 'batch'):
+            parser.error('%s cannot be sent to a server' % args['action'])
+        if not request.get('token'):
+            parser.error('the server only runs commands with the token of the client, set --token or GITHUB_API_TOKEN')
+        _check_args(parser, args)
+        args['token'] = request['token']
+        args['approved_mergers_file_path'] = os.path.join(request.get('cwd', ''), args['approved_mergers_file_path'])
+        args['session'] = GithubSession(args['token'], args['api_url'])
+        _run_action(**args)
+    except SystemExit as e:
+        status = e.code if isinstance(e.code, int) else int(e.code is not None)
+    except Exception:
+        traceback.print_exc()
+        status = 1
+    finally:
+        server.log_level.set(None)
+        sys.stdout.release()
+        sys.stderr.release()
+    return {'status': status, 'stdout': stdout.getvalue(), 'stderr': stderr.getvalue()}
+
+
+def github_serve(parser, **args):
+    """
+    Serves the commands of thin clients (--server) from one warm process, until interrupted
+    Imports, kept alive connections, the in memory HTTP cache and the approved mergers files
+    are shared by every command
+    """
+    import socket
+    family, address = _server_address(args['server'] or DEFAULT_SERVER_SOCKET)
+    if family == socket.AF_UNIX:
+        if os.path.exists(address):
+            os.remove(address)
+        if not os.path.isdir(os.path.dirname(os.path.abspath(address))):
+            os.makedirs(os.path.dirname(os.path.abspath(address)))
+        umask = os.umask(0o177)
+        try:
+            server = _command_server(family, address)
+        finally:
+            os.umask(umask)
+    else:
+        server = _command_server(family, address)
+    server.parser = parser
+    server.secret = args.get('server_secret')
+    server.log_level = _ThreadLogLevel(logger.level)
+    sys.stdout = _ThreadLocalStream(sys.stdout)
+    sys.stderr = _ThreadLocalStream(sys.stderr)
+    # The logs of a command go to its client, at its own -v level
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, logging.StreamHandler):
+            handler.stream = sys.stderr
+            handler.addFilter(server.log_level)
+    logger.setLevel(logging.DEBUG)
+    logger.warning("Serving github-pr commands on %s", address)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if family == socket.AF_UNIX and os.path.exists(address):
+            os.remove(address)
+
+
+def _request_server(address, argv, token, secret=None):
+    """
+    Thin client, runs the command in a github-pr serve process and relays its output
+    Returns the exit status of the command, or None when the server cannot be reached
+    """
+    import socket
+    family, address = _server_address(address)
+    client = socket.socket(family, socket.SOCK_STREAM)
+    try:
+        client.connect(address)
+        client.sendall(json.dumps({'argv': argv, 'token': token, 'secret': secret, 'cwd': os.getcwd()}) + '\n')
+        response = json.loads(client.makefile().readline())
+    except (socket.error, ValueError) as e:
+        logger.warning("Cannot reach github-pr server %s, running locally: %s", address, e)
+        return None
+    finally:
+        client.close()
+    sys.stdout.write(response['stdout'].encode('utf-8'))
+    sys.stderr.write(response['stderr'].encode('utf-8'))
+    return response['status']
+
+
+def _build_parser():
     default_token = os.getenv('GITHUB_API_TOKEN')
+    default_token_pool = [os.environ[name] for name in sorted(os.environ) if name.startswith('GITHUB_API_TOKEN_')]
 
     parser = argparse.ArgumentParser(
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -381,7 +2765,7 @@ Show PRs or a specific PR
     - Filters - can be used alone or together
         --filters
             * owner - This will return a list of PRs from the repo that are owned by the github-user
-            * status - returns PRs with a specifc status, one of (success, failure, error, pending)
+            * status - returns PRs with a specifc status, one of (success, failure, error, pending), as the current state of one of the contexts of its head
             * label - returns PRs with a specifc label
             * comment - returns PRs that have at least one comment matching a given string
       github-pr list -r dataxu/test_repo --filters 'filter1_name=filter1_value,filter2_name=filter2_value'
@@ -389,6 +2773,12 @@ Show PRs or a specific PR
       github-pr list -r dataxu/test_repo --filters 'owner=frankenstein,status=success,comment=:pitchfork:'
             This returns the number of all PRs in the given repo owned by frankenstein with the status success and containing any comments that have ":pitchfork:"
 
+      github-pr list -r dataxu/test_repo --filters 'label=ready,status=success' --graphql
+            Same filters, but PRs, labels, statuses and comments are fetched in bulk with a few GraphQL queries
+
+      github-pr list -r dataxu/test_repo --filters 'status=success,comment=:shipit:' --jobs 8
+            Evaluates up to 8 PRs at a time, the output order stays the same
+
 Create a PR
 
     github-pr create -r dataxu/test_repo -t "PR Title" --head "my-test-branch" --body 'Description Line 1<br/>Line2'
@@ -423,6 +2813,49 @@ Delete a PR
 
     github-pr delete -r dataxu/test_repo -n 17
 
+Mirror the PRs of a repo locally, and list from the mirror without any API call
+
+    github-pr sync -r dataxu/test_repo
+    github-pr list -r dataxu/test_repo --filters 'owner=frankenstein,status=success' --table --from-index
+        The first sync mirrors every open PR, later ones only fetch the PRs updated since the previous sync.
+
+    github-pr ingest --listen 0.0.0.0:8080 --webhook-secret <secret>
+    github-pr ingest --events captured-events.jsonl
+    github-pr check-condition -r dataxu/dcommand -n 84 --condition-non-owner-merger --from-index
+        Keeps the index current from pull_request, issue_comment, status and label webhooks instead of polling.
+
+    github-pr list -r 'dataxu/*,frankenstein/github-pr' --filters 'owner=frankenstein' --table
+    github-pr list --org dataxu --label ready
+        Lists the repos in parallel, each repo's PRs are printed as soon as they arrive.
+
+    github-pr list -r dataxu/test_repo --filters 'status=success' --output ndjson --limit 5
+        Prints each row as soon as it is ready, and stops paginating once 5 PRs were printed.
+
+    github-pr list -r dataxu/test_repo --columns number,title,status
+        Only fetches the data of these columns, status being the combined status of the head commit.
+
+    github-pr check-condition -r dataxu/dcommand --all --label ready --condition-non-owner-merger -j 8
+        Checks every open PR with the label, printing one JSON report per PR with the reason it is not shippable.
+
+    github-pr merge-queue -r dataxu/dcommand --label ready --order number --max-merge-rate 2 --condition-non-owner-merger
+        Merges the PRs one after another once GitHub reports them mergeable, at most 2 a minute.
+        PRs blocked by branch protection, behind their base or in conflict are skipped.
+
+    github-pr wait -r dataxu/dcommand -n 84 --condition-non-owner-merger --timeout 1800
+    github-pr wait -r dataxu/dcommand -n 84 --filters 'status=success' --timeout 1800
+        Blocks until the PR meets its merge conditions (or the filters), exits 1 after the timeout.
+
+    github-pr batch --manifest operations.jsonl -j 8
+        Runs one operation per line, ie. {"action": "labels", "repo": "dataxu/test_repo", "number": 17, "label": ["ready"]},
+        with create, comment, update, labels, merge and delete, and prints one JSON result per line.
+
+Keep a warm process serving commands, and run commands in it
+
+    github-pr serve --server /tmp/github-pr.sock --max-age 10
+    github-pr check-condition -r dataxu/dcommand -n 84 --condition-non-owner-merger --server /tmp/github-pr.sock
+        The serve process keeps its connections, caches and approved mergers files between commands.
+        GITHUB_PR_SERVER can be set instead of passing --server to every command.
+
 Check conditional status checks
     !!!This check only looks at comments AFTER the latest commit, to validate that the
     most recent code (most recent git sha pushed to the PR) has been peer reviewed!!!
@@ -439,24 +2872,57 @@ Check conditional status checks
         convention to use, while this passing the list on the commandline option is primarily for local testing
         when setting up your CD flow.
         """)
-    parser.add_argument('action', choices=['create', 'list', 'merge', 'comment', 'delete', 'update', 'check-condition'], help='action to take')
-    parser.add_argument('-r', '--repo', required=True, help='the owner/name of the repository')
+    parser.add_argument('action', choices=['create', 'list', 'merge', 'merge-queue', 'comment', 'delete', 'update', 'check-condition', 'wait', 'serve', 'sync', 'ingest', 'batch'], help='action to take')
+    parser.add_argument('-r', '--repo', help='the owner/name of the repository, required by every action but serve, ingest and batch. '
+                                             'list also takes a comma separated list of repos, where names can be globs ie. dataxu/*')
+    parser.add_argument('--org', help='list the PRs of every repository of an organization or user, same as -r <org>/*')
     parser.add_argument('-t', '--title', help='the title of the pr')
     parser.add_argument('-f', '--files', action='store_true', default=False, help='list files in the PR')
     parser.add_argument('-n', '--number', type=int, help='pr number')
     parser.add_argument('-l', '--label', nargs='+', help='label(s) to add/apply to the pr (one or more, space separated), or find a list of prs with matching labels (with list action)')
     parser.add_argument('-c', '--comments', action='store_true', help='added to list, to return list of comments')
     parser.add_argument('--filters', help='add this to the list function with collection of options you want to filter your results for', type=str)
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='number of PRs to fetch statuses, labels and comments for, or batch operations to run, concurrently')
+    parser.add_argument('--graphql', action='store_true', help='fetch PRs for --filters in bulk with the GraphQL API instead of per PR REST calls')
     parser.add_argument('--base', default='master', help='branch the pr is against')
-    parser.add_argument('--head', help='branch the pr is of')
+    parser.add_argument('--head', help='branch the pr is of (owner:branch for a branch of a fork)')
     parser.add_argument('--body', default='', help='the description of the pr')
     parser.add_argument('--replacelabels', action='store_true', help='replace ALL labels during an update')
     parser.add_argument('--token', default=default_token, help='api token to use')
+    parser.add_argument('--token-pool', nargs='+', default=default_token_pool, help='extra api tokens to spread reads over, defaults to the GITHUB_API_TOKEN_* variables')
+    parser.add_argument('--api-url', default=os.getenv('GITHUB_API_URL', DEFAULT_API_URL), help='base URL of the GitHub API, for GitHub Enterprise or a local fake of the API')
     parser.add_argument('--numberonly', action='store_true', help='only return the numbers of the PRs during the list action')
     parser.add_argument('--table', action='store_true', help='show a table of output instead of pretty. not compatible with numberonly')
     parser.add_argument('--tableformat', default='simple', help='format of table to use')
+    parser.add_argument('--output', choices=['ndjson', 'csv', 'fixed'], help='stream the table of the list action, printing each row as soon as it is produced')
+    parser.add_argument('--columns', type=_columns_type, help='comma separated columns of the table, only their data is fetched. '
+                                                           'any of %s (default: all)' % ','.join(PR_COLUMNS))
+    parser.add_argument('--limit', type=int, help='stop listing, paginating and fetching statuses once this many PRs were printed')
     parser.add_argument('--noheaders', action='store_true', help='remove headers from table view. best for programmatic use of this script')
-    parser.add_argument('--noratelimit', action='store_true', help="don't show the rate limit")
+    parser.add_argument('--cache-dir', default=os.getenv('GITHUB_PR_CACHE_DIR', DEFAULT_CACHE_DIR), help='directory of the HTTP response cache, revalidated with conditional requests')
+    parser.add_argument('--cache-size', type=int, default=50, help='size of the HTTP response cache in MB, least recently used responses are evicted')
+    parser.add_argument('--no-cache', action='store_true', help="don't use the HTTP response cache")
+    parser.add_argument('--index', default=os.getenv('GITHUB_PR_INDEX', DEFAULT_INDEX), help='path of the local SQLite PR index kept by sync')
+    parser.add_argument('--from-index', action='store_true', help='list or check-condition from the local PR index, without any API call')
+    parser.add_argument('--manifest', nargs='+', help='JSON lines files of batch operations, - for stdin (default)')
+    parser.add_argument('--events', nargs='+', help='files of webhook events to ingest, as JSON lines of {"event": ..., "payload": ...}, - for stdin (default)')
+    parser.add_argument('--listen', help='host:port to receive GitHub webhooks on during ingest')
+    parser.add_argument('--webhook-secret', default=os.getenv('GITHUB_WEBHOOK_SECRET'), help='secret to verify the X-Hub-Signature-256 of received webhooks, required unless --listen is on a loopback address')
+    parser.add_argument('--max-age', type=int, default=0, help='seconds a cached response is used without revalidating it, best for serve')
+    parser.add_argument('--server', default=os.getenv('GITHUB_PR_SERVER'), help='unix socket path or host:port of a github-pr serve process to run the command in, or to listen on with serve')
+    parser.add_argument('--server-secret', default=os.getenv('GITHUB_PR_SERVER_SECRET'), help='secret shared by serve and its clients, required when serve listens on a non loopback host:port')
+    parser.add_argument('--stats', action='store_true', help='print the API requests by action and endpoint to stderr when done')
+    parser.add_argument('--stats-json', help='file to export the API request counters to, as JSON')
+    parser.add_argument('--stats-prometheus', help='file to export the API request counters to, as a Prometheus textfile')
+    parser.add_argument('--ratelimit', action='store_true', help='show the remaining API rate limit on stderr when done, not with --numberonly')
+    parser.add_argument('--noratelimit', action='store_true', help="don't show the rate limit, the default unless --ratelimit")
+    parser.add_argument('--all', action='store_true', help='check-condition of every open PR, or of those selected by --label or --filters, '
+                                                           'printing one JSON report per PR')
+    parser.add_argument('--timeout', type=float, default=3600, help='seconds wait blocks for the PR to meet its conditions or --filters')
+    parser.add_argument('--numbers', type=int, nargs='+', help='numbers of the PRs to merge-queue')
+    parser.add_argument('--order', choices=['given', 'number', 'updated'], default='given', help='order in which merge-queue merges the PRs')
+    parser.add_argument('--max-merge-rate', type=float, help='most merges a minute during merge-queue')
+    parser.add_argument('--merge-timeout', type=float, default=600, help='seconds merge-queue waits for a PR to become mergeable')
     parser.add_argument('--mergecomment', default=":shipit:", help='string to look for when checking comments for "shipit" approval, during MERGE only')
     parser.add_argument('--condition-non-owner-merger', action='store_true', help='stops owner from being able to apply merge comment')
     parser.add_argument('--condition-approved-mergers', default=None, nargs='+', help='list of usernames of approved mergers')
@@ -465,16 +2931,10 @@ Check conditional status checks
     parser.add_argument('-v', '--verbose', const=1, default=0, type=int, nargs="?",
                     help="Logger verbosity: 0 = WARN (default), 1 = INFO, 2 = DEBUG")
 
-    args = vars(parser.parse_args())
-    logging.basicConfig(format="%(asctime)s %(levelname)-7s %(filename)20s:%(lineno)-4d | %(message)s")
+    return parser
 
-    if args['verbose'] == 0:
-        logger.setLevel(logging.WARN) 
-    elif args['verbose'] == 1:
-        logger.setLevel(logging.INFO) 
-    elif args['verbose'] == 2:
-        logger.setLevel(logging.DEBUG)
 
+def _run_action(**args):
     if 'action' in args and args['action'] == 'create':
         github_create_pr(**args)
 
@@ -487,6 +2947,12 @@ Check conditional status checks
         else:
             github_merge_pr_by_branch(**args)
 
+    elif 'action' in args and args['action'] == 'wait':
+        github_wait(**args)
+
+    elif 'action' in args and args['action'] == 'merge-queue':
+        github_merge_queue(**args)
+
     elif 'action' in args and args['action'] == 'comment':
         github_comment_pr(**args)
 
@@ -499,11 +2965,80 @@ Check conditional status checks
     elif 'action' in args and args['action'] == 'check-condition':
         github_check_condition(**args)
 
-    gh = Github(args['token'])
+    elif 'action' in args and args['action'] == 'sync':
+        github_sync(**args)
+
+    elif 'action' in args and args['action'] == 'ingest':
+        github_ingest(**args)
+        return
+
+    elif 'action' in args and args['action'] == 'batch':
+        github_batch(**args)
+        return
+
+    if 'ratelimit' in args and args['ratelimit'] and not args.get('numberonly'):
+        # Read from the headers of the last response, only costs a request when none was made
+        # On stderr, so it does not mix with the output of the action
+        remaining, limit = args['session'].github.rate_limiting
+        sys.stderr.write("Github Rate Limiting: %d remaining of max %d\n" % (remaining, limit))
+
+
+def _check_args(parser, args):
+    """Completes and validates the arguments of a command, run here or in a serve process"""
+    if args['org'] and not args['repo']:
+        args['repo'] = '%s/*' % args['org']
+    if args['action'] not in ('serve', 'ingest', 'batch') and not args['repo']:
+        parser.error('argument -r/--repo is required')
+    if args['action'] != 'list' and args['repo'] and any(c in args['repo'] for c in ',*?['):
+        parser.error('only list takes several repositories')
+    if args['action'] == 'ingest' and args['listen'] and not args['webhook_secret']:
+        import socket
+        family, address = _server_address(args['listen'])
+        if family != socket.AF_INET or not _is_loopback(address[0]):
+            parser.error('ingest --listen needs --webhook-secret, unless it listens on a loopback address')
+    if args['action'] == 'serve' and args['server'] and not args['server_secret']:
+        import socket
+        family, address = _server_address(args['server'])
+        if family == socket.AF_INET and not _is_loopback(address[0]):
+            parser.error('serve needs --server-secret, unless it listens on a unix socket or a loopback address')
+
+
+def main():
+    """ For executing as a script. """
+
+    parser = _build_parser()
+    args = vars(parser.parse_args())
+    logging.basicConfig(format="%(asctime)s %(levelname)-7s %(filename)20s:%(lineno)-4d | %(message)s")
+
+    logger.setLevel(LOG_LEVELS.get(args['verbose'], logging.DEBUG))
+    _check_args(parser, args)
+
+    if args['server'] and args['action'] not in ('serve', 'ingest', 'batch'):
+        status = _request_server(args['server'], sys.argv[1:], args['token'], args['server_secret'])
+        if status is not None:
+            sys.exit(status)
+
+    http_cache = None
+    if not args['no_cache']:
+        http_cache = _open_http_cache(**args)
+        _install_sha_store(**args)
+    if args['stats'] or args['stats_json'] or args['stats_prometheus']:
+        _install_request_stats(**args)
+    args['token'] = args['token'] or (args['token_pool'] or [None])[0]
+    _install_connection_classes(http_cache, RateLimitScheduler([args['token']] + args['token_pool']), request_stats)
+
+    try:
+        if args['action'] == 'serve':
+            github_serve(parser, **args)
+        else:
+            args['session'] = GithubSession(args['token'], args['api_url'])
+            _run_action(**args)
+    finally:
+        if http_cache:
+            logger.info("HTTP CACHE: %d hits, %d misses", http_cache.hits, http_cache.misses)
+        if request_stats:
+            _report_request_stats(**args)
 
-    if (('numberonly' in args) and not args['numberonly']):
-        if (('noratelimit' in args) and not args['noratelimit']):
-            print "Github Rate Limiting: %d remaining of max %d" % (gh.rate_limiting[0], gh.rate_limiting[1])
 
 if __name__ == '__main__':
     main()
@@ -21,9 +21,7 @@ setup(
         'argparse==1.3.0',
         'PyGithub==1.39.0',
         'wsgiref==0.1.2',
-        'tabulate==0.7.5',
-        'tzlocal',
-        'pytz'
+        'tabulate==0.7.5'
     ],
     setup_requires=[
         'argparse',
@@ -0,0 +1,99 @@
+"""
+Shared set up of the tests: imports github_pr and the fake GitHub API of the benchmarks
+
+    python -m unittest discover tests
+"""
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'benchmarks')]
+
+import github_pr  # noqa: E402
+from fake_github import FakeGithubServer  # noqa: E402
+
+logger = logging.getLogger()
+logger.addHandler(logging.NullHandler())
+
+
+class FakeClock(object):
+    """Sleeps by moving the clock forward, and remembers the delays"""
+
+    def __init__(self):
+        self.now = time.time()
+        self.sleeps = []
+
+    def sleep(self, delay):
+        self.sleeps.append(delay)
+        self.now += delay
+
+    def time(self):
+        return self.now
+
+
+class RecordingHandler(logging.Handler):
+    """Keeps the log records, Python 2 unittest has no assertLogs"""
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class FakeGithubTestCase(unittest.TestCase):
+    """Runs each test against a new fake API, in a thread, with the default connection classes restored after it"""
+
+    def setUp(self):
+        from github.Requester import Requester
+        self.server = FakeGithubServer().start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.addCleanup(Requester.resetConnectionClasses)
+        self.addCleanup(self._close_pooled_connections)
+        self.work_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.work_dir)
+
+    @staticmethod
+    def _close_pooled_connections():
+        for connections in github_pr._connection_pool.values():
+            for connection in connections:
+                connection.close()
+        github_pr._connection_pool.clear()
+
+    def github(self, token='a'):
+        from github import Github
+        return Github(token, base_url=self.server.url)
+
+    def requests(self, endpoint):
+        return self.server.counts[endpoint]
+
+    def run_command(self, argv, token='a'):
+        """
+        Runs a github-pr command against the fake API like main does, returns its output as bytes
+        and keeps its exit status in self.exit_status
+        """
+        parser = github_pr._build_parser()
+        args = vars(parser.parse_args(argv + ['--api-url', self.server.url, '--no-cache'] + (['--token', token] if token else [])))
+        github_pr._check_args(parser, args)
+        github_pr._install_connection_classes()
+        args['session'] = github_pr.GithubSession(args['token'], args['api_url'])
+        # A file like a pipe, where Python 2 cannot print non ASCII unicode
+        stdout = tempfile.TemporaryFile()
+        self.addCleanup(setattr, sys, 'stdout', sys.stdout)
+        sys.stdout = stdout
+        self.exit_status = 0
+        try:
+            github_pr._run_action(**args)
+        except SystemExit as e:
+            self.exit_status = e.code
+        finally:
+            sys.stdout = sys.__stdout__
+        stdout.seek(0)
+        return stdout.read()
@@ -0,0 +1,51 @@
+"""batch against the fake API: labels, the fields an operation cannot set, and lines run as they arrive"""
+import json
+import os
+import subprocess
+import sys
+import threading
+
+from support import ROOT, FakeGithubTestCase
+
+REPO = 'bench/prs-10'
+
+
+class BatchTest(FakeGithubTestCase):
+
+    def run_batch(self, *operations):
+        manifest = '%s/manifest.jsonl' % self.work_dir
+        with open(manifest, 'w') as manifest_file:
+            manifest_file.writelines(json.dumps(operation) + '\n' for operation in operations)
+        return [json.loads(line) for line in self.run_command(['batch', '--manifest', manifest]).splitlines()]
+
+    def test_a_label_name_is_one_label(self):
+        results = self.run_batch({'action': 'labels', 'repo': REPO, 'number': 3, 'label': 'ready'},
+                                 {'action': 'labels', 'repo': REPO, 'number': 4, 'label': ['ready', 'wip']})
+        self.assertTrue(all(result['ok'] for result in results), results)
+        self.assertIn('ready', self.server.repo(REPO).prs[3]['labels'])
+        self.assertNotIn('r', self.server.repo(REPO).prs[3]['labels'])
+        self.assertTrue(set(['ready', 'wip']) <= set(self.server.repo(REPO).prs[4]['labels']))
+
+    def test_an_operation_cannot_set_its_own_token(self):
+        results = self.run_batch({'action': 'comment', 'repo': REPO, 'number': 3, 'body': 'shipit', 'token': 'other'})
+        self.assertEqual(self.exit_status, 1)
+        self.assertFalse(results[0]['ok'])
+        self.assertIn('token cannot be set per operation', results[0]['error'])
+        self.assertEqual(self.server.tokens['other'], 0)
+        self.assertEqual(self.requests('POST /repos/:owner/:repo/issues/:number/comments'), 0)
+
+    def test_each_line_runs_as_it_arrives(self):
+        batch = subprocess.Popen([sys.executable, os.path.join(ROOT, 'github_pr.py'), 'batch', '--no-cache',
+                                  '--api-url', self.server.url, '--token', 'a'], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        # Kills a batch that waits for the end of the manifest, rather than hanging the tests
+        watchdog = threading.Timer(30, batch.kill)
+        watchdog.start()
+        self.addCleanup(watchdog.cancel)
+        for number in (3, 4):
+            batch.stdin.write(json.dumps({'action': 'comment', 'repo': REPO, 'number': number, 'body': 'shipit'}) + '\n')
+            batch.stdin.flush()
+            result = json.loads(batch.stdout.readline())
+            self.assertEqual((result['number'], result['ok']), (number, True))
+        batch.stdin.close()
+        self.assertEqual(batch.stdout.read(), '')
+        self.assertEqual(batch.wait(), 0)
@@ -0,0 +1,73 @@
+"""HTTPCache, ShaStore and PRIndex on disk: revalidation, eviction, --no-cache and private files"""
+import os
+import stat
+import subprocess
+import sys
+
+from support import ROOT, FakeGithubTestCase, github_pr
+
+REPO = 'bench/prs-10'
+
+
+def _mode(path):
+    return stat.S_IMODE(os.stat(path).st_mode)
+
+
+class HTTPCacheTest(FakeGithubTestCase):
+
+    def cache(self, max_size=1024 * 1024):
+        cache = github_pr.HTTPCache(os.path.join(self.work_dir, 'http'), max_size)
+        github_pr._install_connection_classes(cache)
+        return cache
+
+    def test_revalidates_with_conditional_requests(self):
+        cache = self.cache()
+        github = self.github('a')
+        self.assertEqual(github.get_repo(REPO).get_pull(1).title, self.server.repo(REPO).prs[1]['title'])
+        self.assertEqual(github.get_repo(REPO).get_pull(1).title, self.server.repo(REPO).prs[1]['title'])
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        self.server.repo(REPO).prs[1]['title'] = 'Changed'
+        self.assertEqual(github.get_repo(REPO).get_pull(1).title, 'Changed')
+        self.assertEqual((cache.hits, cache.misses), (1, 2))
+        self.assertEqual(self.requests('GET /repos/:owner/:repo/pulls/:number'), 3)
+
+    def test_evicts_the_least_recently_used_entries(self):
+        # Room for three entries of about 1 KB, the fourth one evicts the one used the longest ago
+        cache = github_pr.HTTPCache(os.path.join(self.work_dir, 'http'), 3500)
+        body = 'x' * 900
+        for i, key in enumerate(['a', 'b', 'c']):
+            cache.store(key, 200, [], body)
+            os.utime(cache._entry_path(key), (i, i))
+        os.utime(cache._entry_path('a'), (10, 10))
+        cache.store('d', 200, [], body)
+        self.assertEqual(sorted(name[0] for name in os.listdir(cache.path)), ['a', 'c', 'd'])
+
+    def test_an_overwritten_entry_is_counted_once(self):
+        cache = github_pr.HTTPCache(os.path.join(self.work_dir, 'http'), 3000)
+        for _ in range(5):
+            cache.store('a', 200, [], 'x' * 900)
+        cache.store('b', 200, [], 'x' * 900)
+        self.assertEqual(sorted(os.listdir(cache.path)), ['a.json', 'b.json'])
+        self.assertEqual(cache._size, sum(size for mtime, size, path in cache._entries()))
+
+    def test_no_cache_writes_nothing(self):
+        cache_dir = os.path.join(self.work_dir, 'cache')
+        command = [sys.executable, os.path.join(ROOT, 'github_pr.py'), 'list', '-r', REPO, '--numberonly',
+                   '--api-url', self.server.url, '--token', 'a', '--cache-dir', cache_dir]
+        with open(os.devnull, 'w') as devnull:
+            subprocess.check_call(command + ['--no-cache'], stdout=devnull)
+            self.assertFalse(os.path.exists(cache_dir))
+            subprocess.check_call(command, stdout=devnull)
+        self.assertTrue(os.listdir(cache_dir))
+
+    def test_only_the_user_can_read_what_is_stored(self):
+        cache = github_pr.HTTPCache(os.path.join(self.work_dir, 'http'), 3000)
+        cache.store('a', 200, [], '{}')
+        sha_store = github_pr.ShaStore(os.path.join(self.work_dir, 'sha'))
+        sha_store.put('files', 'a' * 40, ['README.md'])
+        index_path = os.path.join(self.work_dir, 'index', 'index.sqlite')
+        github_pr.PRIndex(index_path).connection.close()
+        for path in (cache.path, sha_store.path, os.path.dirname(sha_store._entry_path('files', 'a' * 40)), os.path.dirname(index_path)):
+            self.assertEqual(_mode(path), 0o700, path)
+        for path in (cache._entry_path('a'), sha_store._entry_path('files', 'a' * 40), index_path):
+            self.assertEqual(_mode(path), 0o600, path)
@@ -0,0 +1,28 @@
+"""check-condition against the fake API"""
+import json
+import os
+import time
+
+from support import FakeGithubTestCase
+
+REPO = 'bench/prs-10'
+
+
+class CheckConditionTest(FakeGithubTestCase):
+
+    def set_timezone(self, timezone):
+        self.addCleanup(time.tzset)
+        if 'TZ' in os.environ:
+            self.addCleanup(os.environ.__setitem__, 'TZ', os.environ['TZ'])
+        else:
+            self.addCleanup(os.environ.pop, 'TZ', None)
+        os.environ['TZ'] = timezone
+        time.tzset()
+
+    def test_finds_the_merge_comments_made_soon_after_the_head_commit_east_of_utc(self):
+        # The :shipit: of PR 1 is less than 9 hours after its head commit
+        self.set_timezone('Asia/Tokyo')
+        self.run_command(['check-condition', '-r', REPO, '-n', '1', '--condition-non-owner-merger'])
+        self.assertEqual(self.exit_status, 0)
+        reports = [json.loads(line) for line in self.run_command(['check-condition', '-r', REPO, '--all', '--limit', '1']).splitlines()]
+        self.assertTrue(reports[0]['shippable'], reports)
@@ -0,0 +1,35 @@
+"""--filters with --graphql against the GraphQL endpoint of the fake API, on github.com and Enterprise URLs"""
+from support import FakeGithubTestCase, github_pr
+
+REPO = 'bench/prs-100'
+
+
+class GraphqlFiltersTest(FakeGithubTestCase):
+
+    def filtered_numbers(self, filters, api_url=None, repo=REPO, **args):
+        prs = github_pr.github_filter_prs(token='a', repo=repo, filters=filters, api_url=api_url or self.server.url, **args)
+        return [pull_request['pr'].number for pull_request in prs]
+
+    def test_fetches_the_filters_in_one_query_per_page(self):
+        for repo, pages in (('bench/prs-10', 1), ('bench/prs-100', 2)):
+            self.server.counts.clear()
+            self.assertTrue(self.filtered_numbers('status=success,comment=shipit', repo=repo, graphql=True), repo)
+            self.assertEqual(self.requests('POST /graphql'), pages, repo)
+            for endpoint in ('GET /repos/:owner/:repo/pulls', 'GET /repos/:owner/:repo/issues', 'GET /search/issues',
+                             'GET /repos/:owner/:repo/statuses/:sha', 'GET /repos/:owner/:repo/commits/:sha/status',
+                             'GET /repos/:owner/:repo/issues/:number/comments'):
+                self.assertEqual(self.requests(endpoint), 0, endpoint)
+            self.assertEqual(sum(self.server.counts.values()), pages, repo)
+
+    def test_statuses_match_the_rest_filters(self):
+        # Every context of the fake reported pending before its final state, only the current one counts
+        for status in ('success', 'failure', 'pending'):
+            rest = self.filtered_numbers('status=%s' % status)
+            self.assertEqual(self.filtered_numbers('status=%s' % status, graphql=True), rest, status)
+        self.assertNotEqual(self.filtered_numbers('status=pending'), self.filtered_numbers('status=success'))
+
+    def test_enterprise_graphql_endpoint_is_outside_of_the_rest_api(self):
+        numbers = self.filtered_numbers('label=ready', api_url=self.server.url + '/api/v3', graphql=True)
+        self.assertEqual(numbers, self.filtered_numbers('label=ready'))
+        self.assertEqual(dict(self.server.not_found), {})
+        self.assertEqual(self.requests('POST /graphql'), 2)
@@ -0,0 +1,88 @@
+"""The PRIndex, filled by ingest and sync, and the list and check-condition reading it back with --from-index"""
+import json
+import os
+
+from support import FakeGithubTestCase, github_pr
+from fake_github import _time
+
+REPO = 'bench/prs-10'
+
+
+class IndexTest(FakeGithubTestCase):
+
+    def setUp(self):
+        FakeGithubTestCase.setUp(self)
+        self.index_path = os.path.join(self.work_dir, 'index.sqlite')
+
+    def ingest(self, events):
+        events_path = os.path.join(self.work_dir, 'events.jsonl')
+        with open(events_path, 'w') as events_file:
+            for event, payload in events:
+                events_file.write(json.dumps({'event': event, 'payload': payload}) + '\n')
+        self.run_command(['ingest', '--events', events_path, '--index', self.index_path])
+
+    def commented(self, number):
+        """issue_comment events of the comments of a PR of the fake, that tell nothing of its head commit"""
+        pr = self.server.repo(REPO).prs[number]
+        issue = {'number': number, 'state': 'open', 'title': pr['title'], 'user': {'login': pr['user']},
+                 'updated_at': pr['updated_at'], 'labels': [], 'pull_request': {}}
+        for comment in pr['comments']:
+            yield 'issue_comment', {'action': 'created', 'repository': {'full_name': REPO, 'owner': {'login': 'bench'}}, 'issue': issue, 'comment': {
+                'id': comment['id'], 'user': {'login': comment['user']}, 'body': comment['body'],
+                'created_at': _time(comment['created_at']), 'updated_at': _time(comment['updated_at'])}}
+
+    def test_ingest_skips_malformed_events(self):
+        good = list(self.commented(1))[:2]
+        malformed = dict(good[0][1], comment=None)
+        events_path = os.path.join(self.work_dir, 'events.jsonl')
+        with open(events_path, 'w') as events_file:
+            events_file.write(json.dumps({'event': good[0][0], 'payload': good[0][1]}) + '\n')
+            events_file.write('{"event": "issue_comment", "payl\n')
+            events_file.write(json.dumps({'event': 'issue_comment'}) + '\n')
+            events_file.write(json.dumps({'event': 'issue_comment', 'payload': malformed}) + '\n')
+            events_file.write(json.dumps({'event': 'status', 'payload': {'repository': {'full_name': REPO}}}) + '\n')
+            events_file.write(json.dumps({'event': good[1][0], 'payload': good[1][1]}) + '\n')
+        output = self.run_command(['ingest', '--events', events_path, '--index', self.index_path])
+        self.assertTrue(output.startswith('Applied 2 event(s)'), output)
+        comments = github_pr.PRIndex(self.index_path).head_comments(REPO, 1)[2]
+        self.assertEqual(sorted(comment[1] for comment in comments), sorted(payload['comment']['body'] for event, payload in good))
+
+    def check_condition(self, *argv):
+        output = self.run_command(['check-condition', '-r', REPO, '--all', '--condition-non-owner-merger'] + list(argv))
+        return sorted((json.loads(line) for line in output.splitlines()), key=lambda report: report['number'])
+
+    def test_checks_a_pr_without_indexed_head_commit_against_the_api(self):
+        numbers = [number for number, pr in sorted(self.server.repo(REPO).prs.items()) if pr['comments']][:2]
+        self.ingest(event for number in numbers for event in self.commented(number))
+        from_index = self.check_condition('--from-index', '--index', self.index_path)
+        self.assertEqual(from_index, [report for report in self.check_condition() if report['number'] in numbers])
+        self.assertNotIn('Error', [report.get('reason') for report in from_index])
+
+    def sync(self):
+        self.run_command(['sync', '-r', REPO, '--index', self.index_path])
+
+    def test_lists_from_the_index_without_a_token(self):
+        self.sync()
+        listed = self.run_command(['list', '-r', REPO, '--numberonly', '--from-index', '--index', self.index_path], token=None)
+        self.assertEqual(self.exit_status, 0)
+        self.assertEqual(sorted(int(number) for number in listed.split()), sorted(self.server.repo(REPO).prs))
+
+    def test_sync_removes_deleted_merge_comments(self):
+        self.sync()
+        from_index = ['--from-index', '--index', self.index_path]
+        self.assertTrue(self.check_condition(*from_index)[0]['shippable'])
+        pr = self.server.repo(REPO).prs[1]
+        pr['comments'] = [comment for comment in pr['comments'] if comment['body'] != ':shipit:']
+        self.sync()
+        self.assertEqual(self.check_condition(*from_index)[0]['reason'], 'NoMergeCommentError')
+
+    def test_status_column_and_filters_read_the_newest_status_of_each_context(self):
+        # A context of PR 2 failed, then passed when it was run again
+        self.server.repo(REPO).prs[2]['statuses'] = [('success', 'ci', 130), ('failure', 'ci', 125), ('pending', 'ci', 121)]
+        self.sync()
+        from_index = ['--from-index', '--index', self.index_path]
+        for argv in (['--output', 'csv', '--columns', 'number,status'], ['--numberonly', '--filters', 'status=failure'],
+                     ['--numberonly', '--filters', 'status=success']):
+            listed = self.run_command(['list', '-r', REPO] + argv)
+            self.assertEqual(sorted(self.run_command(['list', '-r', REPO] + argv + from_index).splitlines()), sorted(listed.splitlines()), argv)
+        self.assertIn('2,success', self.run_command(['list', '-r', REPO, '--output', 'csv', '--columns', 'number,status'] + from_index).splitlines())
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""list with --limit, the streamed table outputs and several repos, against the fake API"""
+import csv
+import json
+import sys
+import tempfile
+
+from support import FakeGithubTestCase
+
+REPO = 'bench/prs-100'
+
+
+class ListTest(FakeGithubTestCase):
+
+    def test_limit_stops_before_the_next_page(self):
+        output = self.run_command(['list', '-r', REPO, '--limit', '5'])
+        self.assertEqual(len(output.splitlines()), 5)
+        self.assertEqual(self.requests('GET /repos/:owner/:repo/pulls'), 1)
+
+    def test_limit_fetches_only_the_pages_it_prints(self):
+        # 30 PRs per page, the 35th is on the second of the 4 pages
+        output = self.run_command(['list', '-r', REPO, '--limit', '35', '--numberonly'])
+        self.assertEqual(output.split(), [str(number) for number in range(1, 36)])
+        self.assertEqual(self.requests('GET /repos/:owner/:repo/pulls'), 2)
+
+    def test_limit_counts_the_printed_rows(self):
+        self.server.failing_pulls.update([2, 3])
+        output = self.run_command(['list', '-r', REPO, '--limit', '5', '--output', 'ndjson', '--columns', 'number,mergeable'])
+        self.assertEqual([json.loads(line)['number'] for line in output.splitlines()], [1, 4, 5, 6, 7])
+        self.assertEqual(self.requests('GET /repos/:owner/:repo/pulls'), 1)
+
+    def test_list_page_columns_cost_only_the_list_pages(self):
+        output = self.run_command(['list', '-r', REPO, '--output', 'ndjson', '--columns', 'number,title,head'])
+        rows = [json.loads(line) for line in output.splitlines()]
+        self.assertEqual([row['head'] for row in rows], [pr['head_ref'] for number, pr in sorted(self.server.repo(REPO).prs.items())])
+        self.assertEqual(self.requests('GET /repos/:owner/:repo/pulls'), 4)
+        self.assertEqual(sum(self.server.counts.values()), 4)
+
+    def test_non_ascii_cells_are_written_as_utf8(self):
+        pr = self.server.repo(REPO).prs[1]
+        pr.update(title=u'Café ☃', head_ref=u'fix-café')
+        for output in ('csv', 'fixed'):
+            rows = self.run_command(['list', '-r', REPO, '--limit', '1', '--output', output, '--noheaders',
+                                     '--columns', 'number,head,title']).splitlines()
+            self.assertEqual(len(rows), 1)
+            if output == 'csv':
+                self.assertEqual(next(csv.reader(rows)), ['1', 'fix-café', 'Café ☃'])
+            else:
+                self.assertEqual(rows[0].split(), ['1', 'fix-café', 'Café', '☃'])
+        table = self.run_command(['list', '-r', REPO, '--limit', '1', '--table', '--columns', 'number,title'])
+        self.assertIn('Café ☃', table)
+
+    def test_rate_limit_goes_to_stderr_and_not_with_numberonly(self):
+        stderr = tempfile.TemporaryFile()
+        self.addCleanup(setattr, sys, 'stderr', sys.stderr)
+        sys.stderr = stderr
+        numbers = self.run_command(['list', '-r', REPO, '--limit', '3', '--numberonly', '--ratelimit'])
+        self.assertEqual(numbers.split(), ['1', '2', '3'])
+        rows = self.run_command(['list', '-r', REPO, '--limit', '3', '--ratelimit'])
+        self.assertNotIn('Rate Limiting', rows)
+        stderr.seek(0)
+        self.assertEqual(stderr.read().count('Github Rate Limiting:'), 1)
+
+    def test_jobs_keep_the_order_and_skip_a_pr_that_fails(self):
+        labeled = [pr['number'] for pr in self.server.repo(REPO).prs.values() if 'ready' in pr['labels']]
+        self.server.failing_pulls.add(labeled[1])
+        for jobs in ('1', '4'):
+            output = self.run_command(['list', '-r', REPO, '--label', 'ready', '-j', jobs])
+            self.assertEqual([int(line.split()[0].lstrip('#')) for line in output.splitlines()], labeled[:1] + labeled[2:], jobs)
+            self.assertEqual(self.exit_status, 0)
+
+    def test_a_number_that_fails_exits_1(self):
+        self.server.failing_pulls.add(3)
+        self.assertEqual(self.run_command(['list', '-r', REPO, '-n', '3']), '')
+        self.assertEqual(self.exit_status, 1)
+
+    def listed(self, *repos):
+        return sorted('%s#%d' % (repo, number) for repo in repos for number, pr in self.server.repo(repo).prs.items() if pr['state'] == 'open')
+
+    def test_org_lists_the_prs_of_every_repo(self):
+        output = self.run_command(['list', '--org', 'bench', '--numberonly'])
+        self.assertEqual(sorted(output.split()), self.listed('bench/prs-10', 'bench/prs-100'))
+        self.assertEqual(self.requests('GET /orgs/bench/repos'), 1)
+        self.assertEqual(self.exit_status, 0)
+
+    def test_a_repo_that_fails_exits_1_after_the_others_print(self):
+        for jobs in ('1', '4'):
+            output = self.run_command(['list', '-r', 'bench/prs-10,bench/missing,bench/prs-100', '--numberonly', '-j', jobs])
+            self.assertEqual(sorted(output.split()), self.listed('bench/prs-10', 'bench/prs-100'), jobs)
+            self.assertEqual(self.exit_status, 1)
@@ -0,0 +1,56 @@
+"""MergeQueue against the fake API, with mergeability computed late, refused merges and unmergeable states"""
+from support import FakeClock, FakeGithubTestCase, github_pr
+
+REPO = 'bench/prs-10'
+
+
+class MergeQueueTest(FakeGithubTestCase):
+
+    def setUp(self):
+        FakeGithubTestCase.setUp(self)
+        github_pr._install_connection_classes()
+        self.session = github_pr.GithubSession('a', self.server.url)
+        self.clock = FakeClock()
+        self.queue = github_pr.MergeQueue(timeout=60, sleep=self.clock.sleep, clock=self.clock.time)
+
+    def merge(self, number):
+        return self.queue.merge(self.session.get_pull(REPO, number))
+
+    def test_polls_until_the_mergeability_is_computed(self):
+        self.server.mergeability[1] = [(None, 'unknown'), (None, 'unknown'), (True, 'clean')]
+        report = self.merge(1)
+        self.assertTrue(report['merged'], report)
+        self.assertEqual(self.requests('GET /repos/:owner/:repo/pulls/:number'), 3)
+        self.assertEqual(self.clock.sleeps, [1.0, 2.0])
+        self.assertEqual(self.requests('PUT /repos/:owner/:repo/pulls/:number/merge'), 1)
+
+    def test_polls_further_apart_while_nothing_changes(self):
+        self.server.mergeability[1] = [(None, 'unknown')]
+        report = self.merge(1)
+        self.assertEqual(report['reason'], 'NotMergeable')
+        self.assertEqual(self.clock.sleeps, [1.0, 2.0, 4.0, 8.0, 16.0])
+        self.assertEqual(self.requests('PUT /repos/:owner/:repo/pulls/:number/merge'), 0)
+
+    def test_retries_a_merge_refused_because_a_branch_moved(self):
+        self.server.refused_merges.update({1: [405], 2: [409]})
+        for number in (1, 2):
+            report = self.merge(number)
+            self.assertTrue(report['merged'], report)
+        self.assertEqual(self.requests('PUT /repos/:owner/:repo/pulls/:number/merge'), 4)
+        self.assertEqual(self.clock.sleeps, [github_pr.MergeQueue.POLL_INTERVAL] * 2)
+
+    def test_gives_up_after_max_merge_retries(self):
+        self.server.refused_merges[1] = [409] * (github_pr.MergeQueue.MAX_MERGE_RETRIES + 1)
+        report = self.merge(1)
+        self.assertFalse(report['merged'])
+        self.assertEqual(report['reason'], 'MergeFailed')
+        self.assertEqual(report['message'], 'Head branch was modified')
+        self.assertEqual(self.requests('PUT /repos/:owner/:repo/pulls/:number/merge'), github_pr.MergeQueue.MAX_MERGE_RETRIES + 1)
+
+    def test_does_not_wait_for_unmergeable_states(self):
+        for number, state in enumerate(['dirty', 'blocked', 'behind'], 1):
+            self.server.mergeability[number] = [(False, state)]
+            report = self.merge(number)
+            self.assertEqual((report['reason'], report['message']), ('NotMergeable', 'mergeable_state is %s' % state))
+        self.assertEqual(self.clock.sleeps, [])
+        self.assertEqual(self.requests('GET /repos/:owner/:repo/pulls/:number'), 3)
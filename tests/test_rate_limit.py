@@ -0,0 +1,94 @@
+"""RateLimitScheduler against the throttling of the fake API: pacing, retries, token rotation and the HTTP cache"""
+import logging
+
+from support import FakeClock, FakeGithubTestCase, RecordingHandler, github_pr
+
+REPO = 'bench/prs-10'
+
+
+class RateLimitSchedulerTest(FakeGithubTestCase):
+
+    def install(self, tokens, http_cache=None):
+        self.clock = FakeClock()
+        self.scheduler = github_pr.RateLimitScheduler(tokens, sleep=self.clock.sleep, clock=self.clock.time)
+        github_pr._install_connection_classes(http_cache, self.scheduler)
+
+    def test_paces_a_low_budget_over_the_reset_window(self):
+        self.server.throttle(limit=100, remaining={'a': 10}, reset_in=100)
+        self.install(['a'])
+        github = self.github('a')
+        for _ in range(4):
+            github.get_repo(REPO, lazy=False)
+        # Under 20% of the limit, the requests after the first paced one are spread over what is left until the reset
+        self.assertEqual(len(self.clock.sleeps), 2)
+        for delay in self.clock.sleeps:
+            self.assertTrue(100.0 / 10 <= delay <= 100.0 / 7, delay)
+
+    def test_retries_the_secondary_rate_limit_after_retry_after(self):
+        self.server.throttle(secondary=2, retry_after=3)
+        self.install(['a'])
+        repo = self.github('a').get_repo(REPO, lazy=False)
+        self.assertEqual(repo.full_name, REPO)
+        self.assertEqual(self.requests('GET /repos/:owner/:repo'), 3)
+        self.assertEqual(len(self.clock.sleeps), 2)
+        for delay in self.clock.sleeps:
+            self.assertTrue(3 <= delay < 3 + github_pr.RateLimitScheduler.BACKOFF_BASE, delay)
+
+    def test_gives_up_after_max_retries(self):
+        self.server.throttle(secondary=github_pr.RateLimitScheduler.MAX_RETRIES + 1)
+        self.install(['a'])
+        from github import GithubException
+        with self.assertRaises(GithubException) as raised:
+            self.github('a').get_repo(REPO, lazy=False)
+        self.assertEqual(raised.exception.status, 403)
+        self.assertEqual(self.requests('GET /repos/:owner/:repo'), github_pr.RateLimitScheduler.MAX_RETRIES + 1)
+
+    def test_rotates_an_exhausted_token_without_waiting(self):
+        self.server.throttle(remaining={'a': 0, 'b': 100})
+        self.install(['a', 'b'])
+        self.github('a').get_repo(REPO, lazy=False)
+        self.assertEqual(self.server.tokens, {'a': 1, 'b': 1})
+        self.assertEqual(self.clock.sleeps, [])
+
+    def test_reads_use_the_token_with_the_most_quota_and_writes_keep_the_caller(self):
+        self.server.throttle(remaining={'a': 2, 'b': 100})
+        self.install(['a', 'b'])
+        github = self.github('a')
+        github.get_repo(REPO, lazy=False)
+        github.get_repo(REPO, lazy=False).get_issue(1).create_comment('A write')
+        self.assertEqual(self.server.tokens, {'a': 2, 'b': 2})
+        self.assertEqual(self.requests('POST /repos/:owner/:repo/issues/:number/comments'), 1)
+
+    def test_keeps_the_token_of_another_caller(self):
+        self.server.throttle(remaining={'a': 1, 'b': 100})
+        self.install(['a', 'b'])
+        self.github('a').get_repo(REPO, lazy=False)
+        self.github('client').get_repo(REPO, lazy=False)
+        self.assertEqual(self.server.tokens, {'a': 1, 'client': 1})
+
+    def test_warns_when_waiting_for_the_reset(self):
+        self.install(['a'])
+        handler = RecordingHandler()
+        github_pr.logger.addHandler(handler)
+        self.addCleanup(github_pr.logger.removeHandler, handler)
+        self.scheduler.update('token a', {'x-ratelimit-limit': '5000', 'x-ratelimit-remaining': '0',
+                                          'x-ratelimit-reset': str(int(self.clock.now) + 600)})
+        self.scheduler.wait('token a')
+        self.assertEqual(len(self.clock.sleeps), 1)
+        self.assertAlmostEqual(self.clock.sleeps[0], 600, delta=1)
+        self.assertEqual([record.levelno for record in handler.records], [logging.WARNING])
+
+    def test_caches_responses_under_the_token_they_were_fetched_with(self):
+        self.server.throttle(remaining={'a': 1, 'b': 100})
+        cache = github_pr.HTTPCache(self.work_dir, 1024 * 1024)
+        self.install(['a', 'b'], cache)
+        github = self.github('a')
+        for _ in range(3):
+            github.get_repo(REPO, lazy=False)
+        host = '127.0.0.1:%d' % self.server.server_address[1]
+        url = '/repos/%s' % REPO
+        for token in ('a', 'b'):
+            self.assertIsNotNone(cache.load(cache.key(host, url, {'Authorization': 'token ' + token})), token)
+        # The last read revalidated the entry of b with b, the one of a was never sent with b
+        self.assertEqual(self.server.tokens, {'a': 1, 'b': 2})
+        self.assertEqual(cache.hits, 1)
@@ -0,0 +1,42 @@
+"""PR selections pushed down into API parameters: --label, label and owner filters, and --head"""
+from support import FakeGithubTestCase
+
+REPO = 'bench/prs-100'
+
+
+class SelectionsTest(FakeGithubTestCase):
+
+    def numbers(self, argv):
+        return [int(number) for number in self.run_command(['list', '-r', REPO, '--numberonly'] + argv).split()]
+
+    def labeled(self, *labels):
+        return [pr['number'] for pr in self.server.repo(REPO).prs.values() if set(labels) <= set(pr['labels'])]
+
+    def test_labels_are_listed_without_the_search_api(self):
+        self.assertEqual(self.numbers(['--label', 'ready']), self.labeled('ready'))
+        self.assertEqual(self.numbers(['--filters', 'label=bug']), self.labeled('bug'))
+        self.assertEqual(self.requests('GET /search/issues'), 0)
+        self.assertEqual(self.requests('GET /repos/:owner/:repo/issues'), 2)
+
+    def test_owner_filters_use_the_issues_list(self):
+        owner = self.server.repo(REPO).prs[1]['user']
+        expected = [pr['number'] for pr in self.server.repo(REPO).prs.values() if pr['user'] == owner]
+        self.assertEqual(self.numbers(['--filters', 'owner=%s' % owner]), expected)
+        self.assertEqual(self.requests('GET /repos/:owner/:repo/issues'), 1)
+        self.assertEqual(self.requests('GET /search/issues'), 0)
+
+    def test_owner_and_label_filters_share_one_issues_list(self):
+        owner = self.server.repo(REPO).prs[1]['user']
+        expected = [number for number in self.labeled('ready') if self.server.repo(REPO).prs[number]['user'] == owner]
+        self.assertEqual(self.numbers(['--filters', 'owner=%s,label=ready' % owner]), expected)
+        self.assertEqual(self.requests('GET /repos/:owner/:repo/issues'), 1)
+
+    def test_a_plain_head_is_a_branch_of_the_repo_owner(self):
+        self.assertEqual(self.numbers(['--head', 'feature-7']), [7])
+        self.assertEqual(self.requests('GET /repos/:owner/:repo/pulls'), 1)
+
+    def test_a_plain_head_falls_back_to_the_branches_of_forks(self):
+        self.server.repo(REPO).prs[7]['head_owner'] = 'dev3'
+        self.assertEqual(self.numbers(['--head', 'feature-7']), [7])
+        self.assertEqual(self.numbers(['--head', 'dev3:feature-7']), [7])
+        self.assertEqual(self.numbers(['--head', 'bench:feature-7']), [])
@@ -0,0 +1,51 @@
+"""serve and the thin client of --server, on a unix socket, against the fake API"""
+import os
+import subprocess
+import sys
+import time
+
+from support import ROOT, FakeGithubTestCase
+
+REPO = 'bench/prs-10'
+COMMAND = [sys.executable, os.path.join(ROOT, 'github_pr.py')]
+
+
+class ServeTest(FakeGithubTestCase):
+
+    def setUp(self):
+        FakeGithubTestCase.setUp(self)
+        self.socket_path = os.path.join(self.work_dir, 'server.sock')
+        # Neither the server nor the client may find a token of their own
+        self.env = dict((name, value) for name, value in os.environ.items() if not name.startswith('GITHUB_'))
+        with open(os.devnull, 'w') as devnull:
+            server = subprocess.Popen(COMMAND + ['serve', '--server', self.socket_path, '--token', 'server', '--no-cache'],
+                                      env=self.env, stderr=devnull)
+        self.addCleanup(server.wait)
+        self.addCleanup(server.terminate)
+        for _ in range(100):
+            if os.path.exists(self.socket_path):
+                break
+            time.sleep(0.05)
+
+    def client(self, *argv):
+        """Exit status, stdout and stderr of a thin client command"""
+        client = subprocess.Popen(COMMAND + list(argv) + ['--server', self.socket_path, '--api-url', self.server.url],
+                                  env=self.env, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        stdout, stderr = client.communicate()
+        return client.returncode, stdout, stderr
+
+    def test_runs_the_command_with_the_token_of_the_client(self):
+        status, stdout, stderr = self.client('list', '-r', REPO, '--numberonly', '--token', 'a')
+        self.assertEqual(status, 0, stderr)
+        self.assertNotIn('running locally', stderr)
+        self.assertTrue(self.server.tokens['a'])
+        self.assertEqual(self.server.tokens['server'], 0)
+        self.assertEqual(stdout, self.run_command(['list', '-r', REPO, '--numberonly']))
+
+    def test_refuses_a_command_without_token(self):
+        status, stdout, stderr = self.client('list', '-r', REPO, '--numberonly')
+        self.assertEqual(status, 2)
+        self.assertEqual(stdout, '')
+        self.assertIn('the server only runs commands with the token of the client', stderr)
+        self.assertEqual(sum(self.server.counts.values()), 0)
+
@@ -0,0 +1,36 @@
+"""Statuses and file lists kept by commit SHA in the ShaStore"""
+from support import FakeGithubTestCase, github_pr
+
+REPO = 'bench/prs-10'
+
+
+class ShaStoreTest(FakeGithubTestCase):
+
+    def setUp(self):
+        FakeGithubTestCase.setUp(self)
+        github_pr._install_connection_classes()
+        self.addCleanup(setattr, github_pr, 'sha_store', github_pr.sha_store)
+        github_pr.sha_store = github_pr.ShaStore(self.work_dir)
+        self.pr = self.server.repo(REPO).prs[1]
+
+    def pull(self):
+        return self.github('a').get_repo(REPO).get_pull(1)
+
+    def test_stores_statuses_once_every_context_succeeded(self):
+        self.pr['statuses'] = [('failure', 'ci', 70), ('success', 'lint', 70), ('pending', 'ci', 61), ('pending', 'lint', 61)]
+        for _ in range(2):
+            self.assertEqual(github_pr._head_status_contexts(self.pull()), [list(status[:2]) for status in self.pr['statuses']])
+            self.assertEqual(github_pr._head_combined_status(self.pull()), 'failure')
+        self.pr['statuses'].insert(0, ('success', 'ci', 80))
+        for _ in range(2):
+            self.assertEqual(github_pr._head_status_contexts(self.pull())[0], ['success', 'ci'])
+            self.assertEqual(github_pr._head_combined_status(self.pull()), 'success')
+        self.assertEqual(self.requests('GET /repos/:owner/:repo/statuses/:sha'), 3)
+        self.assertEqual(self.requests('GET /repos/:owner/:repo/commits/:sha/status'), 3)
+
+    def test_stores_files_by_head_and_base(self):
+        for _ in range(2):
+            self.assertEqual(github_pr._pr_files(self.pull()), ['src/change_1.py'])
+        self.pr.update(base_sha='1' * 40, files=['src/change_1.py', 'src/merged.py'])
+        self.assertEqual(github_pr._pr_files(self.pull()), ['src/change_1.py', 'src/merged.py'])
+        self.assertEqual(self.requests('GET /repos/:owner/:repo/pulls/:number/files'), 2)
@@ -0,0 +1,55 @@
+"""RequestStats: the requests of each action, counted by the thread that sends them"""
+import threading
+
+from support import FakeClock, FakeGithubTestCase, github_pr
+
+REPO = 'bench/prs-10'
+
+
+class RequestStatsTest(FakeGithubTestCase):
+
+    def install(self, action):
+        self.addCleanup(setattr, github_pr, 'request_stats', github_pr.request_stats)
+        stats = github_pr._install_request_stats(action=action)
+        github_pr._install_connection_classes(stats=stats)
+        return stats
+
+    def requests_by_action(self, stats):
+        return dict((action, totals['requests']) for action, totals in stats.as_dict()['actions'].items())
+
+    def test_counts_the_requests_of_each_thread_under_its_own_action(self):
+        stats = self.install('batch')
+        both_running = threading.Event()
+        running = []
+
+        def run(action, number):
+            with stats.action(action):
+                running.append(action)
+                if len(running) == 2:
+                    both_running.set()
+                both_running.wait(5)
+                self.github('a').get_repo(REPO).get_pull(number).title
+
+        threads = [threading.Thread(target=run, args=(action, number)) for number, action in enumerate(['list', 'merge'], 1)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.github('a').get_repo(REPO, lazy=False)
+        self.assertEqual(self.requests_by_action(stats), {'list': 1, 'merge': 1, 'batch': 1})
+
+    def test_counts_the_merges_of_the_merge_queue_as_merges(self):
+        stats = self.install('merge-queue')
+        clock = FakeClock()
+        queue = github_pr.MergeQueue(sleep=clock.sleep, clock=clock.time)
+        report = queue.merge(self.github('a').get_repo(REPO).get_pull(1))
+        self.assertTrue(report['merged'], report)
+        self.assertEqual(self.requests_by_action(stats), {'merge-queue': 2, 'merge': 1})
+
+    def test_counts_the_work_of_a_pool_for_the_action_that_handed_it(self):
+        stats = self.install('list')
+        repo = self.github('a').get_repo(REPO)
+        with stats.action('filter'):
+            titles = list(github_pr._imap_bounded(lambda number: repo.get_pull(number).title, range(1, 9), jobs=4))
+        self.assertEqual(len(titles), 8)
+        self.assertEqual(self.requests_by_action(stats), {'filter': 8})
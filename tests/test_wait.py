@@ -0,0 +1,63 @@
+"""wait against the fake API, polling on a fake clock"""
+import os
+
+from support import FakeClock, FakeGithubTestCase, github_pr
+
+REPO = 'bench/prs-10'
+
+
+class FakeTime(object):
+    """The time module, with the given sleep and time functions"""
+
+    def __init__(self, sleep, time, real_time):
+        self.sleep = sleep
+        self.time = time
+        self._real_time = real_time
+
+    def __getattr__(self, name):
+        return getattr(self._real_time, name)
+
+
+class WaitTest(FakeGithubTestCase):
+
+    def setUp(self):
+        FakeGithubTestCase.setUp(self)
+        self.clock = FakeClock()
+        self.changes = []
+        self.addCleanup(setattr, github_pr, 'time', github_pr.time)
+        github_pr.time = FakeTime(self.sleep, self.clock.time, github_pr.time)
+        self.pr = self.server.repo(REPO).prs[1]
+        self.mergers_path = os.path.join(self.work_dir, 'MAINTAINERS.txt')
+        self.write_mergers(['dev1'], 0)
+
+    def sleep(self, delay):
+        """Makes the changes waiting for the first poll, then sleeps"""
+        while self.changes:
+            self.changes.pop(0)()
+        self.clock.sleep(delay)
+
+    def write_mergers(self, users, mtime):
+        with open(self.mergers_path, 'w') as mergers:
+            mergers.write('\n'.join(users) + '\n')
+        os.utime(self.mergers_path, (mtime, mtime))
+
+    def comment(self, user, minutes):
+        return {'id': 1000 + minutes, 'body': ':shipit:', 'user': user, 'created_at': 60 + minutes, 'updated_at': 60 + minutes}
+
+    def wait(self):
+        return self.run_command(['wait', '-r', REPO, '-n', '1', '--timeout', '60', '--condition-approved-mergers-file',
+                                 '--approved-mergers-file-path', self.mergers_path])
+
+    def test_is_ready_once_an_approved_merger_comments(self):
+        self.pr['comments'] = [self.comment('dev3', 5)]
+        self.changes.append(lambda: self.pr['comments'].append(self.comment('dev1', 10)))
+        self.assertEqual(self.wait(), 'PR #1 is ready, merge comments by dev1\n')
+        self.assertEqual(self.clock.sleeps, [github_pr.WAIT_POLL_INTERVAL])
+
+    def test_does_not_count_a_deleted_comment(self):
+        # The merge comment of dev3 is deleted once seen, before dev3 becomes an approved merger
+        self.pr['comments'] = [self.comment('dev3', 5)]
+        self.changes.append(lambda: self.pr['comments'].remove(self.comment('dev3', 5)))
+        self.changes.append(lambda: self.write_mergers(['dev1', 'dev3'], 1))
+        self.assertEqual(self.wait(), '')
+        self.assertEqual(self.exit_status, 1)